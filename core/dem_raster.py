@@ -0,0 +1,222 @@
+# core/dem_raster.py
+# DEM locale a tile, letto via memory map (nessuna rete, nessuna copia)
+#
+# - Formati:
+#     · SRTM .hgt (N45E007.hgt): int16 big-endian, 1201² (3") o 3601² (1"),
+#       letto così com'è con np.memmap
+#     · griglia .npy + .json accanto (origine, passo, nodata): formato in
+#       cui scripts/import_dem_tiles.py converte GeoTIFF / Copernicus GLO-30
+# - Convenzione: riga 0 = nord, coordinate al centro pixel
+# - Campionamento bilineare vettoriale su array di punti; fuori copertura
+#   o su nodata → NaN (il chiamante decide il ripiego)
+# - Un'istanza per cartella, condivisa da tutte le sessioni del processo
+#   (get_raster): le pagine del file restano nella page cache del sistema
+# - Cartella configurabile con TELEMARK_DEM_DIR (default ./data/dem)
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+DEM_DIR = Path(os.environ.get("TELEMARK_DEM_DIR", "data/dem"))
+
+_HGT_NAME = re.compile(r"^([NS])(\d{2})([EW])(\d{3})$", re.IGNORECASE)
+
+
+class DemTile:
+    """Griglia DEM in memory map: origine (centro pixel in alto a sinistra) e passo."""
+
+    __slots__ = ("data", "lat0", "lon0", "dlat", "dlon", "nodata", "bounds", "source")
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        lat0: float,
+        lon0: float,
+        dlat: float,
+        dlon: float,
+        nodata: Optional[float] = None,
+        source: str = "",
+    ) -> None:
+        self.data = data
+        self.lat0 = float(lat0)  # latitudine della riga 0 (nord)
+        self.lon0 = float(lon0)  # longitudine della colonna 0 (ovest)
+        self.dlat = float(dlat)  # passo positivo, le righe scendono verso sud
+        self.dlon = float(dlon)
+        self.nodata = nodata
+        rows, cols = data.shape
+        self.bounds = (
+            self.lat0 - (rows - 1) * self.dlat,
+            self.lon0,
+            self.lat0,
+            self.lon0 + (cols - 1) * self.dlon,
+        )
+        self.source = source
+
+    def contains(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        s, w, n, e = self.bounds
+        return (lats >= s) & (lats <= n) & (lons >= w) & (lons <= e)
+
+    def sample(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Bilineare per punti dentro la tile (da verificare con contains)."""
+        rows, cols = self.data.shape
+        fr = (self.lat0 - lats) / self.dlat
+        fc = (lons - self.lon0) / self.dlon
+        r0 = np.clip(np.floor(fr).astype(np.int64), 0, rows - 2)
+        c0 = np.clip(np.floor(fc).astype(np.int64), 0, cols - 2)
+        tr = np.clip(fr - r0, 0.0, 1.0)
+        tc = np.clip(fc - c0, 0.0, 1.0)
+
+        z00 = self.data[r0, c0].astype(float)
+        z01 = self.data[r0, c0 + 1].astype(float)
+        z10 = self.data[r0 + 1, c0].astype(float)
+        z11 = self.data[r0 + 1, c0 + 1].astype(float)
+        if self.nodata is not None:
+            for z in (z00, z01, z10, z11):
+                z[z == self.nodata] = np.nan
+
+        top = z00 * (1.0 - tc) + z01 * tc
+        bottom = z10 * (1.0 - tc) + z11 * tc
+        return top * (1.0 - tr) + bottom * tr
+
+
+# ----------------------------------------------------------------------
+# Lettura tile
+# ----------------------------------------------------------------------
+def _open_hgt(path: Path) -> Optional[DemTile]:
+    m = _HGT_NAME.match(path.stem)
+    if m is None:
+        return None
+    n = int(round((path.stat().st_size // 2) ** 0.5))
+    if n * n * 2 != path.stat().st_size or n < 2:
+        return None
+    lat_sw = int(m.group(2)) * (1 if m.group(1).upper() == "N" else -1)
+    lon_sw = int(m.group(4)) * (1 if m.group(3).upper() == "E" else -1)
+    data = np.memmap(path, dtype=">i2", mode="r", shape=(n, n))
+    step = 1.0 / (n - 1)
+    return DemTile(data, lat_sw + 1.0, lon_sw, step, step, nodata=-32768, source=path.name)
+
+
+def _open_grid(path: Path) -> Optional[DemTile]:
+    meta_path = path.with_suffix(".json")
+    try:
+        with open(meta_path, "r", encoding="utf8") as f:
+            meta = json.load(f)
+        data = np.load(path, mmap_mode="r")
+    except Exception:
+        return None
+    if data.ndim != 2 or min(data.shape) < 2:
+        return None
+    return DemTile(
+        data,
+        meta["lat0"],
+        meta["lon0"],
+        meta["dlat"],
+        meta["dlon"],
+        nodata=meta.get("nodata"),
+        source=path.name,
+    )
+
+
+def write_grid(
+    path: Union[str, Path],
+    data: np.ndarray,
+    lat0: float,
+    lon0: float,
+    dlat: float,
+    dlon: float,
+    nodata: Optional[float] = None,
+) -> Path:
+    """Salva una griglia (riga 0 = nord, centri pixel) nel formato .npy + .json."""
+    path = Path(path).with_suffix(".npy")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(path, np.ascontiguousarray(data))
+    meta = {"lat0": lat0, "lon0": lon0, "dlat": dlat, "dlon": dlon, "nodata": nodata}
+    with open(path.with_suffix(".json"), "w", encoding="utf8") as f:
+        json.dump(meta, f)
+    return path
+
+
+# ----------------------------------------------------------------------
+# Insieme di tile
+# ----------------------------------------------------------------------
+class DemRaster:
+    """
+    r = DemRaster.open("data/dem")
+    z = r.sample(lats, lons)     # NaN dove non coperto
+    """
+
+    def __init__(self, tiles: List[DemTile]) -> None:
+        # a parità di copertura vince la tile più fine
+        self.tiles = sorted(tiles, key=lambda t: t.dlat * t.dlon)
+        if tiles:
+            b = np.array([t.bounds for t in tiles])
+            self.bounds: Optional[Tuple[float, float, float, float]] = (
+                float(b[:, 0].min()),
+                float(b[:, 1].min()),
+                float(b[:, 2].max()),
+                float(b[:, 3].max()),
+            )
+        else:
+            self.bounds = None
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    @classmethod
+    def open(cls, folder: Union[str, Path, None] = None) -> "DemRaster":
+        folder = Path(folder) if folder is not None else DEM_DIR
+        tiles: List[DemTile] = []
+        if folder.is_dir():
+            for p in sorted(folder.iterdir()):
+                suffix = p.suffix.lower()
+                try:
+                    tile = _open_hgt(p) if suffix == ".hgt" else _open_grid(p) if suffix == ".npy" else None
+                except Exception:
+                    tile = None
+                if tile is not None:
+                    tiles.append(tile)
+        return cls(tiles)
+
+    def sample(self, lats: Any, lons: Any) -> np.ndarray:
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        out = np.full(lats.size, np.nan)
+        if self.bounds is None or lats.size == 0:
+            return out
+        todo = np.ones(lats.size, dtype=bool)
+        for tile in self.tiles:
+            sel = np.flatnonzero(todo & tile.contains(lats, lons))
+            if sel.size == 0:
+                continue
+            z = tile.sample(lats[sel], lons[sel])
+            ok = np.isfinite(z)
+            out[sel[ok]] = z[ok]
+            todo[sel[ok]] = False
+            if not todo.any():
+                break
+        return out
+
+    def covers(self, lat: float, lon: float) -> bool:
+        return bool(np.isfinite(self.sample([lat], [lon])[0]))
+
+
+_RASTERS: Dict[str, DemRaster] = {}
+_LOCK = threading.Lock()
+
+
+def get_raster(folder: Union[str, Path, None] = None) -> DemRaster:
+    """Istanza condivisa per cartella (aperta una volta per processo)."""
+    key = str(Path(folder) if folder is not None else DEM_DIR)
+    with _LOCK:
+        r = _RASTERS.get(key)
+        if r is None:
+            r = DemRaster.open(key)
+            _RASTERS[key] = r
+        return r
@@ -1,27 +1,44 @@
 # core/dem_tools.py
 # DEM & pendenza per Telemark · Pro Wax & Tune
 #
-# - Usa API Open-Meteo /elevation per un piccolo grid attorno al punto
+# - Quote da due backend (TELEMARK_DEM_BACKEND o set_dem_backend):
+#     · "local": tile DEM locali in memory map (core.dem_raster), offline
+#     · "http":  API Open-Meteo /elevation tramite ElevationService
+#       (dedup per coordinate quantizzate, blocchi da 100 in parallelo,
+#       cache condivisa fra moduli e sessioni)
+#     · "auto" (default): locale dove coperto, HTTP per il resto
+# - Piccolo grid attorno al punto (DemPatch) per quota, pendenza ed
+#   esposizione, con cache LRU per coordinate arrotondate: render_dem,
+#   core.site_meta e il prefetch di località condividono un solo fetch
 # - Calcola:
 #     · quota media nel intorno
-#     · pendenza (gradi) dal gradiente centrale
-#     · esposizione (aspet) in gradi e come stringa N/NE/.../W
+#     · pendenza (gradi e %) col kernel di Horn sul 3×3 centrale
+#     · esposizione (verso valle) in gradi e come stringa N/NE/.../W
 # - Rende in Streamlit tre valori:
 #     · Quota
 #     · Pendenza
 #     · Esposizione
 # - Usa ctx["marker_lat"/"marker_lon"] se presenti, altrimenti ctx["lat"/"lon"]
+# - Se il prefetch di località (core.location_loader) sta già scaricando
+#   la griglia per quel punto, la aspetta invece di rilanciarla
 
 from __future__ import annotations
 
 import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Any, Optional, Tuple, List
+from functools import cached_property
+from typing import Dict, Any, Optional, Tuple
 
-import requests
 import numpy as np
 import streamlit as st
 
+from core import dem_raster, http_backend, location_loader
+from core.terrain import horn_slope_aspect
+
 UA = {"User-Agent": "telemark-wax-pro/2.2"}
 
 
@@ -64,7 +81,7 @@ def _bearing_deg(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return (brng + 360.0) % 360.0
 
 
-def _aspect_to_label(aspect_deg: float) -> str:
+def aspect_to_compass(aspect_deg: float) -> str:
     """
     Converte esposizione (0 = N, 90 = E) in label N/NE/E/...
     """
@@ -74,107 +91,366 @@ def _aspect_to_label(aspect_deg: float) -> str:
 
 
 # ----------------------------------------------------------------------
-# DEM sampling con Open-Meteo
+# Backend quote
 # ----------------------------------------------------------------------
-@st.cache_data(ttl=3600, show_spinner=False)
-def _sample_dem_grid(
-    lat: float,
-    lon: float,
-    size: int = 5,
-    spacing_m: float = 30.0,
-) -> Tuple[np.ndarray, float]:
-    """
-    Sample DEM su una griglia size×size attorno a (lat, lon).
+DEM_BACKENDS = ("auto", "local", "http")
 
-    Ritorna:
-      - elev_grid (size×size) in metri
-      - spacing effettivo in metri fra i punti adiacenti
-    """
-    if size % 2 == 0:
-        size += 1  # vogliamo size dispari (per avere centro esatto)
+_dem_backend: str = os.environ.get("TELEMARK_DEM_BACKEND", "auto").strip().lower() or "auto"
 
-    half = size // 2
 
-    # conversione metri -> gradi (approx)
-    dlat = spacing_m / 111320.0
-    dlon = spacing_m / (111320.0 * max(0.1, math.cos(math.radians(lat))))
+def set_dem_backend(name: str) -> None:
+    """Imposta il backend quote ("auto" / "local" / "http")."""
+    global _dem_backend
+    name = str(name).strip().lower()
+    if name not in DEM_BACKENDS:
+        raise ValueError(f"backend DEM non valido: {name!r} (attesi: {DEM_BACKENDS})")
+    _dem_backend = name
+
+
+def get_dem_backend() -> str:
+    return _dem_backend
+
+
+# ----------------------------------------------------------------------
+# DEM sampling con Open-Meteo
+# ----------------------------------------------------------------------
+OPEN_METEO_ELEVATION_URL = "https://api.open-meteo.com/v1/elevation"
+ELEVATION_BATCH_MAX = 100  # coordinate per richiesta accettate dall'API
+
 
-    lats: List[float] = []
-    lons: List[float] = []
-    for j in range(size):
-        for i in range(size):
-            lats.append(lat + (j - half) * dlat)
-            lons.append(lon + (i - half) * dlon)
+ELEVATION_DECIMALS = 5  # ~1 m: punti più vicini condividono quota e richiesta
+ELEVATION_CACHE_SIZE = 200_000
+ELEVATION_WORKERS = 4
 
+
+def _fetch_elevation_chunk(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Una richiesta /elevation (≤ ELEVATION_BATCH_MAX punti); errore → NaN."""
     params = {
         "latitude": ",".join(f"{x:.6f}" for x in lats),
         "longitude": ",".join(f"{x:.6f}" for x in lons),
     }
-
     try:
-        r = requests.get(
-            "https://api.open-meteo.com/v1/elevation",
+        r = http_backend.get(
+            OPEN_METEO_ELEVATION_URL,
             params=params,
             headers=UA,
             timeout=10,
         )
         r.raise_for_status()
-        js = r.json() or {}
-        elev = js.get("elevation", [])
-        if not elev or len(elev) != len(lats):
-            raise RuntimeError("elevation data mismatch")
+        elev = (r.json() or {}).get("elevation", [])
+        if len(elev) == lats.size:
+            return np.asarray(elev, dtype=float)
     except Exception:
-        # fallback: griglia piatta a quota 0
-        elev = [0.0] * (size * size)
+        pass
+    return np.full(lats.size, np.nan)
+
+
+class ElevationService:
+    """
+    Quote per array arbitrari di punti, condivise fra moduli e sessioni:
+      - coordinate quantizzate a ELEVATION_DECIMALS e deduplicate
+      - cache LRU condivisa (solo quote valide, gli errori si riprovano)
+      - punti mancanti a blocchi di chunk_size, blocchi in parallelo
+    Con N punti al più ceil(N / chunk_size) richieste, spesso nessuna.
+    """
+
+    def __init__(
+        self,
+        fetch_chunk=_fetch_elevation_chunk,
+        chunk_size: int = ELEVATION_BATCH_MAX,
+        decimals: int = ELEVATION_DECIMALS,
+        cache_size: int = ELEVATION_CACHE_SIZE,
+        max_workers: int = ELEVATION_WORKERS,
+    ) -> None:
+        self.fetch_chunk = fetch_chunk
+        self.chunk_size = int(chunk_size)
+        self.scale = 10.0 ** int(decimals)
+        self.cache_size = int(cache_size)
+        self._cache: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="telemark-elev")
+        self.counters = {"points": 0, "unique": 0, "cache_hits": 0, "requests": 0}
+
+    def _keys(self, qlat: np.ndarray, qlon: np.ndarray) -> np.ndarray:
+        lon_span = int(360 * self.scale) + 1
+        return (qlat + int(90 * self.scale)) * lon_span + (qlon + int(180 * self.scale))
+
+    def elevations(self, lats: Any, lons: Any) -> np.ndarray:
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        out = np.full(lats.size, np.nan)
+        valid = np.isfinite(lats) & np.isfinite(lons)
+        if not valid.any():
+            return out
+
+        qlat = np.round(lats[valid] * self.scale).astype(np.int64)
+        qlon = np.round(lons[valid] * self.scale).astype(np.int64)
+        keys, first, inverse = np.unique(
+            self._keys(qlat, qlon), return_index=True, return_inverse=True
+        )
+        values = np.full(keys.size, np.nan)
+
+        with self._lock:
+            for i, k in enumerate(keys.tolist()):
+                v = self._cache.get(k)
+                if v is not None:
+                    self._cache.move_to_end(k)
+                    values[i] = v
+        missing = np.flatnonzero(np.isnan(values))
+
+        if missing.size:
+            req_lat = qlat[first[missing]] / self.scale
+            req_lon = qlon[first[missing]] / self.scale
+            bounds = [
+                (a, min(a + self.chunk_size, missing.size))
+                for a in range(0, missing.size, self.chunk_size)
+            ]
+            chunks = self._pool.map(
+                lambda ab: self.fetch_chunk(req_lat[ab[0] : ab[1]], req_lon[ab[0] : ab[1]]),
+                bounds,
+            )
+            for (a, b), elev in zip(bounds, chunks):
+                values[missing[a:b]] = elev
+
+            with self._lock:
+                for k, v in zip(keys[missing].tolist(), values[missing].tolist()):
+                    if math.isfinite(v):
+                        self._cache[k] = v
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.counters["points"] += int(lats.size)
+            self.counters["unique"] += int(keys.size)
+            self.counters["cache_hits"] += int(keys.size - missing.size)
+            self.counters["requests"] += -(-int(missing.size) // self.chunk_size)
+
+        out[valid] = values[inverse]
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori e dimensione cache (debug)."""
+        with self._lock:
+            return {**self.counters, "cached": len(self._cache)}
+
+    def clear(self) -> None:
+        """Svuota cache e contatori (benchmark / debug)."""
+        with self._lock:
+            self._cache.clear()
+            for k in self.counters:
+                self.counters[k] = 0
+
+
+elevation_service = ElevationService()
+
+
+def fetch_elevations(lats: Any, lons: Any) -> np.ndarray:
+    """
+    Quote (m) per molti punti dal backend configurato: DEM locale dove
+    coperto, poi /elevation per i punti mancanti (salvo backend "local").
+    I punti senza quota restano NaN.
+    """
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    out = np.full(lats.size, np.nan)
+
+    if _dem_backend != "http":
+        out = dem_raster.get_raster().sample(lats, lons)
+    if _dem_backend != "local":
+        missing = ~np.isfinite(out)
+        if missing.any():
+            out[missing] = elevation_service.elevations(lats[missing], lons[missing])
+
+    return out
 
-    elev_arr = np.array(elev, dtype=float).reshape((size, size))
+
+def _grid_points(
+    lat: float,
+    lon: float,
+    size: int,
+    spacing_m: float,
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Punti (righe da sud a nord) di una griglia size×size e passo effettivo."""
+    half = size // 2
+
+    # conversione metri -> gradi (approx)
+    dlat = spacing_m / 111320.0
+    dlon = spacing_m / (111320.0 * max(0.1, math.cos(math.radians(lat))))
+
+    k = np.arange(size, dtype=float) - half
+    lats = np.repeat(lat + k * dlat, size)
+    lons = np.tile(lon + k * dlon, size)
 
     # distanza effettiva fra centro e cella centrale a Est (per sicurezza)
-    center_lat = lat
-    center_lon = lon
-    east_lat = lat
-    east_lon = lon + dlon
-    spacing_eff = _haversine_m(center_lat, center_lon, east_lat, east_lon)
+    spacing_eff = _haversine_m(lat, lon, lat, lon + dlon)
+    return lats, lons, float(spacing_eff)
+
+
+def _sample_dem_grid(
+    lat: float,
+    lon: float,
+    size: int = 5,
+    spacing_m: float = 30.0,
+) -> Tuple[np.ndarray, float]:
+    """
+    Sample DEM su una griglia size×size attorno a (lat, lon).
 
-    return elev_arr, float(spacing_eff)
+    Ritorna:
+      - elev_grid (size×size) in metri
+      - spacing effettivo in metri fra i punti adiacenti
+
+    Con DEM locale che copre il punto non passa dalla rete né dalla cache
+    Streamlit (lettura diretta dai tile in memory map). Solleva
+    RuntimeError se le quote non sono disponibili (prima: griglia piatta
+    a quota 0, cioè pendenza 0° spacciata per vera).
+    """
+    if size % 2 == 0:
+        size += 1  # vogliamo size dispari (per avere centro esatto)
 
+    if _dem_backend != "http":
+        lats, lons, spacing_eff = _grid_points(lat, lon, size, spacing_m)
+        elev = dem_raster.get_raster().sample(lats, lons)
+        if np.isfinite(elev).all():
+            return elev.reshape((size, size)), spacing_eff
+        if _dem_backend == "local":
+            raise RuntimeError("DEM locale: punto non coperto dai tile")
 
-def _compute_slope_aspect(
-    elev: np.ndarray,
+    return _sample_dem_grid_http(lat, lon, size, spacing_m)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _sample_dem_grid_http(
+    lat: float,
+    lon: float,
+    size: int,
     spacing_m: float,
-) -> Tuple[float, float]:
+) -> Tuple[np.ndarray, float]:
+    lats, lons, spacing_eff = _grid_points(lat, lon, size, spacing_m)
+    elev = elevation_service.elevations(lats, lons)
+    if not np.isfinite(elev).all():
+        # eccezione: un errore non resta in cache per un'ora
+        raise RuntimeError("elevation data mismatch")
+    return elev.reshape((size, size)), spacing_eff
+
+
+def slope_aspect_from_dem(Z: np.ndarray, spacing_m: float) -> Tuple[float, float, float]:
     """
-    Calcola pendenza (gradi) ed esposizione (gradi da Nord) dal grid elev.
-    Usa differenze finite centrali sul centro della griglia.
+    (pendenza in gradi, pendenza in %, esposizione in gradi da Nord) al
+    centro della griglia Z (riga 0 = nord), kernel di Horn sul 3×3
+    centrale. Esposizione = direzione verso cui scende il pendio;
+    0 se piano.
     """
-    h, w = elev.shape
+    h, w = Z.shape
     cy = h // 2
     cx = w // 2
+    window = np.asarray(Z[cy - 1 : cy + 2, cx - 1 : cx + 2], dtype=float)
+    slope, aspect = horn_slope_aspect(window, float(spacing_m))
 
-    # gradienti centrali (N-S, E-W)
-    dz_dy = (elev[cy + 1, cx] - elev[cy - 1, cx]) / (2.0 * spacing_m)
-    dz_dx = (elev[cy, cx + 1] - elev[cy, cx - 1]) / (2.0 * spacing_m)
+    # clamp a valori sensati (0–75°)
+    slope_deg = max(0.0, min(float(slope), 75.0))
+    slope_pct = math.tan(math.radians(slope_deg)) * 100.0
+    aspect_deg = float(aspect) if np.isfinite(aspect) else 0.0
+    return slope_deg, slope_pct, aspect_deg
 
-    # pendenza: arctan(sqrt(dx^2 + dy^2))
-    grad_mag = math.sqrt(dz_dx ** 2 + dz_dy ** 2)
-    slope_rad = math.atan(grad_mag)
-    slope_deg = math.degrees(slope_rad)
 
-    # clamp a valori sensati (0–75°)
-    slope_deg = max(0.0, min(slope_deg, 75.0))
+# ----------------------------------------------------------------------
+# Patch DEM attorno a un punto (cache LRU condivisa)
+# ----------------------------------------------------------------------
+class DemPatch:
+    """
+    Griglia di quote size×size centrata su (lat, lon), riga 0 = nord.
+    Accesso anche come dict (patch["Z"], patch["spacing_m"]) per i moduli
+    che usavano la vecchia API a dizionario.
+    """
+
+    def __init__(self, Z: np.ndarray, spacing_m: float, lat: float, lon: float) -> None:
+        self.Z = Z
+        self.spacing_m = float(spacing_m)
+        self.lat = float(lat)
+        self.lon = float(lon)
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def __bool__(self) -> bool:
+        return bool(self.Z.size) and bool(np.isfinite(self.Z).all())
+
+    @property
+    def origin(self) -> Tuple[float, float]:
+        """(lat, lon) del punto in alto a sinistra (nord-ovest)."""
+        half = self.Z.shape[0] // 2
+        dlat = self.spacing_m / 111320.0
+        dlon = self.spacing_m / (111320.0 * max(0.1, math.cos(math.radians(self.lat))))
+        return self.lat + half * dlat, self.lon - half * dlon
+
+    @cached_property
+    def elevation(self) -> float:
+        """Quota media nel riquadro 3×3 centrale."""
+        h, w = self.Z.shape
+        cy = h // 2
+        cx = w // 2
+        return float(np.nanmean(self.Z[cy - 1 : cy + 2, cx - 1 : cx + 2]))
+
+    @cached_property
+    def slope_aspect(self) -> Tuple[float, float, float]:
+        return slope_aspect_from_dem(self.Z, self.spacing_m)
 
-    # esposizione: direzione di massima discesa
-    # attenzione ai segni: y cresce verso Sud nel grid
-    # usiamo convenzione 0 = N, 90 = E
-    if dz_dx == 0 and dz_dy == 0:
-        aspect_deg = 0.0
-    else:
-        # gradient vector = (dz/dx East, dz/dy South)
-        # direzione di massima pendenza in gradi da Nord:
-        aspect_rad = math.atan2(dz_dx, dz_dy)  # x = Est, y = Sud
-        aspect_deg = (math.degrees(aspect_rad) + 360.0) % 360.0
+    @property
+    def slope_deg(self) -> float:
+        return self.slope_aspect[0]
 
-    return float(slope_deg), float(aspect_deg)
+    @property
+    def slope_pct(self) -> float:
+        return self.slope_aspect[1]
+
+    @property
+    def aspect_deg(self) -> float:
+        return self.slope_aspect[2]
+
+    @property
+    def aspect_txt(self) -> str:
+        return aspect_to_compass(self.aspect_deg)
+
+
+DEM_PATCH_DECIMALS = 5  # ~1 m: stesso punto per rerun e moduli diversi
+DEM_PATCH_CACHE_SIZE = 256
+
+_patch_cache: "OrderedDict[Tuple[float, float, int, float], DemPatch]" = OrderedDict()
+_patch_lock = threading.Lock()
+
+
+def dem_patch(
+    lat: float,
+    lon: float,
+    size: int = 5,
+    spacing_m: float = 30.0,
+) -> Optional[DemPatch]:
+    """
+    DemPatch attorno a (lat, lon), dalla cache LRU se già chiesto.
+    None se le quote non sono disponibili (l'errore non va in cache).
+    """
+    lat_q = round(float(lat), DEM_PATCH_DECIMALS)
+    lon_q = round(float(lon), DEM_PATCH_DECIMALS)
+    key = (lat_q, lon_q, int(size), float(spacing_m))
+    with _patch_lock:
+        patch = _patch_cache.get(key)
+        if patch is not None:
+            _patch_cache.move_to_end(key)
+            return patch
+
+    try:
+        elev_grid, spacing_eff = _sample_dem_grid(lat_q, lon_q, size=size, spacing_m=spacing_m)
+    except Exception:
+        return None
+    # _sample_dem_grid ha le righe da sud a nord
+    patch = DemPatch(np.ascontiguousarray(elev_grid[::-1]), spacing_eff, lat_q, lon_q)
+
+    with _patch_lock:
+        _patch_cache[key] = patch
+        _patch_cache.move_to_end(key)
+        while len(_patch_cache) > DEM_PATCH_CACHE_SIZE:
+            _patch_cache.popitem(last=False)
+    return patch
 
 
 # ----------------------------------------------------------------------
@@ -191,17 +467,16 @@ def render_dem(T: Dict[str, str], ctx: Dict[str, Any]) -> None:
     lat = float(ctx.get("marker_lat", ctx.get("lat", 45.83333)))
     lon = float(ctx.get("marker_lon", ctx.get("lon", 7.73333)))
 
-    elev_grid, spacing_m = _sample_dem_grid(lat, lon, size=5, spacing_m=30.0)
-
-    # quota: media nel riquadro 3×3 centrale
-    h, w = elev_grid.shape
-    cy = h // 2
-    cx = w // 2
-    center_patch = elev_grid[cy - 1 : cy + 2, cx - 1 : cx + 2]
-    elev_center = float(np.nanmean(center_patch))
+    location_loader.wait("dem", lat, lon)
+    patch = dem_patch(lat, lon)
+    if patch is None:
+        st.info("Quota, pendenza ed esposizione non disponibili per questo punto (DEM).")
+        return
 
-    slope_deg, aspect_deg = _compute_slope_aspect(elev_grid, spacing_m)
-    aspect_label = _aspect_to_label(aspect_deg)
+    elev_center = patch.elevation
+    slope_deg = patch.slope_deg
+    aspect_deg = patch.aspect_deg
+    aspect_label = patch.aspect_txt
 
     # ---- UI ----
     col_q, col_s, col_a = st.columns(3)
@@ -0,0 +1,204 @@
+# core/horizon.py
+# Orizzonte del terreno e ombra portata (sole nascosto dalle montagne)
+#
+# - Per ogni punto: angolo d'orizzonte in N settori di azimut, dal DEM
+#   lungo raggi a distanze crescenti (fino a ~8 km), con correzione per
+#   curvatura terrestre e rifrazione
+# - Tutte le quote (punti × settori × distanze) in un'unica chiamata
+#   all'elevation_fn; cache LRU per punto (coordinate arrotondate), così
+#   la stessa località o pista non si ricalcola fra rerun e sessioni;
+#   i punti con quote mancanti (punto o raggi) restano in una cache
+#   negativa per HORIZON_FAIL_TTL_S (niente richieste ripetute con il
+#   DEM giù)
+# - HorizonModel.sun_visible / sun_hidden: posizione del sole (core.utils)
+#   vettoriale su punti × istanti → maschera sole visibile / ombra portata
+# - Usato da core.terrain (sole lungo la pista) e core.meteo (radiazione
+#   del profilo orario ridotta nelle ore in ombra)
+# - Nessuna dipendenza da Streamlit: l'elevation_fn arriva dal chiamante
+#   (es. core.dem_tools.fetch_elevations)
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.utils import solar_azimuth_array, solar_cos_zenith_array
+
+ElevationFn = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+EARTH_RADIUS_M = 6371000.0
+M_PER_DEG_LAT = 111320.0
+REFRACTION_K = 0.13
+OBSERVER_HEIGHT_M = 1.5
+
+HORIZON_SECTORS = 24  # 15° di azimut
+HORIZON_DISTANCES_M = np.geomspace(60.0, 8000.0, 16)
+
+HORIZON_DECIMALS = 4  # ~10 m
+HORIZON_CACHE_SIZE = 20000
+HORIZON_FAIL_TTL_S = 120.0
+
+
+@dataclass
+class HorizonModel:
+    lat: np.ndarray  # (P,)
+    lon: np.ndarray  # (P,)
+    angle_deg: np.ndarray  # (P, N) elevazione dell'orizzonte per settore
+    ok: Optional[np.ndarray] = None  # (P,) False → quota ignota, orizzonte piatto
+
+    def __post_init__(self) -> None:
+        if self.ok is None:
+            self.ok = np.ones(self.lat.size, dtype=bool)
+
+    def __len__(self) -> int:
+        return int(self.lat.size)
+
+    @property
+    def n_sectors(self) -> int:
+        return int(self.angle_deg.shape[1])
+
+    def horizon_at(self, azimuth_deg: np.ndarray) -> np.ndarray:
+        """Orizzonte (gradi) per azimut (P, H), interpolato fra i settori."""
+        n = self.n_sectors
+        pos = (np.asarray(azimuth_deg, dtype=float) % 360.0) / (360.0 / n)
+        i0 = np.floor(pos).astype(np.int64)
+        t = pos - i0
+        i0 %= n
+        i1 = (i0 + 1) % n
+        a0 = np.take_along_axis(self.angle_deg, i0, axis=1)
+        a1 = np.take_along_axis(self.angle_deg, i1, axis=1)
+        return a0 * (1.0 - t) + a1 * t
+
+    def _sun(self, day_of_year: int, solar_hours: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(sole sopra l'orizzonte astronomico, sole sopra il terreno), (P, H)."""
+        hours = np.asarray(solar_hours, dtype=float)[None, :]
+        lat = self.lat[:, None]
+        cosz = solar_cos_zenith_array(lat, day_of_year, hours)
+        az = np.broadcast_to(solar_azimuth_array(lat, day_of_year, hours), cosz.shape)
+        sun_elev = 90.0 - np.degrees(np.arccos(np.clip(cosz, 0.0, 1.0)))
+        up = cosz > 0.0
+        return up, up & (sun_elev > self.horizon_at(az))
+
+    def sun_visible(self, day_of_year: int, solar_hours: Sequence[float]) -> np.ndarray:
+        """
+        Maschera (P, H): True se il sole è sopra l'orizzonte del terreno.
+        solar_hours: ore solari locali (12 = mezzogiorno solare), (H,).
+        """
+        return self._sun(day_of_year, solar_hours)[1]
+
+    def sun_hidden(self, day_of_year: int, solar_hours: Sequence[float]) -> np.ndarray:
+        """Maschera (P, H): sole alzato ma nascosto dal terreno (ombra portata)."""
+        up, visible = self._sun(day_of_year, solar_hours)
+        return up & ~visible
+
+    def resample_to(self, lat: Sequence[float], lon: Sequence[float]) -> "HorizonModel":
+        """Orizzonte del campione più vicino per ciascun punto dato."""
+        la = np.asarray(lat, dtype=float)
+        lo = np.asarray(lon, dtype=float)
+        kx = np.cos(np.radians(np.mean(self.lat))) if len(self) else 1.0
+        d2 = (la[:, None] - self.lat[None, :]) ** 2 + ((lo[:, None] - self.lon[None, :]) * kx) ** 2
+        near = np.argmin(d2, axis=1)
+        return HorizonModel(la, lo, self.angle_deg[near], self.ok[near])
+
+
+# ----------------------------------------------------------------------
+# Calcolo (vettoriale) + cache per punto
+# ----------------------------------------------------------------------
+def _compute_angles(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    elevation_fn: ElevationFn,
+    n_sectors: int,
+    distances: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(angoli (P, N), punti con quota nota (P,))."""
+    p = lat.size
+    az = np.radians(np.arange(n_sectors) * (360.0 / n_sectors))
+    dn = np.cos(az)[:, None] * distances[None, :]  # (N, K) metri verso nord
+    de = np.sin(az)[:, None] * distances[None, :]
+    kx = M_PER_DEG_LAT * np.maximum(0.1, np.cos(np.radians(lat)))
+    rlat = lat[:, None, None] + dn[None] / M_PER_DEG_LAT
+    rlon = lon[:, None, None] + de[None] / kx[:, None, None]
+
+    z = np.asarray(
+        elevation_fn(np.concatenate([lat, rlat.ravel()]), np.concatenate([lon, rlon.ravel()])),
+        dtype=float,
+    )
+    z0 = z[:p] + OBSERVER_HEIGHT_M
+    zr = z[p:].reshape(p, n_sectors, distances.size)
+
+    drop = distances**2 * (1.0 - REFRACTION_K) / (2.0 * EARTH_RADIUS_M)
+    ang = np.degrees(np.arctan2(zr - drop[None, None, :] - z0[:, None, None], distances[None, None, :]))
+    ang = np.where(np.isfinite(ang), ang, -90.0).max(axis=2)
+    # quota del punto o di un campione dei raggi ignota (es. blocco
+    # /elevation fallito) → orizzonte piatto, ok = False e niente cache:
+    # un raggio a -90° sottostimerebbe l'orizzonte per sempre
+    ok = np.isfinite(z0) & np.isfinite(zr).all(axis=(1, 2))
+    return np.where(ok[:, None], ang, 0.0), ok
+
+
+_cache: "OrderedDict[Tuple[float, float, int, int], np.ndarray]" = OrderedDict()
+_failed: Dict[Tuple[float, float, int, int], float] = {}  # chiave → scadenza
+_cache_lock = threading.Lock()
+
+
+def horizon_model(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    elevation_fn: ElevationFn,
+    n_sectors: int = HORIZON_SECTORS,
+    distances: Optional[np.ndarray] = None,
+) -> HorizonModel:
+    """
+    Orizzonte per i punti dati. Solo i punti non in cache vanno al DEM,
+    tutti insieme in una chiamata. I punti falliti di recente non si
+    richiedono: orizzonte piatto e ok = False.
+    """
+    la = np.asarray(lat, dtype=float).ravel()
+    lo = np.asarray(lon, dtype=float).ravel()
+    dist = HORIZON_DISTANCES_M if distances is None else np.asarray(distances, dtype=float)
+    keys = [
+        (round(float(a), HORIZON_DECIMALS), round(float(b), HORIZON_DECIMALS), n_sectors, dist.size)
+        for a, b in zip(la, lo)
+    ]
+
+    angles = np.zeros((la.size, n_sectors))
+    valid = np.ones(la.size, dtype=bool)
+    missing = []
+    now = time.monotonic()
+    with _cache_lock:
+        for i, k in enumerate(keys):
+            row = _cache.get(k)
+            if row is not None:
+                _cache.move_to_end(k)
+                angles[i] = row
+            elif _failed.get(k, 0.0) > now:
+                valid[i] = False
+            else:
+                missing.append(i)
+
+    if missing:
+        idx = np.asarray(missing)
+        rows, ok = _compute_angles(la[idx], lo[idx], elevation_fn, n_sectors, dist)
+        angles[idx] = rows
+        valid[idx] = ok
+        expires = time.monotonic() + HORIZON_FAIL_TTL_S
+        with _cache_lock:
+            for i, row, good in zip(missing, rows, ok):
+                if good:
+                    _cache[keys[i]] = row.astype(np.float32)
+                    _failed.pop(keys[i], None)
+                else:
+                    _failed[keys[i]] = expires
+            while len(_cache) > HORIZON_CACHE_SIZE:
+                _cache.popitem(last=False)
+            if len(_failed) > HORIZON_CACHE_SIZE:
+                for k in [k for k, t in _failed.items() if t <= now]:
+                    del _failed[k]
+
+    return HorizonModel(la, lo, angles, valid)
@@ -0,0 +1,169 @@
+# core/http_backend.py
+# Backend HTTP intercambiabile per Telemark · Pro Wax & Tune
+#
+# - "live"   → requests diretto (default)
+# - "record" → requests diretto + salvataggio risposta su disco
+# - "replay" → nessuna rete: risposte lette dalle fixture registrate
+#
+# Modalità e cartella si scelgono con:
+#   TELEMARK_HTTP_MODE      = live | record | replay
+#   TELEMARK_HTTP_FIXTURES  = cartella fixture (default ./fixtures/http)
+# oppure da codice con set_mode(...).
+#
+# Usato da core.meteo, core.dem_tools, core.overpass e dai geocoder, così
+# l'intera pipeline meteo → tuning gira offline in modo deterministico
+# (benchmark / profiling / load test senza api.open-meteo.com).
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+
+MODES = ("live", "record", "replay")
+
+_mode: str = os.environ.get("TELEMARK_HTTP_MODE", "live").strip().lower() or "live"
+_fixtures_dir: Path = Path(os.environ.get("TELEMARK_HTTP_FIXTURES", "fixtures/http"))
+
+
+class FixtureMissing(requests.exceptions.ConnectionError):
+    """Richiesta non presente fra le fixture in modalità replay."""
+
+
+class ReplayResponse:
+    """Sottoinsieme di requests.Response usato nell'app."""
+
+    def __init__(self, url: str, status_code: int, text: str) -> None:
+        self.url = url
+        self.status_code = int(status_code)
+        self.text = text
+
+    @property
+    def content(self) -> bytes:
+        return self.text.encode("utf8")
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(
+                f"{self.status_code} (replay) for url: {self.url}", response=None
+            )
+
+
+# ----------------------------------------------------------------------
+# Configurazione
+# ----------------------------------------------------------------------
+def set_mode(mode: str, fixtures_dir: Optional[str] = None) -> None:
+    """Imposta modalità ("live" / "record" / "replay") e cartella fixture."""
+    global _mode, _fixtures_dir
+    mode = str(mode).strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"modalità HTTP non valida: {mode!r} (attese: {MODES})")
+    _mode = mode
+    if fixtures_dir is not None:
+        _fixtures_dir = Path(fixtures_dir)
+
+
+def get_mode() -> Tuple[str, Path]:
+    return _mode, _fixtures_dir
+
+
+# ----------------------------------------------------------------------
+# Chiave fixture
+# ----------------------------------------------------------------------
+def _normalize_body(data: Any) -> str:
+    if data is None:
+        return ""
+    if isinstance(data, bytes):
+        return data.decode("utf8", errors="replace")
+    if isinstance(data, dict):
+        return urlencode(sorted((str(k), str(v)) for k, v in data.items()))
+    return str(data)
+
+
+def _fixture_key(method: str, url: str, params: Optional[Dict[str, Any]], body: str) -> str:
+    norm_params = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    raw = "\n".join([method.upper(), url, norm_params, body])
+    return hashlib.sha1(raw.encode("utf8")).hexdigest()
+
+
+def _fixture_path(key: str) -> Path:
+    return _fixtures_dir / f"{key}.json"
+
+
+def _save_fixture(
+    key: str,
+    method: str,
+    url: str,
+    params: Optional[Dict[str, Any]],
+    body: str,
+    resp: requests.Response,
+) -> None:
+    record = {
+        "method": method.upper(),
+        "url": url,
+        "params": {str(k): str(v) for k, v in (params or {}).items()},
+        "body": body,
+        "status": resp.status_code,
+        "text": resp.text,
+    }
+    try:
+        _fixtures_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(_fixtures_dir), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp, _fixture_path(key))
+    except Exception:
+        pass
+
+
+def _load_fixture(key: str, url: str) -> ReplayResponse:
+    path = _fixture_path(key)
+    try:
+        with open(path, "r", encoding="utf8") as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        raise FixtureMissing(f"nessuna fixture per {url} ({path.name})")
+    return ReplayResponse(url, record.get("status", 200), record.get("text", ""))
+
+
+# ----------------------------------------------------------------------
+# API pubblica (stessa firma di requests.get / requests.post)
+# ----------------------------------------------------------------------
+def request(
+    method: str,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    data: Any = None,
+    **kwargs: Any,
+):
+    body = _normalize_body(data)
+    key = _fixture_key(method, url, params, body)
+
+    if _mode == "replay":
+        return _load_fixture(key, url)
+
+    resp = requests.request(method, url, params=params, data=data, **kwargs)
+    if _mode == "record":
+        _save_fixture(key, method, url, params, body, resp)
+    return resp
+
+
+def get(url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any):
+    return request("GET", url, params=params, **kwargs)
+
+
+def post(url: str, data: Any = None, **kwargs: Any):
+    return request("POST", url, data=data, **kwargs)
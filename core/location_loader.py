@@ -0,0 +1,183 @@
+# core/location_loader.py
+# Prefetch concorrente dei dati di una località (piste, DEM, meteo)
+#
+# - Appena le coordinate sono note (ricerca località / gara) lancia in
+#   parallelo, su un pool di thread condiviso:
+#     · piste + impianti (core.maps._load_resort: store a tile o Overpass)
+#     · patch DEM attorno al punto (core.dem_tools.dem_patch)
+#     · previsione oraria del giorno (core.meteo._fetch_hourly_meteo,
+#       che salva anche nella cache SQLite dei run modello)
+#     · rete piste con le quote dei nodi e dislivelli del catalogo
+#       (core.maps._piste_catalogue_with_elevation)
+#     · orizzonte DEM del punto, solo se la sezione meteo applica
+#       l'ombra del terreno (terrain_shading)
+# - I risultati finiscono nelle stesse cache usate dal rendering:
+#   render_map, render_dem e la sezione meteo chiamano wait(...) prima di
+#   leggere, così non rilanciano un fetch già in corso e la prima
+#   visualizzazione dura quanto il fetch più lento, non la somma.
+# - Pool condiviso da tutte le sessioni, dimensionato per più sessioni
+#   contemporanee; wait() non aspetta un task ancora in coda (lo annulla
+#   e lascia fare al chiamante), solo uno già partito o finito.
+# - Un solo prefetch attivo per sessione (st.session_state), riusato ai
+#   rerun finché coordinate e giorno non cambiano.
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date as Date
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import streamlit as st
+
+try:  # contesto Streamlit nei thread (cache_data / spinner senza warning)
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except Exception:  # pragma: no cover - versioni vecchie di Streamlit
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+SESSION_KEY = "_location_prefetch"
+COORD_DECIMALS = 4  # ~10 m: stessa località per rerun successivi
+WAIT_TIMEOUT_S = 40.0
+
+PREFETCH_SESSIONS = 4  # sessioni con un prefetch completo in parallelo
+
+
+class LocationPrefetch:
+    """Fetch in corso per una località: nome → Future."""
+
+    def __init__(self, key: Tuple[float, float, Date, str, bool], futures: Dict[str, Future]) -> None:
+        self.key = key
+        self.futures = futures
+
+    def matches(self, lat: float, lon: float) -> bool:
+        return (round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS)) == self.key[:2]
+
+    def result(self, name: str, timeout: Optional[float] = WAIT_TIMEOUT_S) -> Any:
+        fut = self.futures.get(name)
+        if fut is None:
+            return None
+        # ancora in coda (pool pieno): il chiamante fa prima da sé
+        if not fut.running() and not fut.done():
+            fut.cancel()
+            return None
+        try:
+            return fut.result(timeout=timeout)
+        except Exception:
+            return None
+
+
+# ----------------------------------------------------------------------
+# Task
+# ----------------------------------------------------------------------
+def _task_pistes(lat: float, lon: float, day: Date, provider: str) -> Any:
+    from core import maps
+
+    return maps._load_resort(lat, lon)
+
+
+def _task_dem(lat: float, lon: float, day: Date, provider: str) -> Any:
+    from core import dem_tools
+
+    return dem_tools.dem_patch(lat, lon)
+
+
+def _task_network(lat: float, lon: float, day: Date, provider: str) -> Any:
+    from core import maps
+
+    # piste dalla cache (o dal fetch Overpass già in volo, coalescente)
+    return maps._piste_catalogue_with_elevation(lat, lon)
+
+
+def _task_horizon(lat: float, lon: float, day: Date, provider: str) -> Any:
+    from core import meteo
+
+    return meteo._location_horizon(lat, lon)
+
+
+def _task_forecast(lat: float, lon: float, day: Date, provider: str) -> Any:
+    from core import meteo, meteo_cache
+
+    if provider == "ensemble":  # più modelli: lo gestisce build_ensemble_profile
+        return None
+    model = meteo.MODEL_PROVIDERS.get(provider, meteo.DEFAULT_MODEL)
+    # stesse coordinate arrotondate della cache su disco
+    return meteo._fetch_hourly_meteo(
+        round(lat, meteo_cache.COORD_DECIMALS),
+        round(lon, meteo_cache.COORD_DECIMALS),
+        day,
+        model,
+    )
+
+
+TASKS: Dict[str, Callable[[float, float, Date, str], Any]] = {
+    "pistes": _task_pistes,
+    "dem": _task_dem,
+    "forecast": _task_forecast,
+    "network": _task_network,
+    "horizon": _task_horizon,
+}
+
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=PREFETCH_SESSIONS * len(TASKS),
+    thread_name_prefix="telemark-prefetch",
+)
+
+
+def _submit(fn: Callable[..., Any], *args: Any) -> Future:
+    script_ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+    def _run() -> Any:
+        if script_ctx is not None and add_script_run_ctx is not None:
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+        return fn(*args)
+
+    return _EXECUTOR.submit(_run)
+
+
+# ----------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------
+def prefetch_location(
+    lat: float,
+    lon: float,
+    day: Date,
+    provider: str = "auto",
+    terrain_shading: bool = False,
+) -> LocationPrefetch:
+    """
+    Avvia (o riusa) il prefetch concorrente per (lat, lon, giorno).
+    provider / terrain_shading: come ctx["provider"] / ctx["terrain_shading"]
+    della sezione meteo (senza ombra del terreno l'orizzonte non serve).
+    Non blocca: ritorna subito.
+    """
+    key = (
+        round(float(lat), COORD_DECIMALS),
+        round(float(lon), COORD_DECIMALS),
+        day,
+        provider,
+        bool(terrain_shading),
+    )
+    current = st.session_state.get(SESSION_KEY)
+    if isinstance(current, LocationPrefetch) and current.key == key:
+        return current
+
+    futures = {
+        name: _submit(fn, float(lat), float(lon), day, provider)
+        for name, fn in TASKS.items()
+        if name != "horizon" or terrain_shading
+    }
+    pf = LocationPrefetch(key, futures)
+    st.session_state[SESSION_KEY] = pf
+    return pf
+
+
+def wait(name: str, lat: float, lon: float) -> Any:
+    """
+    Se c'è un prefetch per queste coordinate, aspetta il suo task `name`
+    e ne ritorna il risultato; altrimenti None (il chiamante fa da sé).
+    """
+    pf = st.session_state.get(SESSION_KEY)
+    if not isinstance(pf, LocationPrefetch) or not pf.matches(lat, lon):
+        return None
+    return pf.result(name)
@@ -4,17 +4,51 @@
 # - Se cambi località (nuovo centro) seleziona la pista più vicina
 # - Mantiene la pista selezionata tra i refresh
 # - Esporta sempre pov_piste_points per POV 2D/3D
+# - Piste in forma colonnare (core.pistes.PisteSet, parser Overpass lineare)
+# - Snap del click e pista più vicina via indice spaziale a griglia
+#   (core.piste_index), costruito una volta per insieme di piste
+# - Piste lette dallo store locale a tile (core.piste_store) se la zona
+#   è stata importata; Overpass resta il ripiego per zone non coperte
+# - Livello di dettaglio: piste semplificate (Douglas–Peucker) con
+#   tolleranza legata allo zoom corrente
+# - Rendering: un solo layer GeoJSON per le piste e uno per i nomi
+#   (stringhe in cache per comprensorio e zoom), selezione in un layer a parte
+# - Rete piste/impianti (core.piste_network) in cache per comprensorio:
+#   statistiche della pista selezionata esportate in pov_piste_stats
+# - Catalogo piste per comprensorio (core.piste_catalogue): etichette
+#   univoche per omonimi, usato da selettore, nomi, snap ed export POV;
+#   costruito dalle sole piste, il dislivello (rete + /elevation) arriva
+#   dopo, solo per la pista selezionata
+# - pov_piste_points: pista ricampionata a passo costante con quote reali
+#   (richieste /elevation a blocchi, cache per pista); se le quote non
+#   sono complete, tracciato piatto e pov_piste_has_elev = False
+# - Terreno lungo tutta la pista selezionata (core.terrain): pendenze,
+#   esposizione, ombra → ctx["piste_terrain"] per il tuning
+# - Overpass via client condiviso (core.overpass): query coalescenti fra
+#   sessioni, centro su griglia, failover fra mirror; un errore non viene
+#   messo in cache e non si traduce più in "Piste trovate: 0" silenzioso
+# - Piste eventualmente già in arrivo dal prefetch di località
+#   (core.location_loader), lanciato in parallelo a DEM e meteo
 
 from __future__ import annotations
 
+from datetime import date, datetime
 from typing import Dict, Any, List, Tuple, Optional
+import json
 import math
-import requests
+
+import numpy as np
 import streamlit as st
 from streamlit_folium import st_folium
 import folium
 
-UA = {"User-Agent": "telemark-wax-pro/3.0"}
+from core import dem_tools, location_loader, overpass, piste_store
+from core.piste_network import PisteNetwork, resample_polyline
+from core.piste_catalogue import PisteCatalogue
+from core.piste_index import PisteSpatialIndex
+from core.pistes import PisteSet, lod_tolerance_m, lod_zoom, parse_overpass_resort
+from core.horizon import horizon_model
+from core.terrain import TerrainProfile, terrain_profile
 
 BASE_SNAP = 300.0  # raggio snap quando sei vicino (zoom alto)
 CENTER_MOVE_THRESHOLD_M = 500.0  # se il centro si sposta più di così → nuova località
@@ -58,112 +92,282 @@ def _snap_radius(prev: Optional[Dict[str, Any]]) -> float:
 # Fetch piste da Overpass
 # ----------------------------------------------------------------------
 @st.cache_data(ttl=1800)
-def _fetch_pistes(lat: float, lon: float, radius_km: float = 5.0):
-    radius_m = int(radius_km * 1000)
+def _fetch_resort(lat: float, lon: float, radius_km: float = 5.0) -> Tuple[PisteSet, PisteSet]:
+    """
+    (piste, impianti) attorno al centro, da Overpass in una sola query.
+    Centro arrotondato alla griglia del client (centri vicini condividono
+    la richiesta). Se nessun mirror risponde, o la risposta è parziale
+    (timeout del server), solleva OverpassError: un errore non finisce in
+    cache, al rerun si riprova.
+    """
+    q_lat, q_lon, radius_m = overpass.snap_center(lat, lon, radius_km * 1000)
 
     q = f"""
     [out:json][timeout:25];
     (
-      way["piste:type"="downhill"](around:{radius_m},{lat},{lon});
-      relation["piste:type"="downhill"](around:{radius_m},{lat},{lon});
+      way["piste:type"="downhill"](around:{radius_m},{q_lat},{q_lon});
+      relation["piste:type"="downhill"](around:{radius_m},{q_lat},{q_lon});
+      way["aerialway"](around:{radius_m},{q_lat},{q_lon});
     );
     (._;>;);
     out body;
     """
 
+    js = overpass.query(q, timeout=25)
+    if overpass.is_partial(js):
+        raise overpass.OverpassError(f"risposta parziale: {js.get('remark')}")
+    return parse_overpass_resort(js)
+
+
+def _fetch_pistes(lat: float, lon: float, radius_km: float = 5.0) -> PisteSet:
+    return _fetch_resort(lat, lon, radius_km)[0]
+
+
+# ----------------------------------------------------------------------
+# Piste della vista: store a tile locale, Overpass solo come ripiego
+# ----------------------------------------------------------------------
+@st.cache_data(ttl=1800)
+def _load_resort(lat: float, lon: float, radius_km: float = 5.0) -> Tuple[PisteSet, PisteSet]:
+    local = piste_store.load_resort(lat, lon, radius_km)
+    if local is not None:
+        return local
+    return _fetch_resort(lat, lon, radius_km)
+
+
+def _load_pistes(lat: float, lon: float, radius_km: float = 5.0) -> PisteSet:
+    return _load_resort(lat, lon, radius_km)[0]
+
+
+# ----------------------------------------------------------------------
+# Indice spaziale (stessa chiave e TTL di _load_pistes)
+# ----------------------------------------------------------------------
+@st.cache_resource(ttl=1800)
+def _piste_index(lat: float, lon: float, radius_km: float = 5.0) -> PisteSpatialIndex:
+    pistes = _load_pistes(lat, lon, radius_km)
+    return PisteSpatialIndex(pistes.coords, pistes.offsets)
+
+
+# ----------------------------------------------------------------------
+# Rete piste + impianti (quote dei soli nodi di rete da /elevation)
+# ----------------------------------------------------------------------
+@st.cache_resource(ttl=1800)
+def _piste_network(lat: float, lon: float, radius_km: float = 5.0) -> PisteNetwork:
+    """
+    Rete con le quote dei nodi. Se /elevation non ha dato nessuna quota
+    solleva RuntimeError: la rete non entra in cache (verso di discesa e
+    dislivelli sarebbero sbagliati per 30 min) e si riprova al rerun.
+    """
+    pistes, lifts = _load_resort(lat, lon, radius_km)
+    net = PisteNetwork.build(pistes, lifts, elevation_fn=dem_tools.fetch_elevations)
+    if net.node_elev.size and not np.isfinite(net.node_elev).any():
+        raise RuntimeError("quote dei nodi di rete non disponibili")
+    return net
+
+
+# ----------------------------------------------------------------------
+# Catalogo piste del comprensorio (etichette univoche, lookup O(1))
+# ----------------------------------------------------------------------
+@st.cache_resource(ttl=1800)
+def _piste_catalogue(lat: float, lon: float, radius_km: float = 5.0) -> PisteCatalogue:
+    """Solo dalle piste (nomi, bbox, lunghezze): mappa e selettore non aspettano /elevation."""
+    return PisteCatalogue.build(_load_pistes(lat, lon, radius_km))
+
+
+@st.cache_resource(ttl=1800)
+def _piste_catalogue_with_elevation(
+    lat: float,
+    lon: float,
+    radius_km: float = 5.0,
+) -> PisteCatalogue:
+    """Catalogo con i dislivelli dalla rete piste (RuntimeError, non in cache, senza quote)."""
+    elev_min, elev_max = _piste_network(lat, lon, radius_km).elevation_range_by_line()
+    return _piste_catalogue(lat, lon, radius_km).with_elevation(elev_min, elev_max)
+
+
+def _entry_vertical_m(lat: float, lon: float, label: str) -> Optional[float]:
+    """Dislivello della voce di catalogo, None se le quote non sono disponibili."""
     try:
-        r = requests.post(
-            "https://overpass-api.de/api/interpreter",
-            data=q.encode("utf8"),
-            headers=UA,
-            timeout=25,
-        )
-        r.raise_for_status()
-        js = r.json()
+        entry = _piste_catalogue_with_elevation(lat, lon).by_label(label)
     except Exception:
-        return 0, [], []
-
-    elements = js.get("elements", [])
-    nodes = {e["id"]: e for e in elements if e.get("type") == "node"}
-
-    polylines: List[List[Tuple[float, float]]] = []
-    names: List[Optional[str]] = []
-    count = 0
-
-    def _nm(tags):
-        if not tags:
-            return None
-        for k in ("name", "piste:name", "ref"):
-            v = tags.get(k)
-            if v:
-                return str(v).strip()
         return None
+    return entry.vertical_m if entry is not None else None
 
-    for el in elements:
-        if el.get("type") not in ("way", "relation"):
-            continue
-        tags = el.get("tags") or {}
-        if tags.get("piste:type") != "downhill":
-            continue
 
-        coords: List[Tuple[float, float]] = []
+# ----------------------------------------------------------------------
+# Tracciato con quote per POV / DEM (cache per pista)
+# ----------------------------------------------------------------------
+POV_SPACING_M = 25.0  # passo di ricampionamento (DEM Open-Meteo ~90 m)
+HORIZON_SPACING_M = 250.0  # orizzonte calcolato ogni 250 m di pista
 
-        if el["type"] == "way":
-            for nid in el.get("nodes", []):
-                nd = nodes.get(nid)
-                if nd:
-                    coords.append((nd["lat"], nd["lon"]))
-        else:
-            for mem in el.get("members", []):
-                if mem.get("type") != "way":
-                    continue
-                wid = mem.get("ref")
-                way = next(
-                    (
-                        w
-                        for w in elements
-                        if w.get("type") == "way" and w.get("id") == wid
-                    ),
-                    None,
-                )
-                if way:
-                    for nid in way.get("nodes", []):
-                        nd = nodes.get(nid)
-                        if nd:
-                            coords.append((nd["lat"], nd["lon"]))
-
-        if len(coords) >= 2:
-            polylines.append(coords)
-            names.append(_nm(tags))
-            count += 1
-
-    return count, polylines, names
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def _piste_points_with_elev_cached(
+    piste_key: str,
+    _coords: np.ndarray,
+    spacing_m: float = POV_SPACING_M,
+) -> List[Dict[str, float]]:
+    """
+    Pista ricampionata a passo costante con quote da /elevation, chieste
+    a blocchi (dem_tools.fetch_elevations). Cache per chiave pista e passo;
+    le coordinate non entrano nella chiave. Se manca anche una sola quota
+    solleva RuntimeError, così il risultato non entra in cache.
+    """
+    lat, lon, _ = resample_polyline(_coords[:, 0], _coords[:, 1], spacing_m)
+    elev = dem_tools.fetch_elevations(lat, lon)
+    if not np.isfinite(elev).all():
+        raise RuntimeError(f"quote mancanti per {int((~np.isfinite(elev)).sum())} punti")
+    return [
+        {"lat": float(a), "lon": float(b), "elev": float(e)}
+        for a, b, e in zip(lat, lon, elev)
+    ]
+
+
+def _piste_points_with_elev(
+    piste_key: str,
+    coords: np.ndarray,
+    spacing_m: float = POV_SPACING_M,
+) -> Optional[List[Dict[str, float]]]:
+    """Come _piste_points_with_elev_cached; None se le quote non sono complete."""
+    try:
+        return _piste_points_with_elev_cached(piste_key, coords, spacing_m)
+    except Exception:
+        return None
+
+
+def _strict_elevations(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """fetch_elevations che solleva RuntimeError se manca anche una sola quota."""
+    z = dem_tools.fetch_elevations(lats, lons)
+    if not np.isfinite(z).all():
+        raise RuntimeError(f"quote mancanti per {int((~np.isfinite(z)).sum())} punti")
+    return z
+
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def _piste_terrain_cached(
+    piste_key: str,
+    _coords: np.ndarray,
+    day: date,
+    spacing_m: float = POV_SPACING_M,
+) -> TerrainProfile:
+    """
+    Pendenza, esposizione, curvatura e sole lungo tutta la pista
+    (core.terrain), sugli stessi punti dell'export POV, con l'ombra delle
+    montagne (orizzonte ogni HORIZON_SPACING_M). Cache per chiave pista,
+    giorno (posizione del sole) e passo. Solleva RuntimeError se mancano
+    quote o orizzonte, così un risultato parziale non entra in cache.
+    """
+    lat, lon, dist = resample_polyline(_coords[:, 0], _coords[:, 1], spacing_m)
+    h_lat, h_lon, _ = resample_polyline(_coords[:, 0], _coords[:, 1], HORIZON_SPACING_M)
+    horizon = horizon_model(h_lat, h_lon, dem_tools.fetch_elevations)
+    if not horizon.ok.all():
+        raise RuntimeError("orizzonte DEM incompleto")
+    terrain = terrain_profile(
+        lat,
+        lon,
+        dist,
+        elevation_fn=_strict_elevations,
+        day=day,
+        horizon=horizon,
+    )
+    if terrain is None:
+        raise RuntimeError("profilo di terreno non disponibile")
+    return terrain
+
+
+def _piste_terrain(
+    piste_key: str,
+    coords: np.ndarray,
+    day: date,
+    spacing_m: float = POV_SPACING_M,
+) -> Optional[TerrainProfile]:
+    """Come _piste_terrain_cached; None se quote o orizzonte non sono completi."""
+    try:
+        return _piste_terrain_cached(piste_key, coords, day, spacing_m)
+    except Exception:
+        return None
+
+
+# ----------------------------------------------------------------------
+# Layer GeoJSON piste (stringa precalcolata per comprensorio e zoom)
+# ----------------------------------------------------------------------
+LABEL_CSS = (
+    "font-size:10px;color:white;text-shadow:0 0 3px black;"
+    "background:rgba(0,0,0,.3);border:none;box-shadow:none;"
+    "padding:1px 3px;border-radius:3px;"
+)
+
+
+def _piste_style(feature: Dict[str, Any]) -> Dict[str, Any]:
+    return {"color": "blue", "weight": 3, "opacity": 0.6}
+
+
+@st.cache_data(ttl=1800)
+def _pistes_geojson(
+    lat: float,
+    lon: float,
+    zoom_level: int,
+    radius_km: float = 5.0,
+) -> Tuple[str, str]:
+    """
+    (linee, etichette) come FeatureCollection JSON:
+      - linee: una LineString per pista, semplificata per zoom_level
+      - etichette: un Point per voce del catalogo (a metà del tratto principale)
+    Coordinate a 5 decimali (~1 m).
+    """
+    pistes = _load_pistes(lat, lon, radius_km)
+    catalogue = _piste_catalogue(lat, lon, radius_km)
+    lod = pistes.simplified(lod_tolerance_m(zoom_level, lat))
+
+    lines: List[Dict[str, Any]] = []
+    for i in range(len(lod)):
+        entry = catalogue.entry_of_piste(i)
+        ll = np.round(lod.coords_of(i)[:, ::-1], 5).tolist()
+        lines.append(
+            {
+                "type": "Feature",
+                "properties": {"idx": i, "name": entry.label if entry else ""},
+                "geometry": {"type": "LineString", "coordinates": ll},
+            }
+        )
+
+    labels: List[Dict[str, Any]] = [
+        {
+            "type": "Feature",
+            "properties": {"name": e.label},
+            "geometry": {
+                "type": "Point",
+                "coordinates": [round(e.midpoint[1], 5), round(e.midpoint[0], 5)],
+            },
+        }
+        for e in catalogue.entries
+    ]
+
+    def _fc(features: List[Dict[str, Any]]) -> str:
+        return json.dumps(
+            {"type": "FeatureCollection", "features": features},
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+
+    return _fc(lines), _fc(labels)
 
 
 # ----------------------------------------------------------------------
 # Helper: pista più vicina a un punto
 # ----------------------------------------------------------------------
 def _nearest_piste_to_point(
-    polylines: List[List[Tuple[float, float]]],
-    names: List[Optional[str]],
+    catalogue: PisteCatalogue,
+    index: PisteSpatialIndex,
     lat: float,
     lon: float,
+    max_dist_m: Optional[float] = None,
 ) -> Tuple[Optional[str], Optional[Tuple[float, float]]]:
-    best_nm: Optional[str] = None
-    best_pt: Optional[Tuple[float, float]] = None
-    best_d = float("inf")
-
-    for coords, nm in zip(polylines, names):
-        if not coords:
-            continue
-        for plat, plon in coords:
-            d = _dist_m(lat, lon, plat, plon)
-            if d < best_d:
-                best_d = d
-                best_nm = nm
-                best_pt = (plat, plon)
-
-    return best_nm, best_pt
+    """(etichetta catalogo, punto agganciato) della pista più vicina."""
+    hit = index.nearest(lat, lon, max_dist_m=max_dist_m)
+    if hit is None:
+        return None, None
+    entry = catalogue.entry_of_piste(hit.piste)
+    return (entry.label if entry else None), (hit.lat, hit.lon)
 
 
 # ----------------------------------------------------------------------
@@ -200,63 +404,62 @@ def render_map(T, ctx: Dict[str, Any]) -> Dict[str, Any]:
         except Exception:
             center_changed = False
 
-    # Carica piste
-    count, polylines, names = _fetch_pistes(base_lat, base_lon)
-
-    # Lista piste con nome
-    named = [(c, n) for c, n in zip(polylines, names) if n]
-    unique_names = sorted({n for _, n in named})
+    # Carica piste (se c'è un prefetch in corso per questo centro lo aspetto)
+    location_loader.wait("pistes", base_lat, base_lon)
+    pistes_error: Optional[str] = None
+    try:
+        pistes = _load_pistes(base_lat, base_lon)
+        index = _piste_index(base_lat, base_lon)
+        catalogue = _piste_catalogue(base_lat, base_lon)
+    except overpass.OverpassError as e:
+        pistes_error = str(e)
+        pistes = PisteSet.empty()
+        index = PisteSpatialIndex(pistes.coords, pistes.offsets)
+        catalogue = PisteCatalogue.build(pistes)
+    count = len(pistes)
 
     # ---- selezione pista (logica C) ----
+    # (selected è l'etichetta univoca del catalogo)
     # 1) se esiste già in sessione → la manteniamo
     selected: Optional[str] = st.session_state.get(sel_key)
 
     # 2) se non c'è e il centro è cambiato parecchio (nuova località) → pista più vicina
-    if not selected and center_changed and polylines:
+    if not selected and center_changed and count:
         auto_nm, auto_pt = _nearest_piste_to_point(
-            polylines, names, base_lat, base_lon
+            catalogue, index, base_lat, base_lon
         )
         if auto_nm and auto_pt:
             selected = auto_nm
             marker_lat, marker_lon = auto_pt
 
     # 3) se ancora niente e ctx porta già un nome pista valido → usalo
-    if (
-        not selected
-        and isinstance(ctx.get("selected_piste_name"), str)
-        and ctx["selected_piste_name"] in unique_names
-    ):
-        selected = ctx["selected_piste_name"]
+    #    (etichetta del catalogo o nome OSM semplice → prima voce omonima)
+    if not selected and isinstance(ctx.get("selected_piste_name"), str):
+        wanted = ctx["selected_piste_name"]
+        if wanted in catalogue:
+            selected = wanted
+        elif catalogue.by_name(wanted):
+            selected = catalogue.by_name(wanted)[0].label
 
     # Snap dinamico in base allo zoom
     prev = st.session_state.get(map_key)
     radius = _snap_radius(prev)
 
-    # Se c'è un click → snap sulla pista più vicina
-    if isinstance(prev, dict) and polylines:
+    # Se c'è un click → snap sul segmento di pista più vicino
+    if isinstance(prev, dict) and count:
         click = prev.get("last_clicked")
         if click:
-            c_lat = float(click["lat"])
-            c_lon = float(click["lng"])
-            best_d = float("inf")
-            best_nm: Optional[str] = None
-            best_lat = c_lat
-            best_lon = c_lon
-
-            for coords, nm in zip(polylines, names):
-                for plat, plon in coords:
-                    d = _dist_m(c_lat, c_lon, plat, plon)
-                    if d < best_d:
-                        best_d = d
-                        best_lat = plat
-                        best_lon = plon
-                        best_nm = nm
-
-            if best_d <= radius:
-                marker_lat = best_lat
-                marker_lon = best_lon
-                if best_nm:
-                    selected = best_nm
+            snap_nm, snap_pt = _nearest_piste_to_point(
+                catalogue,
+                index,
+                float(click["lat"]),
+                float(click["lng"]),
+                max_dist_m=radius,
+            )
+            if snap_pt:
+                marker_lat, marker_lon = snap_pt
+                if snap_nm:
+                    selected = snap_nm
 
     # Zoom iniziale
     zoom = 15
@@ -281,34 +484,40 @@ def render_map(T, ctx: Dict[str, Any]) -> Dict[str, Any]:
         name="Satellite",
     ).add_to(m)
 
-    # Disegno piste
-    added_labels = set()
-    for coords, nm in zip(polylines, names):
-        is_sel = (nm == selected)
+    # Disegno piste: un solo layer GeoJSON (cache per comprensorio e zoom)
+    # + etichette in un solo layer; la selezione è un layer a parte
+    if pistes_error is None:
+        lines_js, labels_js = _pistes_geojson(base_lat, base_lon, lod_zoom(zoom))
+    else:
+        lines_js = labels_js = '{"type":"FeatureCollection","features":[]}'
+    folium.GeoJson(
+        lines_js,
+        name="Piste",
+        style_function=_piste_style,
+        tooltip=folium.GeoJsonTooltip(fields=["name"], labels=False),
+    ).add_to(m)
+    folium.GeoJson(
+        labels_js,
+        name="Nomi piste",
+        marker=folium.CircleMarker(radius=0, opacity=0, fill_opacity=0),
+        tooltip=folium.GeoJsonTooltip(
+            fields=["name"],
+            labels=False,
+            permanent=True,
+            direction="center",
+            style=LABEL_CSS,
+        ),
+    ).add_to(m)
 
+    sel_entry = catalogue.by_label(selected)
+    if sel_entry is not None:
         folium.PolyLine(
-            locations=coords,
-            color="red" if is_sel else "blue",
-            weight=6 if is_sel else 3,
-            opacity=1 if is_sel else 0.6,
+            locations=[pistes.coords_of(i).tolist() for i in sel_entry.pistes],
+            color="red",
+            weight=6,
+            opacity=1,
         ).add_to(m)
 
-        # Nome pista una sola volta
-        if nm and nm not in added_labels:
-            mid = coords[len(coords) // 2]
-            folium.Marker(
-                location=[mid[0], mid[1]],
-                icon=folium.DivIcon(
-                    html=(
-                        "<div style='font-size:10px;color:white;"
-                        "text-shadow:0 0 3px black; background:rgba(0,0,0,.3);"
-                        "padding:1px 3px;border-radius:3px;'>"
-                        f"{nm}</div>"
-                    )
-                ),
-            ).add_to(m)
-            added_labels.add(nm)
-
     # Marker utente
     folium.Marker(
         location=[marker_lat, marker_lon],
@@ -317,6 +526,8 @@ def render_map(T, ctx: Dict[str, Any]) -> Dict[str, Any]:
 
     # Render mappa
     st_folium(m, height=450, key=map_key)
+    if pistes_error is not None:
+        st.warning(f"Overpass non raggiungibile, piste non disponibili: {pistes_error}")
     st.caption(f"Piste trovate: {count} — Snap ≈ {int(radius)} m")
 
     # Selettore da lista piste
@@ -326,19 +537,16 @@ def render_map(T, ctx: Dict[str, Any]) -> Dict[str, Any]:
         key=f"use_list_{map_id}",
     )
 
-    if use_list and unique_names:
-        default = unique_names.index(selected) if selected in unique_names else 0
+    if use_list and len(catalogue):
+        labels = catalogue.labels
+        default = labels.index(selected) if selected in catalogue else 0
         with st.expander("Seleziona pista dalla lista"):
             chosen = st.selectbox(
-                "Pista", unique_names, index=default, key=f"list_{map_id}"
+                "Pista", labels, index=default, key=f"list_{map_id}"
             )
         if chosen != selected:
             selected = chosen
-            for coords, nm in named:
-                if nm == selected:
-                    mid = coords[len(coords) // 2]
-                    marker_lat, marker_lon = mid
-                    break
+            marker_lat, marker_lon = catalogue.by_label(selected).midpoint
 
     # Salvo in ctx e sessione
     ctx["marker_lat"] = marker_lat
@@ -352,20 +560,65 @@ def render_map(T, ctx: Dict[str, Any]) -> Dict[str, Any]:
 
     st.markdown(f"**Pista selezionata:** {selected or 'Nessuna'}")
 
+    # Statistiche dal catalogo (lunghezza, dislivello, difficoltà)
+    sel_entry = catalogue.by_label(selected)
+    run_stats = None
+    terrain_stats = None
+    if sel_entry is not None:
+        # quote dalla rete piste solo ora, a mappa e selettore già disegnati
+        location_loader.wait("network", base_lat, base_lon)
+        vertical = _entry_vertical_m(base_lat, base_lon, sel_entry.label)
+        run_stats = {
+            "length_m": sel_entry.length_m,
+            "vert_m": vertical or 0.0,
+        }
+        parts = [
+            f"{sel_entry.length_m / 1000:.2f} km",
+            f"Dislivello {vertical:.0f} m" if vertical is not None else "Dislivello n/d",
+        ]
+        if sel_entry.difficulty:
+            parts.append(sel_entry.difficulty)
+
+        # terreno lungo tutta la pista, nel giorno della gara o in quello
+        # di riferimento della pagina Località (date_input più in basso,
+        # ma già in sessione dal rerun precedente)
+        race_dt = ctx.get("race_datetime")
+        ref_day = st.session_state.get("free_ref_date")
+        if isinstance(race_dt, datetime):
+            terrain_day = race_dt.date()
+        elif isinstance(ref_day, date):
+            terrain_day = ref_day
+        else:
+            terrain_day = date.today()
+        terrain = _piste_terrain(
+            pistes.key_of(sel_entry.main),
+            pistes.coords_of(sel_entry.main),
+            terrain_day,
+        )
+        if terrain is not None and len(terrain):
+            terrain_stats = terrain.stats()
+            parts.append(f"max 50 m {terrain_stats['steepest_50m_deg']:.0f}°")
+            parts.append(f"esposta N {terrain_stats['north_facing_pct']:.0f}%")
+            parts.append(f"in ombra {terrain_stats['shaded_pct']:.0f}%")
+        st.caption(" · ".join(parts))
+
     # ------------------------------------------------------------------
-    # ESPORTAZIONE PER POV 2D/3D
+    # ESPORTAZIONE PER POV 2D/3D (tratto principale della voce selezionata)
     # ------------------------------------------------------------------
     pov_points = None
-    if selected:
-        for coords, nm in zip(polylines, names):
-            if nm == selected:
-                pov_points = [
-                    {"lat": plat, "lon": plon, "elev": 0.0}
-                    for plat, plon in coords
-                ]
-                break
+    pov_has_elev = False
+    if sel_entry is not None:
+        main_coords = pistes.coords_of(sel_entry.main)
+        pov_points = _piste_points_with_elev(pistes.key_of(sel_entry.main), main_coords)
+        pov_has_elev = pov_points is not None
+        if pov_points is None:
+            # quote non disponibili: tracciato piatto, senza chiave "elev"
+            pov_points = [{"lat": float(a), "lon": float(b)} for a, b in main_coords]
 
     ctx["pov_piste_name"] = selected
     ctx["pov_piste_points"] = pov_points
+    ctx["pov_piste_has_elev"] = pov_has_elev
+    ctx["pov_piste_stats"] = run_stats
+    ctx["piste_terrain"] = terrain_stats
 
     return ctx
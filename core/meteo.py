@@ -8,20 +8,43 @@
 #     · temperatura neve (nuovo modello calibrato)
 #     · umidità, vento, copertura nuvole
 #     · indici: shade_index, snow_moisture_index, glide_index
+#     · calcolo vettoriale (NumPy) su intere colonne, senza iterrows
+# - Profilo sub-orario opzionale (10–15 min) interpolato in NumPy,
+#   con radiazione interpolata secondo la geometria solare
+# - Provider / multi-modello (GFS, ICON, ECMWF) con fetch parallelo
+#   ed EnsembleMeteoProfile (mediana, spread, bande percentili)
+# - Fetch batch multi-località / multi-giorno (build_meteo_profiles_batch)
+# - Cache persistente su disco per giorno/località (core.meteo_cache),
+#   invalidata all'arrivo di un nuovo run GFS
+# - Campo T neve lungo la pista (punti × ore) con gradiente termico
+#   e inversioni, calcolato con un solo broadcast NumPy
 # - Tuning dinamico: costruisce TuningParamsInput per la gara
+#   (anche in blocco per più orari di partenza, con lookup binario)
+# - Ombra del terreno (opzionale, ctx["terrain_shading"]): radiazione
+#   ridotta nelle ore in cui il sole è dietro le montagne (orizzonte DEM
+#   di core.horizon), prima del calcolo di T neve e indici
+# - Metadati località: quota (get_elev, dalla patch DEM condivisa di
+#   core.dem_tools) e regola di fuso offline da coordinate (detect_timezone,
+#   es. "CET/CEST")
 # - Output:
-#     · MeteoProfile
+#     · MeteoProfile (colonnare, array NumPy + to_frame() senza copie)
 #     · DynamicTuningResult (con vlt_pct e vlt_label)
 
 from __future__ import annotations
 
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import datetime, date as Date
-from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta, date as Date
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 
-import requests
+import numpy as np
 import pandas as pd
 
+from core import http_backend, meteo_cache
+from core.time_index import TimeIndex
+from core.utils import clear_sky_ghi_array, solar_cos_zenith_array
 from core.race_tuning import (
     SnowType,
     TuningParamsInput,
@@ -75,21 +98,164 @@ def estimate_surface_snow_temperature(ctx: SnowTempContext) -> float:
 
 
 # ------------------------------------------------------------------
-# Dataclass output profilo meteo
+# Profilo meteo colonnare (NumPy)
 # ------------------------------------------------------------------
-@dataclass
+PROFILE_FIELDS = (
+    "temp_air",
+    "snow_temp",
+    "rh",
+    "cloudcover",
+    "windspeed",
+    "precip",
+    "snowfall",
+    "shade_index",
+    "snow_moisture_index",
+    "glide_index",
+    "sw_rad",
+)
+
+
+def _column_view(i: int):
+    return property(lambda self: self._values[:, i])
+
+
 class MeteoProfile:
-    times: List[datetime]
-    temp_air: List[float]
-    snow_temp: List[float]
-    rh: List[float]
-    cloudcover: List[float]
-    windspeed: List[float]
-    precip: List[float]
-    snowfall: List[float]
-    shade_index: List[float]
-    snow_moisture_index: List[float]
-    glide_index: List[float]
+    """
+    Profilo meteo orario in forma colonnare.
+
+    - times: array datetime64[ns] (ora locale, come da Open-Meteo)
+    - valori: un'unica matrice float64 (n_ore × n_campi) in ordine Fortran;
+      gli attributi temp_air, snow_temp, ... sono viste sulle sue colonne
+    - to_frame(): DataFrame indicizzato per "time" costruito senza copie
+    - time_index(): TimeIndex per lookup O(log n) dell'ora più vicina
+    """
+
+    __slots__ = ("times", "_values", "_tindex")
+
+    def __init__(self, times, **columns) -> None:
+        missing = [name for name in PROFILE_FIELDS if columns.get(name) is None]
+        if missing:
+            # un campo tutto NaN passerebbe per un profilo valido
+            raise ValueError(f"MeteoProfile: colonne mancanti {missing}")
+        self.times = np.asarray(pd.to_datetime(times), dtype="datetime64[ns]")
+        n = len(self.times)
+        self._values = np.empty((n, len(PROFILE_FIELDS)), dtype=np.float64, order="F")
+        for i, name in enumerate(PROFILE_FIELDS):
+            self._values[:, i] = np.asarray(columns[name], dtype=np.float64)
+        self._tindex = None
+
+    def time_index(self) -> TimeIndex:
+        """Indice temporale (ricerca binaria), costruito una volta sola."""
+        if self._tindex is None:
+            self._tindex = TimeIndex(self.times)
+        return self._tindex
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "MeteoProfile(empty)"
+        return f"MeteoProfile({len(self)} ore, {self.times[0]} → {self.times[-1]})"
+
+    def copy(self) -> "MeteoProfile":
+        """Copia indipendente (valori e tempi), per condividere profili in cache."""
+        out = MeteoProfile.__new__(MeteoProfile)
+        out.times = self.times.copy()
+        out._values = self._values.copy(order="F")
+        out._tindex = None
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Vista DataFrame (index "time", una colonna per campo) che condivide
+        la memoria con il profilo: nessuna copia dei valori.
+        """
+        return pd.DataFrame(
+            self._values,
+            index=pd.DatetimeIndex(self.times, name="time"),
+            columns=list(PROFILE_FIELDS),
+            copy=False,
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "MeteoProfile":
+        """
+        Costruisce il profilo da un DataFrame con colonna "time" e le
+        colonne di PROFILE_FIELDS (es. output di _compute_snow_indices).
+        """
+        return cls(
+            df["time"].to_numpy(),
+            **{
+                name: df[name].to_numpy(dtype=np.float64)
+                for name in PROFILE_FIELDS
+                if name in df.columns
+            },
+        )
+
+
+for _i, _name in enumerate(PROFILE_FIELDS):
+    setattr(MeteoProfile, _name, _column_view(_i))
+del _i, _name
+
+
+class EnsembleMeteoProfile(MeteoProfile):
+    """
+    Profilo multi-modello.
+
+    - colonne "base" (temp_air, snow_temp, ...): mediana oraria fra i modelli,
+      quindi utilizzabile ovunque serva un MeteoProfile
+    - members: profilo di ciascun modello (nome Open-Meteo → MeteoProfile)
+    - spread: deviazione standard oraria fra modelli per ciascun campo
+    - bande percentili (p10 / p90) per snow_temp e glide_index
+    """
+
+    __slots__ = ("members", "spread", "bands")
+
+    BAND_FIELDS = ("snow_temp", "glide_index")
+    PERCENTILES = (10, 50, 90)
+
+    @classmethod
+    def from_members(cls, members: Dict[str, MeteoProfile]) -> "EnsembleMeteoProfile":
+        names = list(members)
+        # ore comuni a tutti i modelli
+        common = members[names[0]].times
+        for nm in names[1:]:
+            common = np.intersect1d(common, members[nm].times)
+
+        # cubo modelli × ore × campi
+        cube = np.stack(
+            [
+                members[nm]._values[np.searchsorted(members[nm].times, common)]
+                for nm in names
+            ]
+        )
+
+        median = np.nanmedian(cube, axis=0)
+        obj = cls(common, **{f: median[:, i] for i, f in enumerate(PROFILE_FIELDS)})
+        obj.members = dict(members)
+
+        std = np.nanstd(cube, axis=0)
+        obj.spread = {f: std[:, i] for i, f in enumerate(PROFILE_FIELDS)}
+
+        obj.bands = {}
+        for f in cls.BAND_FIELDS:
+            i = PROFILE_FIELDS.index(f)
+            pct = np.nanpercentile(cube[:, :, i], cls.PERCENTILES, axis=0)
+            obj.bands[f] = {p: pct[k] for k, p in enumerate(cls.PERCENTILES)}
+        return obj
+
+    def bands_frame(self) -> pd.DataFrame:
+        """
+        DataFrame (index "time") con colonne <campo>_p10/_p50/_p90 e
+        <campo>_spread per i campi con banda (per grafici a fascia).
+        """
+        data: Dict[str, np.ndarray] = {}
+        for f, pcts in self.bands.items():
+            for p, arr in pcts.items():
+                data[f"{f}_p{p}"] = arr
+            data[f"{f}_spread"] = self.spread[f]
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self.times, name="time"))
 
 
 @dataclass
@@ -104,53 +270,41 @@ class DynamicTuningResult:
 # ------------------------------------------------------------------
 # Fetch da Open-Meteo (con models=gfs_seamless → NOAA GFS)
 # ------------------------------------------------------------------
-def _fetch_hourly_meteo(
-    lat: float,
-    lon: float,
-    target_day: Date,
-) -> Optional[pd.DataFrame]:
+OPEN_METEO_FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
+HOURLY_VARS = [
+    "temperature_2m",
+    "relative_humidity_2m",
+    "precipitation",
+    "snowfall",
+    "cloudcover",
+    "wind_speed_10m",
+    "shortwave_radiation",
+]
+
+# Provider / modelli disponibili via Open-Meteo (nome UI → parametro models)
+DEFAULT_MODEL = "gfs_seamless"
+MODEL_PROVIDERS: Dict[str, str] = {
+    "auto": DEFAULT_MODEL,
+    "open-meteo": DEFAULT_MODEL,
+    "gfs": "gfs_seamless",
+    "icon": "icon_seamless",
+    "ecmwf": "ecmwf_ifs025",
+}
+# modelli usati dal provider "ensemble"
+ENSEMBLE_MODELS = ("gfs_seamless", "icon_seamless", "ecmwf_ifs025")
+
+# numero massimo di coordinate per singola richiesta batch
+# (Open-Meteo accetta liste lat/lon separate da virgola)
+BATCH_MAX_LOCATIONS = 50
+
+
+def _hourly_to_dataframe(hourly: Optional[Dict[str, Any]]) -> Optional[pd.DataFrame]:
     """
-    Scarica dati orari da Open-Meteo per il giorno target_day su (lat, lon).
-    Usa models=gfs_seamless (fonte NOAA GFS).
-
-    Ritorna DataFrame con colonne:
-      time, temp_air, rh, cloudcover, windspeed, precip, snowfall, sw_rad
-    oppure None in caso di errore.
+    Converte il blocco "hourly" di una risposta Open-Meteo in DataFrame con
+    colonne: time, temp_air, rh, cloudcover, windspeed, precip, snowfall, sw_rad
+    oppure None se vuoto.
     """
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": ",".join(
-            [
-                "temperature_2m",
-                "relative_humidity_2m",
-                "precipitation",
-                "snowfall",
-                "cloudcover",
-                "wind_speed_10m",
-                "shortwave_radiation",
-            ]
-        ),
-        "timezone": "auto",
-        "start_date": target_day.isoformat(),
-        "end_date": target_day.isoformat(),
-        # qui abilitiamo il modello NOAA GFS "seamless"
-        "models": "gfs_seamless",
-    }
-
-    try:
-        r = requests.get(
-            "https://api.open-meteo.com/v1/forecast",
-            params=params,
-            headers=UA,
-            timeout=10,
-        )
-        r.raise_for_status()
-        js = r.json() or {}
-    except Exception:
-        return None
-
-    hourly = js.get("hourly")
     if not hourly:
         return None
 
@@ -190,6 +344,225 @@ def _fetch_hourly_meteo(
     return df
 
 
+def _fetch_hourly_meteo(
+    lat: float,
+    lon: float,
+    target_day: Date,
+    model: str = DEFAULT_MODEL,
+) -> Optional[pd.DataFrame]:
+    """
+    Scarica dati orari da Open-Meteo per il giorno target_day su (lat, lon).
+    Di default usa models=gfs_seamless (fonte NOAA GFS); model permette
+    di scegliere un altro modello Open-Meteo (icon_seamless, ecmwf_ifs025...).
+
+    Ritorna DataFrame con colonne:
+      time, temp_air, rh, cloudcover, windspeed, precip, snowfall, sw_rad
+    oppure None in caso di errore.
+
+    Il blocco orario grezzo passa dalla cache su disco (core.meteo_cache):
+    finché non esce un nuovo run GFS non si rifà la richiesta.
+    """
+    cached = meteo_cache.get_hourly(lat, lon, target_day, model)
+    if cached is not None:
+        return _hourly_to_dataframe(cached)
+
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": ",".join(HOURLY_VARS),
+        "timezone": "auto",
+        "start_date": target_day.isoformat(),
+        "end_date": target_day.isoformat(),
+        # di default il modello NOAA GFS "seamless"
+        "models": model,
+    }
+
+    try:
+        r = http_backend.get(
+            OPEN_METEO_FORECAST_URL,
+            params=params,
+            headers=UA,
+            timeout=10,
+        )
+        r.raise_for_status()
+        js = r.json() or {}
+    except Exception:
+        return None
+
+    hourly = js.get("hourly")
+    df = _hourly_to_dataframe(hourly)
+    if df is not None:
+        meteo_cache.put_hourly(lat, lon, target_day, hourly, model)
+    return df
+
+
+def _fetch_models_concurrently(
+    lat: float,
+    lon: float,
+    target_day: Date,
+    models: Sequence[str],
+) -> Dict[str, pd.DataFrame]:
+    """
+    Scarica in parallelo (thread pool, una richiesta per modello) i dati
+    orari di più modelli. Ritorna solo i modelli andati a buon fine.
+    """
+    if not models:
+        return {}
+
+    out: Dict[str, pd.DataFrame] = {}
+    with ThreadPoolExecutor(max_workers=len(models)) as pool:
+        futures = {
+            pool.submit(_fetch_hourly_meteo, lat, lon, target_day, m): m
+            for m in models
+        }
+        for fut in as_completed(futures):
+            try:
+                df = fut.result()
+            except Exception:
+                df = None
+            if df is not None and not df.empty:
+                out[futures[fut]] = df
+    return out
+
+
+def _split_hourly_by_day(hourly: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Divide un blocco "hourly" multi-giorno in blocchi per giorno
+    (chiave "YYYY-MM-DD"), con le stesse variabili.
+    """
+    times = hourly.get("time") or []
+    idx_by_day: Dict[str, List[int]] = {}
+    for i, t in enumerate(times):
+        idx_by_day.setdefault(str(t)[:10], []).append(i)
+
+    out: Dict[str, Dict[str, Any]] = {}
+    for day, idxs in idx_by_day.items():
+        lo, hi = idxs[0], idxs[-1] + 1
+        out[day] = {
+            k: v[lo:hi] for k, v in hourly.items() if isinstance(v, list)
+        }
+    return out
+
+
+def _fetch_hourly_meteo_batch(
+    coords: Sequence[Tuple[float, float]],
+    start_day: Date,
+    end_day: Date,
+) -> List[Optional[pd.DataFrame]]:
+    """
+    Versione batch di _fetch_hourly_meteo: un intervallo di giorni per molte
+    località, con una richiesta ogni BATCH_MAX_LOCATIONS coordinate.
+
+    Ritorna una lista allineata a coords (None per le località fallite).
+
+    Le località con tutti i giorni già in cache su disco non vengono
+    richieste; le risposte nuove vengono salvate in cache giorno per giorno.
+    """
+    out: List[Optional[pd.DataFrame]] = [None] * len(coords)
+
+    n_days = (end_day - start_day).days + 1
+    days = [start_day + timedelta(days=k) for k in range(max(n_days, 0))]
+
+    missing: List[int] = []
+    for i, (lat, lon) in enumerate(coords):
+        parts = [meteo_cache.get_hourly(lat, lon, d) for d in days]
+        if days and all(p is not None for p in parts):
+            frames = [_hourly_to_dataframe(p) for p in parts]
+            frames = [f for f in frames if f is not None]
+            if frames:
+                out[i] = pd.concat(frames, ignore_index=True)
+                continue
+        missing.append(i)
+
+    for off in range(0, len(missing), BATCH_MAX_LOCATIONS):
+        chunk_idx = missing[off : off + BATCH_MAX_LOCATIONS]
+        chunk = [coords[i] for i in chunk_idx]
+        params = {
+            "latitude": ",".join(f"{lat:.5f}" for lat, _ in chunk),
+            "longitude": ",".join(f"{lon:.5f}" for _, lon in chunk),
+            "hourly": ",".join(HOURLY_VARS),
+            "timezone": "auto",
+            "start_date": start_day.isoformat(),
+            "end_date": end_day.isoformat(),
+            "models": "gfs_seamless",
+        }
+
+        try:
+            r = http_backend.get(
+                OPEN_METEO_FORECAST_URL,
+                params=params,
+                headers=UA,
+                timeout=20,
+            )
+            r.raise_for_status()
+            js = r.json() or []
+        except Exception:
+            continue
+
+        # con una sola coordinata Open-Meteo risponde con un oggetto, non lista
+        if isinstance(js, dict):
+            js = [js]
+
+        for (lat, lon), i, item in zip(chunk, chunk_idx, js):
+            hourly = (item or {}).get("hourly")
+            out[i] = _hourly_to_dataframe(hourly)
+            if out[i] is None:
+                continue
+            for day_str, day_hourly in _split_hourly_by_day(hourly).items():
+                meteo_cache.put_hourly(
+                    lat, lon, Date.fromisoformat(day_str), day_hourly
+                )
+
+    return out
+
+
+# ------------------------------------------------------------------
+# Metadati località (quota, fuso orario)
+# ------------------------------------------------------------------
+# Riquadri (lat_min, lon_min, lat_max, lon_max) → regole di fuso (non
+# nomi IANA): i riquadri approssimano aree con lo stesso orario, non
+# confini di stato. Il primo riquadro che contiene il punto vince:
+# quelli piccoli (Isole britanniche, Portogallo) stanno prima del
+# riquadro CET. Errori noti, lontani dai comprensori: la costa francese
+# della Manica a ovest di 1.77° E cade in WET, e una striscia di Spagna
+# al confine col Portogallo a ovest di 6.2° O anche.
+_TZ_BOXES: Tuple[Tuple[float, float, float, float, str], ...] = (
+    (49.95, -10.70, 60.90, 1.77, "WET/WEST"),  # Isole britanniche
+    (36.90, -9.60, 42.20, -6.19, "WET/WEST"),  # Portogallo
+    (36.00, -9.40, 55.10, 19.00, "CET/CEST"),  # Europa occidentale e centrale, Alpi
+    (48.50, 19.00, 54.30, 22.10, "CET/CEST"),  # Polonia e Slovacchia (Tatra)
+)
+
+
+def detect_timezone(lat: float, lon: float) -> str:
+    """
+    Fuso orario da coordinate, senza rete, come regola d'orario
+    ("CET/CEST" = UTC+1, UTC+2 in estate) e non come nome IANA: tutte le
+    località alpine hanno lo stesso orario, un nome di zona da riquadri
+    sarebbe spesso sbagliato. Fuori dai riquadri noti ripiega sul fuso
+    "nautico" da longitudine (es. "UTC+2").
+    """
+    lat = float(lat)
+    lon = float(lon)
+    for lat_min, lon_min, lat_max, lon_max, name in _TZ_BOXES:
+        if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
+            return name
+    offset = int(round(lon / 15.0))
+    return "UTC" if offset == 0 else f"UTC{offset:+d}"
+
+
+def get_elev(lat: float, lon: float) -> Optional[float]:
+    """
+    Quota (m) del punto: media del 3×3 centrale della patch DEM, la stessa
+    (in cache) usata da render_dem. None se il DEM non è disponibile.
+    """
+    # import locale: core.dem_tools dipende da Streamlit, questo modulo no
+    from core import dem_tools
+
+    patch = dem_tools.dem_patch(lat, lon)
+    return patch.elevation if patch is not None else None
+
+
 # ------------------------------------------------------------------
 # Utility fisiche / indici
 # ------------------------------------------------------------------
@@ -378,6 +751,395 @@ def _compute_vlt_recommendation(
     return float(vlt), label
 
 
+# ------------------------------------------------------------------
+# Versioni vettoriali (NumPy) di modello neve e indici
+# ------------------------------------------------------------------
+# Stessa logica delle funzioni scalari qui sopra, ma su array interi:
+# un solo passaggio per profili multi-giorno / multi-località.
+def _classify_sky_condition_array(
+    sw_rad: np.ndarray,
+    cloudcover: np.ndarray,
+) -> np.ndarray:
+    """
+    Condizione cielo per il modello neve: "clear" / "partly" / "overcast".
+    """
+    rad = np.asarray(sw_rad, dtype=float)
+    cc = np.asarray(cloudcover, dtype=float)
+    return np.select(
+        [(rad > 300) & (cc < 30), cc > 70],
+        ["clear", "overcast"],
+        default="partly",
+    )
+
+
+def estimate_surface_snow_temperature_array(
+    air_temp_c: np.ndarray,
+    rel_humidity_pct: np.ndarray,
+    is_night: np.ndarray,
+    sky_condition: np.ndarray,
+) -> np.ndarray:
+    """
+    Versione vettoriale di estimate_surface_snow_temperature.
+    sky_condition: array di stringhe ("clear", "partly", "overcast", ...).
+    """
+    ta = np.asarray(air_temp_c, dtype=float)
+    rh = np.clip(np.asarray(rel_humidity_pct, dtype=float), 0.0, 100.0)
+    night = np.asarray(is_night, dtype=bool)
+    sc = np.char.lower(np.asarray(sky_condition, dtype=str))
+
+    base_delta = 0.6 + 0.025 * np.maximum(0.0, rh - 70.0)
+
+    day_adj = np.select(
+        [np.isin(sc, ["clear", "sunny"]), np.isin(sc, ["partly", "partly_cloudy"])],
+        [-0.2, -0.1],
+        default=0.0,
+    )
+    base_delta = base_delta + np.where(night, 0.2, day_adj)
+    base_delta = np.clip(base_delta, 0.3, 1.5)
+
+    return np.clip(ta - base_delta, -35.0, -0.0)
+
+
+def _compute_shade_index_array(
+    sw_rad: np.ndarray,
+    cloudcover: np.ndarray,
+) -> np.ndarray:
+    """
+    Versione vettoriale di _compute_shade_index (0 sole, 1 ombra).
+    """
+    rad = np.asarray(sw_rad, dtype=float)
+    cc = np.asarray(cloudcover, dtype=float)
+
+    rad_norm = np.clip(rad / 700.0, 0.0, 1.0)
+    shade = 0.6 * (1.0 - rad_norm) + 0.4 * (cc / 100.0)
+    return np.clip(shade, 0.0, 1.0)
+
+
+def _compute_snow_moisture_index_array(
+    snow_temp_c: np.ndarray,
+    rh_pct: np.ndarray,
+    precip_mm: np.ndarray,
+    snowfall_cm: np.ndarray,
+) -> np.ndarray:
+    """
+    Versione vettoriale di _compute_snow_moisture_index.
+    """
+    t = np.asarray(snow_temp_c, dtype=float)
+    rh = np.asarray(rh_pct, dtype=float)
+    pr = np.asarray(precip_mm, dtype=float)
+    sf = np.asarray(snowfall_cm, dtype=float)
+
+    idx = np.select(
+        [t <= -10, t <= -6, t <= -3, t <= -1],
+        [0.05, 0.15, 0.3, 0.5],
+        default=0.7,
+    )
+    idx = idx + np.select([rh > 90, rh < 50], [0.1, -0.1], default=0.0)
+    idx = idx + np.where((pr > 0.5) & (sf < 0.1), 0.2, 0.0)
+    idx = idx - np.where((sf > 2.0) & (t < -3), 0.1, 0.0)
+
+    return np.clip(idx, 0.0, 1.0)
+
+
+def _compute_glide_index_array(
+    snow_temp_c: np.ndarray,
+    moisture_idx: np.ndarray,
+    shade_idx: np.ndarray,
+) -> np.ndarray:
+    """
+    Versione vettoriale di _compute_glide_index.
+    """
+    t = np.asarray(snow_temp_c, dtype=float)
+    m = np.asarray(moisture_idx, dtype=float)
+    sh = np.asarray(shade_idx, dtype=float)
+
+    base = np.select(
+        [t <= -12, t <= -6, t <= -2, t <= -0.5],
+        [0.2, 0.35, 0.55, 0.7],
+        default=0.6,
+    )
+    base = base + np.select([m < 0.2, m <= 0.6], [-0.1, 0.1], default=-0.05)
+    base = base - 0.1 * (sh - 0.5)
+
+    return np.clip(base, 0.0, 1.0)
+
+
+def _classify_snow_type_array(
+    snow_temp_c: np.ndarray,
+    moisture_idx: np.ndarray,
+    injected: Any,
+) -> np.ndarray:
+    """
+    Versione vettoriale di _classify_snow_type.
+    injected può essere un bool unico o un array di bool.
+    Ritorna un array (dtype=object) di SnowType.
+    """
+    t = np.asarray(snow_temp_c, dtype=float)
+    m = np.asarray(moisture_idx, dtype=float)
+    inj = np.broadcast_to(np.asarray(injected, dtype=bool), t.shape)
+
+    conds = [
+        inj,
+        t <= -10,
+        (t <= -6) & (m < 0.3),
+        (t > -6) & (t <= -2),
+        (t > -2) & (t <= -0.5) & (m <= 0.7),
+        m > 0.7,
+    ]
+    choices = [
+        SnowType.ICE_INJECTED,
+        SnowType.VERY_COLD_DRY,
+        SnowType.COLD_DRY,
+        SnowType.COLD_MID,
+        SnowType.NEAR_ZERO,
+        SnowType.WET,
+    ]
+
+    # np.full con un'Enum str salverebbe la stringa, non il membro
+    out = np.empty(t.shape, dtype=object)
+    out[...] = SnowType.VERY_COLD_DRY
+    # applico dal meno al più prioritario: l'ultimo assegnamento vince
+    for cond, choice in reversed(list(zip(conds, choices))):
+        out[cond] = choice
+    return out
+
+
+def _compute_vlt_recommendation_array(
+    shade_idx: np.ndarray,
+    cloudcover_pct: np.ndarray,
+    snowfall_mm: np.ndarray,
+) -> (np.ndarray, np.ndarray):
+    """
+    Versione vettoriale di _compute_vlt_recommendation.
+    Ritorna (vlt_pct, vlt_label) come array.
+    """
+    shade = np.asarray(shade_idx, dtype=float)
+    cc = np.asarray(cloudcover_pct, dtype=float)
+    snowing = np.asarray(snowfall_mm, dtype=float) > 0.2
+
+    vlt = np.select(
+        [
+            snowing | (shade > 0.7) | (cc > 80),
+            (shade > 0.5) | (cc > 60),
+            (shade > 0.3) | (cc > 40),
+        ],
+        [55.0, 45.0, 35.0],
+        default=18.0,
+    )
+    vlt = np.clip(vlt, 8.0, 70.0)
+
+    label = np.select(
+        [vlt <= 15, vlt <= 25, vlt <= 40, vlt <= 55],
+        [
+            "S3 / molto scuro",
+            "S2–S3 / sole forte",
+            "S2 / variabile",
+            "S1–S2 / luce piatta",
+        ],
+        default="S1 / low light / notte",
+    )
+    return vlt, label
+
+
+def _compute_snow_indices(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggiunge al DataFrame orario (output di _fetch_hourly_meteo) le colonne
+      snow_temp, shade_index, snow_moisture_index, glide_index
+    in un solo passaggio vettoriale. Funziona su qualsiasi numero di righe
+    (più giorni / più località concatenate).
+    """
+    n = len(df)
+
+    def _col(name: str, default: float) -> np.ndarray:
+        if name not in df.columns:
+            return np.full(n, default, dtype=float)
+        arr = df[name].to_numpy(dtype=float, na_value=np.nan)
+        return np.where(np.isnan(arr), default, arr)
+
+    t_air = df["temp_air"].to_numpy(dtype=float)
+    rh = _col("rh", 80.0)
+    precip = _col("precip", 0.0)
+    snowfall = _col("snowfall", 0.0)
+    cc = _col("cloudcover", 0.0)
+    rad = _col("sw_rad", 0.0)
+
+    # notte / giorno dall'ora locale
+    times = pd.to_datetime(df["time"])
+    hour = (times.dt.hour + times.dt.minute / 60.0).to_numpy(dtype=float)
+    is_night = (hour < 6) | (hour >= 18)
+
+    shade = _compute_shade_index_array(rad, cc)
+    sky = _classify_sky_condition_array(rad, cc)
+    t_snow = estimate_surface_snow_temperature_array(t_air, rh, is_night, sky)
+
+    # cm approx from mm per neve (non perfetto, ma sufficiente per indice)
+    moisture = _compute_snow_moisture_index_array(t_snow, rh, precip, snowfall)
+    glide = _compute_glide_index_array(t_snow, moisture, shade)
+
+    df = df.copy()
+    df["snow_temp"] = t_snow
+    df["shade_index"] = shade
+    df["snow_moisture_index"] = moisture
+    df["glide_index"] = glide
+    return df
+
+
+# ------------------------------------------------------------------
+# Profilo sub-orario (10–15 min) via interpolazione vettoriale
+# ------------------------------------------------------------------
+# colonne interpolate linearmente
+_LINEAR_COLS = ("temp_air", "rh", "cloudcover", "windspeed")
+# colonne "per ora" (somme orarie Open-Meteo): valore costante nell'ora
+_HOURLY_RATE_COLS = ("precip", "snowfall")
+
+
+def _solar_noon_local_hour(
+    hour: np.ndarray,
+    sw_rad: np.ndarray,
+    lon: float,
+    step_h: float = 1.0,
+) -> float:
+    """
+    Stima l'ora locale del mezzogiorno solare dal baricentro della radiazione.
+    sw_rad Open-Meteo è la media dell'intervallo precedente (step_h ore,
+    1 per l'orario) → spostiamo di -step_h / 2.
+    Se non c'è radiazione (notte polare / dati mancanti) usiamo il fuso
+    "geometrico" del meridiano più vicino.
+    """
+    w = np.nan_to_num(np.asarray(sw_rad, dtype=float), nan=0.0)
+    w = np.maximum(w, 0.0)
+    if w.sum() <= 0.0:
+        return 12.0 + round(lon / 15.0) - lon / 15.0
+    return float(np.sum((hour - 0.5 * step_h) * w) / np.sum(w))
+
+
+def _interpolate_sw_rad(
+    t_ns: np.ndarray,
+    sw_rad: np.ndarray,
+    new_ns: np.ndarray,
+    lat: float,
+    lon: float,
+) -> np.ndarray:
+    """
+    Interpolazione della radiazione che segue la geometria solare:
+    si interpola l'indice di serenità k = sw_rad / GHI_cielo_sereno
+    e lo si rimoltiplica per il GHI sereno agli istanti sub-orari.
+    Così alba/tramonto e il picco di mezzogiorno non vengono "tagliati"
+    come con un'interpolazione lineare fra valori orari.
+    """
+    rad = np.asarray(sw_rad, dtype=float)
+
+    def _doy_hour(ns: np.ndarray):
+        ts = ns.astype("datetime64[ns]")
+        day = ts.astype("datetime64[D]")
+        doy = (day - day.astype("datetime64[Y]")).astype(int) + 1
+        hour = (ts - day).astype("timedelta64[s]").astype(float) / 3600.0
+        return doy, hour
+
+    doy_h, hour_h = _doy_hour(t_ns)
+    noon = _solar_noon_local_hour(hour_h % 24.0, rad, lon)
+
+    # valore orario = media dell'ora precedente → riferito a t - 30 min
+    half_h_ns = np.int64(30 * 60 * 10**9)
+    doy_mid, hour_mid = _doy_hour(t_ns - half_h_ns)
+    ghi_h = clear_sky_ghi_array(lat, doy_mid, hour_mid - noon + 12.0)
+
+    valid = (ghi_h > 20.0) & np.isfinite(rad)
+    if valid.sum() < 2:
+        return np.interp(new_ns.astype(float), t_ns.astype(float), np.nan_to_num(rad))
+
+    k = np.clip(rad[valid] / ghi_h[valid], 0.0, 1.2)
+    k_new = np.interp(new_ns.astype(float), (t_ns - half_h_ns)[valid].astype(float), k)
+
+    doy_n, hour_n = _doy_hour(new_ns)
+    ghi_new = clear_sky_ghi_array(lat, doy_n, hour_n - noon + 12.0)
+    return np.maximum(0.0, k_new * ghi_new)
+
+
+def _resample_hourly_frame(
+    df: pd.DataFrame,
+    step_minutes: int,
+    lat: float,
+    lon: float,
+) -> pd.DataFrame:
+    """
+    Porta il DataFrame orario (output di _fetch_hourly_meteo) a passo
+    step_minutes con una pipeline NumPy:
+      - temp_air, rh, cloudcover, windspeed → interpolazione lineare
+      - precip, snowfall → intensità oraria costante nell'ora di riferimento
+      - sw_rad → interpolazione "solare" (vedi _interpolate_sw_rad)
+    Gli indici neve vanno ricalcolati dopo (_compute_snow_indices).
+    """
+    if df is None or len(df) < 2 or step_minutes <= 0 or step_minutes >= 60:
+        return df
+
+    t_ns = df["time"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    step_ns = np.int64(step_minutes) * 60 * 10**9
+    new_ns = np.arange(t_ns[0], t_ns[-1] + 1, step_ns, dtype=np.int64)
+
+    x = t_ns.astype(float)
+    xn = new_ns.astype(float)
+
+    out: Dict[str, Any] = {"time": new_ns.astype("datetime64[ns]")}
+    for col in _LINEAR_COLS:
+        if col in df.columns:
+            out[col] = np.interp(xn, x, df[col].to_numpy(dtype=float))
+
+    # somma oraria Open-Meteo riferita all'ora che termina a "time"
+    hour_pos = np.clip(np.searchsorted(t_ns, new_ns, side="left"), 0, len(t_ns) - 1)
+    for col in _HOURLY_RATE_COLS:
+        if col in df.columns:
+            out[col] = df[col].to_numpy(dtype=float)[hour_pos]
+
+    if "sw_rad" in df.columns:
+        out["sw_rad"] = _interpolate_sw_rad(
+            t_ns, df["sw_rad"].to_numpy(dtype=float), new_ns, lat, lon
+        )
+
+    return pd.DataFrame(out)
+
+
+SUBHOURLY_CACHE_SIZE = 64
+
+_subhourly_cache: "OrderedDict[Tuple[float, float, Date, int, int, str], MeteoProfile]" = OrderedDict()
+_subhourly_lock = threading.Lock()
+
+
+def _subhourly_profile(
+    lat_q: float,
+    lon_q: float,
+    target_day: Date,
+    step_minutes: int,
+    run_id: int,
+    model: str = DEFAULT_MODEL,
+) -> Optional[MeteoProfile]:
+    """
+    Profilo sub-orario memoizzato per (coordinate arrotondate, giorno, passo,
+    run del modello): l'orario viene dalla cache su disco, il ricampionamento
+    si fa una volta per run GFS e poi si riusa a ogni rerun.
+    Solo i profili riusciti entrano in cache (un errore si riprova al
+    rerun successivo); al chiamante va sempre una copia.
+    """
+    key = (lat_q, lon_q, target_day, step_minutes, run_id, model)
+    with _subhourly_lock:
+        profile = _subhourly_cache.get(key)
+        if profile is not None:
+            _subhourly_cache.move_to_end(key)
+            return profile.copy()
+
+    df = _fetch_hourly_meteo(lat_q, lon_q, target_day, model)
+    if df is None or df.empty:
+        return None
+    df = _resample_hourly_frame(df, step_minutes, lat_q, lon_q)
+    profile = _profile_from_frame(_compute_snow_indices(df))
+
+    with _subhourly_lock:
+        _subhourly_cache[key] = profile
+        while len(_subhourly_cache) > SUBHOURLY_CACHE_SIZE:
+            _subhourly_cache.popitem(last=False)
+    return profile.copy()
+
+
 # ------------------------------------------------------------------
 # Costruzione profilo giornaliero per località / gara
 # ------------------------------------------------------------------
@@ -388,6 +1150,16 @@ def build_meteo_profile_for_race_day(ctx: Dict[str, Any]) -> Optional[MeteoProfi
     ctx deve contenere:
       - "lat", "lon"
       - "race_datetime": datetime (usato per il giorno)
+    opzionale:
+      - "step_minutes": passo del profilo (es. 10 o 15) per un profilo
+        sub-orario interpolato; default 60 (orario)
+      - "provider": chiave di MODEL_PROVIDERS ("auto", "gfs", "icon",
+        "ecmwf") oppure "ensemble" (→ EnsembleMeteoProfile, solo orario)
+      - "terrain_shading": True per applicare l'ombra del terreno
+        (default False, vedi apply_terrain_shade): richiede l'orizzonte DEM
+        (core.dem_tools, rete). Solo profili di un singolo modello: con
+        "ensemble" il profilo resta senza ombra, come per tutti i chiamanti
+        che non la chiedono.
     """
     lat = float(ctx.get("lat", 45.83333))
     lon = float(ctx.get("lon", 7.73333))
@@ -398,173 +1170,449 @@ def build_meteo_profile_for_race_day(ctx: Dict[str, Any]) -> Optional[MeteoProfi
         race_dt = datetime.utcnow()
     target_day = race_dt.date()
 
-    df = _fetch_hourly_meteo(lat, lon, target_day)
-    if df is None or df.empty:
+    provider = str(ctx.get("provider") or "auto")
+    if provider == "ensemble":
+        return build_ensemble_profile(lat, lon, target_day)
+    model = MODEL_PROVIDERS.get(provider, DEFAULT_MODEL)
+
+    step_minutes = int(ctx.get("step_minutes") or 60)
+    if step_minutes < 60:
+        profile = _subhourly_profile(
+            round(lat, meteo_cache.COORD_DECIMALS),
+            round(lon, meteo_cache.COORD_DECIMALS),
+            target_day,
+            step_minutes,
+            meteo_cache.current_model_run_id(),
+            model,
+        )
+    else:
+        df = _fetch_hourly_meteo(lat, lon, target_day, model)
+        if df is None or df.empty:
+            return None
+
+        # Calcolo vettoriale di T neve e indici (un solo passaggio)
+        profile = _profile_from_frame(_compute_snow_indices(df))
+
+    if profile is not None and ctx.get("terrain_shading", False):
+        profile = apply_terrain_shade(profile, _location_horizon(lat, lon), lon)
+    return profile
+
+
+def _profile_from_frame(df: pd.DataFrame) -> MeteoProfile:
+    """
+    Costruisce un MeteoProfile da un DataFrame già arricchito con
+    _compute_snow_indices.
+    """
+    return MeteoProfile.from_frame(df)
+
+
+# ------------------------------------------------------------------
+# Ombra del terreno (orizzonte DEM)
+# ------------------------------------------------------------------
+TERRAIN_DIFFUSE_FRACTION = 0.3  # radiazione che resta in ombra (diffusa)
+TERRAIN_SUBSTEPS = 4  # istanti campionati in ogni intervallo del profilo
+
+
+def terrain_hidden_fraction(horizon, times: np.ndarray, sw_rad: np.ndarray, lon: float) -> np.ndarray:
+    """
+    Maschera oraria d'ombra portata: per ogni intervallo del profilo la
+    frazione del tempo di sole (sopra l'orizzonte astronomico) in cui il
+    sole è dietro il terreno, 0–1. horizon: HorizonModel di un punto.
+    sw_rad Open-Meteo è la media dell'intervallo precedente → campiono
+    TERRAIN_SUBSTEPS istanti al suo interno.
+    """
+    t = np.asarray(times, dtype="datetime64[ns]")
+    if t.size == 0:
+        return np.zeros(0)
+    hour = (t - t.astype("datetime64[D]")).astype("timedelta64[m]").astype(float) / 60.0
+    step_h = float(np.median(np.diff(hour))) if t.size > 1 else 1.0
+    if not step_h > 0:
+        step_h = 1.0
+
+    noon = _solar_noon_local_hour(hour, sw_rad, lon, step_h)
+    offs = ((np.arange(TERRAIN_SUBSTEPS) + 0.5) / TERRAIN_SUBSTEPS - 1.0) * step_h
+    solar = (hour[:, None] + offs[None, :] - noon + 12.0).ravel()
+    doy = int(pd.Timestamp(t[0]).dayofyear)
+
+    hidden = horizon.sun_hidden(doy, solar)[0].reshape(t.size, TERRAIN_SUBSTEPS)
+    up = (solar_cos_zenith_array(horizon.lat[0], doy, solar) > 0.0).reshape(t.size, TERRAIN_SUBSTEPS)
+    return hidden.sum(axis=1) / np.maximum(up.sum(axis=1), 1)
+
+
+def apply_terrain_shade(profile: MeteoProfile, horizon, lon: float) -> MeteoProfile:
+    """
+    Profilo con la radiazione ridotta alla sola diffusa nelle ore in ombra
+    portata e T neve / indici ricalcolati. Senza orizzonte o senza ore in
+    ombra ritorna il profilo invariato.
+    """
+    if horizon is None or len(profile) == 0:
+        return profile
+    hidden = terrain_hidden_fraction(horizon, profile.times, profile.sw_rad, lon)
+    if not hidden.any():
+        return profile
+
+    df = pd.DataFrame({"time": profile.times, **{f: getattr(profile, f).copy() for f in PROFILE_FIELDS}})
+    df["sw_rad"] = df["sw_rad"] * (1.0 - (1.0 - TERRAIN_DIFFUSE_FRACTION) * hidden)
+    return _profile_from_frame(_compute_snow_indices(df))
+
+
+def _location_horizon(lat: float, lon: float):
+    """
+    Orizzonte DEM del punto (cache in core.horizon); None se non
+    disponibile. Dopo un errore DEM il punto resta senza orizzonte per
+    HORIZON_FAIL_TTL_S, senza nuove richieste a ogni rerun.
+    """
+    # import locali: core.dem_tools dipende da Streamlit, questo modulo no
+    from core import dem_tools
+    from core.horizon import horizon_model
+
+    try:
+        horizon = horizon_model([lat], [lon], dem_tools.fetch_elevations)
+    except Exception:
         return None
+    return horizon if horizon.ok.all() else None
 
-    # Calcolo degli indici e della T neve
-    snow_temps: List[float] = []
-    shade_idxs: List[float] = []
-    moisture_idxs: List[float] = []
-    glide_idxs: List[float] = []
-
-    for _, row in df.iterrows():
-        ts: datetime = row["time"]
-        tod_frac = _local_time_of_day_fraction(ts)
-
-        shade = _compute_shade_index(row)
-        shade_idxs.append(shade)
-
-        t_air = float(row["temp_air"])
-        rh = float(row.get("rh", 80.0) or 80.0)
-        precip = float(row.get("precip", 0.0) or 0.0)
-        snowfall = float(row.get("snowfall", 0.0) or 0.0)
-
-        # cm approx from mm for neve (non perfetto, ma sufficiente per indice)
-        snowfall_cm = snowfall
-
-        # definisco notte / giorno e cielo per il modello neve
-        hour = tod_frac * 24.0
-        is_night = hour < 6 or hour >= 18
-
-        cc = float(row.get("cloudcover", 0.0) or 0.0)
-        rad = float(row.get("sw_rad", 0.0) or 0.0)
-
-        if rad > 300 and cc < 30:
-            sky_condition = "clear"
-        elif cc > 70:
-            sky_condition = "overcast"
-        else:
-            sky_condition = "partly"
-
-        snow_ctx = SnowTempContext(
-            air_temp_c=t_air,
-            rel_humidity_pct=rh,
-            is_night=is_night,
-            sky_condition=sky_condition,
-        )
-        t_snow = estimate_surface_snow_temperature(snow_ctx)
-        snow_temps.append(t_snow)
-
-        moisture = _compute_snow_moisture_index(
-            snow_temp_c=t_snow,
-            rh_pct=rh,
-            precip_mm=precip,
-            snowfall_cm=snowfall_cm,
-        )
-        moisture_idxs.append(moisture)
 
-        glide = _compute_glide_index(
-            snow_temp_c=t_snow,
-            moisture_idx=moisture,
-            shade_idx=shade,
-        )
-        glide_idxs.append(glide)
-
-    df["snow_temp"] = snow_temps
-    df["shade_index"] = shade_idxs
-    df["snow_moisture_index"] = moisture_idxs
-    df["glide_index"] = glide_idxs
-
-    return MeteoProfile(
-        times=list(df["time"]),
-        temp_air=list(df["temp_air"]),
-        snow_temp=list(df["snow_temp"]),
-        rh=list(df["rh"]),
-        cloudcover=list(df["cloudcover"]),
-        windspeed=list(df["windspeed"]),
-        precip=list(df["precip"]),
-        snowfall=list(df["snowfall"]),
-        shade_index=list(df["shade_index"]),
-        snow_moisture_index=list(df["snow_moisture_index"]),
-        glide_index=list(df["glide_index"]),
+def build_ensemble_profile(
+    lat: float,
+    lon: float,
+    target_day: Date,
+    models: Sequence[str] = ENSEMBLE_MODELS,
+) -> Optional[EnsembleMeteoProfile]:
+    """
+    Profilo multi-modello: scarica i modelli in parallelo, calcola gli
+    indici neve per ciascuno e combina mediana, spread e bande percentili.
+    Con un solo modello disponibile ritorna comunque un ensemble (spread 0).
+    """
+    frames = _fetch_models_concurrently(lat, lon, target_day, list(models))
+    if not frames:
+        return None
+
+    members = {
+        m: _profile_from_frame(_compute_snow_indices(frames[m]))
+        for m in models
+        if m in frames
+    }
+    return EnsembleMeteoProfile.from_members(members)
+
+
+def build_meteo_profiles_batch(
+    sites: Sequence[Tuple[float, float]],
+    start_day: Date,
+    end_day: Date,
+) -> List[Dict[Date, MeteoProfile]]:
+    """
+    Profili meteo per molte località e molti giorni con il minimo numero di
+    richieste HTTP (vedi _fetch_hourly_meteo_batch).
+
+    sites: lista di (lat, lon)
+    Ritorna una lista allineata a sites; ogni elemento è un dict
+    giorno → MeteoProfile (vuoto se il fetch per quella località è fallito).
+    """
+    frames = _fetch_hourly_meteo_batch(sites, start_day, end_day)
+
+    out: List[Dict[Date, MeteoProfile]] = []
+    for df in frames:
+        per_day: Dict[Date, MeteoProfile] = {}
+        if df is not None and not df.empty:
+            df = _compute_snow_indices(df)
+            for day, day_df in df.groupby(df["time"].dt.date, sort=True):
+                per_day[day] = _profile_from_frame(day_df)
+        out.append(per_day)
+
+    return out
+
+
+# ------------------------------------------------------------------
+# Campo T neve lungo la pista (quota × tempo)
+# ------------------------------------------------------------------
+STD_LAPSE_RATE_C_PER_KM = -6.5   # atmosfera standard
+INVERSION_RATE_C_PER_KM = 3.0    # inversione notturna tipica di valle
+
+
+@dataclass
+class PisteSnowField:
+    """
+    Campo 2-D lungo la pista: righe = punti pista, colonne = ore profilo.
+    """
+    times: np.ndarray          # datetime64[ns] (n_ore)
+    distance_m: np.ndarray     # distanza cumulativa dei punti (n_punti)
+    elev_m: np.ndarray         # quota dei punti (n_punti)
+    ref_elev_m: float          # quota a cui si riferisce il profilo
+    lapse_rate: np.ndarray     # gradiente effettivo °C/km per ora (n_ore)
+    temp_air: np.ndarray       # (n_punti × n_ore)
+    snow_temp: np.ndarray      # (n_punti × n_ore)
+
+
+def _cumulative_distance_m(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distanza cumulativa (haversine) lungo una sequenza di punti."""
+    if lat.size == 0:
+        return np.zeros(0)
+    p = np.radians(lat)
+    dphi = np.diff(p)
+    dlmb = np.radians(np.diff(lon))
+    a = np.sin(dphi / 2.0) ** 2 + np.cos(p[:-1]) * np.cos(p[1:]) * np.sin(dlmb / 2.0) ** 2
+    d = 2 * 6371000.0 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return np.concatenate([[0.0], np.cumsum(d)])
+
+
+def _effective_lapse_rate(profile: MeteoProfile) -> np.ndarray:
+    """
+    Gradiente termico verticale per ora (°C/km).
+    Di giorno / con vento / cielo coperto → gradiente standard;
+    notte serena e calma → tende all'inversione (più caldo in quota).
+    """
+    hour = (
+        (profile.times - profile.times.astype("datetime64[D]"))
+        .astype("timedelta64[m]")
+        .astype(float)
+        / 60.0
     )
+    night = ((hour < 6) | (hour >= 18)).astype(float)
+    # a bassa radiazione (alba/tramonto, ombra) l'inversione resiste
+    rad = np.nan_to_num(profile.sw_rad, nan=0.0)
+    low_sun = np.where(np.isnan(profile.sw_rad), night, np.clip(1.0 - rad / 200.0, 0.0, 1.0))
+
+    clear = np.clip(1.0 - np.nan_to_num(profile.cloudcover, nan=50.0) / 100.0, 0.0, 1.0)
+    calm = np.clip(1.0 - np.nan_to_num(profile.windspeed, nan=10.0) / 20.0, 0.0, 1.0)
+
+    strength = low_sun * clear * calm
+    return STD_LAPSE_RATE_C_PER_KM * (1.0 - strength) + INVERSION_RATE_C_PER_KM * strength
+
+
+def build_piste_snow_field(
+    profile: MeteoProfile,
+    points: Sequence[Dict[str, float]],
+    ref_elev_m: float,
+) -> Optional[PisteSnowField]:
+    """
+    Corregge il profilo (riferito a ref_elev_m) per la quota di ogni punto
+    pista e ricalcola la T neve: un unico broadcast NumPy
+    (n_punti × 1) ⊗ (1 × n_ore), senza ricostruire profili per punto.
+
+    points: [{"lat", "lon", "elev"}, ...] come ctx["pov_piste_points"].
+    None se anche un solo punto non ha quota: senza correzione per quota
+    il campo sembrerebbe valido ma sarebbe piatto.
+    """
+    if profile is None or len(profile) == 0 or not points:
+        return None
+
+    lat = np.array([float(p.get("lat", 0.0)) for p in points])
+    lon = np.array([float(p.get("lon", 0.0)) for p in points])
+    elev = np.array([np.nan if p.get("elev") is None else float(p["elev"]) for p in points])
+    if not np.isfinite(elev).all():
+        return None
+
+    lapse = _effective_lapse_rate(profile)                       # (T,)
+    dz_km = (elev - float(ref_elev_m))[:, None] / 1000.0         # (P, 1)
+    temp_air = profile.temp_air[None, :] + dz_km * lapse[None, :]  # (P, T)
+
+    hour = (
+        (profile.times - profile.times.astype("datetime64[D]"))
+        .astype("timedelta64[m]")
+        .astype(float)
+        / 60.0
+    )
+    is_night = (hour < 6) | (hour >= 18)
+    sky = _classify_sky_condition_array(
+        np.nan_to_num(profile.sw_rad, nan=0.0),
+        np.nan_to_num(profile.cloudcover, nan=0.0),
+    )
+    rh = np.nan_to_num(profile.rh, nan=80.0)
+
+    snow_temp = estimate_surface_snow_temperature_array(
+        temp_air,
+        rh[None, :],
+        is_night[None, :],
+        sky[None, :],
+    )
+
+    return PisteSnowField(
+        times=profile.times,
+        distance_m=_cumulative_distance_m(lat, lon),
+        elev_m=elev,
+        ref_elev_m=float(ref_elev_m),
+        lapse_rate=lapse,
+        temp_air=temp_air,
+        snow_temp=snow_temp,
+    )
+
+
+def build_piste_snow_field_for_race_day(
+    ctx: Dict[str, Any],
+    profile: Optional[MeteoProfile] = None,
+) -> Optional[PisteSnowField]:
+    """
+    Wrapper da ctx: usa ctx["pov_piste_points"] e come quota di riferimento
+    ctx["alt_m"] → ctx["dem_elevation_m"] → quota media della pista.
+    """
+    points = ctx.get("pov_piste_points") or []
+    # tracciato piatto di ripiego (core.maps): niente quote reali
+    if not points or ctx.get("pov_piste_has_elev") is False:
+        return None
+
+    if profile is None:
+        profile = build_meteo_profile_for_race_day(ctx)
+    if profile is None:
+        return None
+
+    ref = ctx.get("alt_m") or ctx.get("dem_elevation_m")
+    if ref is None:
+        ref = float(np.mean([float(p.get("elev") or 0.0) for p in points]))
+    return build_piste_snow_field(profile, points, float(ref))
 
 
 # ------------------------------------------------------------------
 # Tuning dinamico basato su profilo meteo
 # ------------------------------------------------------------------
+def _dynamic_conditions(
+    profile: MeteoProfile,
+    start_times: Sequence[datetime],
+    interpolate: bool,
+) -> Dict[str, np.ndarray]:
+    """
+    Condizioni meteo/neve per ciascun orario di partenza:
+      - interpolate=False → ora del profilo più vicina (ricerca binaria)
+      - interpolate=True  → interpolazione lineare fra le ore
+    Ritorna dict campo → array allineato a start_times.
+    """
+    tindex = profile.time_index()
+    if interpolate:
+        return {
+            name: np.asarray(tindex.interpolate(getattr(profile, name), start_times))
+            for name in PROFILE_FIELDS
+        }
+    idx = tindex.nearest_many(start_times)
+    return {name: getattr(profile, name)[idx] for name in PROFILE_FIELDS}
+
+
+def build_dynamic_tuning_for_starts(
+    profile: MeteoProfile,
+    start_times: Sequence[datetime],
+    discipline: Discipline,
+    skier_level: SkierLevel,
+    injected: bool,
+    interpolate: bool = False,
+    terrain: Optional[Dict[str, float]] = None,
+) -> List[DynamicTuningResult]:
+    """
+    Versione bulk di build_dynamic_tuning_for_race: un risultato per
+    ciascun orario di partenza (es. pettorali a intervalli, più manche).
+    Tutti gli orari vengono risolti sul profilo in un'unica operazione.
+
+    terrain: statistiche di core.terrain (TerrainProfile.stats()) della
+    pista, se note (pendenza del tratto più ripido, ombra).
+    """
+    terrain = terrain or {}
+    if profile is None or len(profile) == 0 or len(start_times) == 0:
+        return []
+
+    cond = _dynamic_conditions(profile, start_times, interpolate)
+
+    snow_types = _classify_snow_type_array(
+        snow_temp_c=cond["snow_temp"],
+        moisture_idx=cond["snow_moisture_index"],
+        injected=injected,
+    )
+    vlts, vlt_labels = _compute_vlt_recommendation_array(
+        shade_idx=cond["shade_index"],
+        cloudcover_pct=cond["cloudcover"],
+        snowfall_mm=cond["snowfall"],
+    )
+
+    results: List[DynamicTuningResult] = []
+    for k, race_dt in enumerate(start_times):
+        snow_temp_c = float(cond["snow_temp"][k])
+        air_temp_c = float(cond["temp_air"][k])
+        rh_pct = float(cond["rh"][k])
+        cloud_pct = float(cond["cloudcover"][k])
+        wind_kmh = float(cond["windspeed"][k])
+        shade_idx = float(cond["shade_index"][k])
+        moist_idx = float(cond["snow_moisture_index"][k])
+        glide_idx = float(cond["glide_index"][k])
+        snowfall_mm = float(cond["snowfall"][k])
+        precip_mm = float(cond["precip"][k])
+        snow_type = snow_types[k]
+        vlt_pct = float(vlts[k])
+        vlt_label = str(vlt_labels[k])
+
+        # Costruiamo l'input per il modulo race_tuning
+        params = TuningParamsInput(
+            snow_temp_c=snow_temp_c,
+            air_temp_c=air_temp_c,
+            rh_pct=rh_pct,
+            snow_type=snow_type,
+            discipline=discipline,
+            skier_level=skier_level,
+            injected=injected,
+            shade_index=shade_idx,
+            moisture_index=moist_idx,
+            glide_index=glide_idx,
+            wind_speed_kmh=wind_kmh,
+            cloudcover_pct=cloud_pct,
+            precip_mm=precip_mm,
+            snowfall_mm=snowfall_mm,
+            steepest_slope_deg=terrain.get("steepest_50m_deg"),
+            steep_shaded_pct=terrain.get("steep_shaded_pct"),
+        )
+
+        # Summary umano
+        dt_str = race_dt.strftime("%Y-%m-%d · %H:%M")
+        summary = (
+            f"Tuning dinamico per {dt_str} — "
+            f"neve {snow_temp_c:.1f} °C, aria {air_temp_c:.1f} °C, "
+            f"UR {rh_pct:.0f}%, vento {wind_kmh:.0f} km/h, "
+            f"shade {shade_idx:.2f}, moisture {moist_idx:.2f}, "
+            f"glide {glide_idx:.2f}, VLT {vlt_pct:.0f}% ({vlt_label})."
+        )
+
+        results.append(
+            DynamicTuningResult(
+                input_params=params,
+                snow_type=snow_type,
+                vlt_pct=vlt_pct,
+                vlt_label=vlt_label,
+                summary=summary,
+            )
+        )
+
+    return results
+
+
 def build_dynamic_tuning_for_race(
     profile: MeteoProfile,
     ctx: Dict[str, Any],
     discipline: Discipline,
     skier_level: SkierLevel,
     injected: bool,
+    interpolate: bool = False,
 ) -> Optional[DynamicTuningResult]:
     """
     Usa il profilo meteo + info gara per costruire:
       - TuningParamsInput
       - classifica SnowType
       - VLT consigliata
+
+    interpolate=True interpola fra le ore invece di usare l'ora più vicina.
+    Il terreno della pista selezionata arriva da ctx["piste_terrain"].
     """
-    if profile is None or not profile.times:
+    if profile is None or len(profile) == 0:
         return None
 
     race_dt: Optional[datetime] = ctx.get("race_datetime")
     if not isinstance(race_dt, datetime):
         # fallback: mezzogiorno del primo giorno in profilo
-        race_dt = profile.times[0].replace(hour=12, minute=0, second=0, microsecond=0)
-
-    # find closest time index
-    times = profile.times
-    deltas = [abs((t - race_dt).total_seconds()) for t in times]
-    idx = int(deltas.index(min(deltas)))
-
-    snow_temp_c = float(profile.snow_temp[idx])
-    air_temp_c = float(profile.temp_air[idx])
-    rh_pct = float(profile.rh[idx])
-    cloud_pct = float(profile.cloudcover[idx])
-    wind_kmh = float(profile.windspeed[idx])
-    shade_idx = float(profile.shade_index[idx])
-    moist_idx = float(profile.snow_moisture_index[idx])
-    glide_idx = float(profile.glide_index[idx])
-    snowfall_mm = float(profile.snowfall[idx])
-    precip_mm = float(profile.precip[idx])
-
-    snow_type = _classify_snow_type(
-        snow_temp_c=snow_temp_c,
-        moisture_idx=moist_idx,
-        injected=injected,
-    )
-
-    vlt_pct, vlt_label = _compute_vlt_recommendation(
-        shade_idx=shade_idx,
-        cloudcover_pct=cloud_pct,
-        snowfall_mm=snowfall_mm,
-    )
+        race_dt = pd.Timestamp(profile.times[0]).to_pydatetime().replace(
+            hour=12, minute=0, second=0, microsecond=0
+        )
 
-    # Costruiamo l'input per il modulo race_tuning
-    params = TuningParamsInput(
-        snow_temp_c=snow_temp_c,
-        air_temp_c=air_temp_c,
-        rh_pct=rh_pct,
-        snow_type=snow_type,
+    results = build_dynamic_tuning_for_starts(
+        profile,
+        [race_dt],
         discipline=discipline,
         skier_level=skier_level,
         injected=injected,
-        shade_index=shade_idx,
-        moisture_index=moist_idx,
-        glide_index=glide_idx,
-        wind_speed_kmh=wind_kmh,
-        cloudcover_pct=cloud_pct,
-        precip_mm=precip_mm,
-        snowfall_mm=snowfall_mm,
-    )
-
-    # Summary umano
-    dt_str = race_dt.strftime("%Y-%m-%d · %H:%M")
-    summary = (
-        f"Tuning dinamico per {dt_str} — "
-        f"neve {snow_temp_c:.1f} °C, aria {air_temp_c:.1f} °C, "
-        f"UR {rh_pct:.0f}%, vento {wind_kmh:.0f} km/h, "
-        f"shade {shade_idx:.2f}, moisture {moist_idx:.2f}, "
-        f"glide {glide_idx:.2f}, VLT {vlt_pct:.0f}% ({vlt_label})."
-    )
-
-    return DynamicTuningResult(
-        input_params=params,
-        snow_type=snow_type,
-        vlt_pct=vlt_pct,
-        vlt_label=vlt_label,
-        summary=summary,
+        interpolate=interpolate,
+        terrain=ctx.get("piste_terrain"),
     )
+    return results[0] if results else None
@@ -0,0 +1,325 @@
+# core/meteo_archive.py
+# Archivio storico condizioni neve per Telemark · Pro Wax & Tune
+#
+# - Scarica in blocco dall'endpoint storico Open-Meteo (/v1/archive)
+#   un'intera stagione per località (una richiesta per sito)
+# - Calcola gli stessi campi derivati del profilo live
+#   (snow_temp, shade_index, snow_moisture_index, glide_index)
+#   riusando le funzioni vettoriali di core.meteo
+# - Salva in un file colonnare compatto (.npz, float32):
+#   una riga per ora per sito, righe ordinate per (sito, ora)
+# - Indici precalcolati:
+#     · offset per sito (slice contigua)
+#     · ordinamento per snow_temp dentro ogni sito
+#   per query a intervalli in pochi millisecondi, es.
+#     archive.query(site="Pila", snow_temp=(-6, -2), rh=(85, None))
+
+from __future__ import annotations
+
+from datetime import date as Date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from core import http_backend
+from core.meteo import (
+    HOURLY_VARS,
+    UA,
+    _compute_snow_indices,
+    _hourly_to_dataframe,
+)
+
+OPEN_METEO_ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# colonne numeriche archiviate (float32)
+ARCHIVE_FIELDS = (
+    "temp_air",
+    "rh",
+    "cloudcover",
+    "windspeed",
+    "precip",
+    "snowfall",
+    "sw_rad",
+    "snow_temp",
+    "shade_index",
+    "snow_moisture_index",
+    "glide_index",
+)
+
+Range = Tuple[Optional[float], Optional[float]]
+
+
+# ----------------------------------------------------------------------
+# Fetch storico
+# ----------------------------------------------------------------------
+def fetch_archive_frame(
+    lat: float,
+    lon: float,
+    start_day: Date,
+    end_day: Date,
+) -> Optional[pd.DataFrame]:
+    """
+    Dati orari storici (ERA5 via Open-Meteo) per un intervallo di giorni,
+    già arricchiti con T neve e indici. None in caso di errore.
+    """
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": ",".join(HOURLY_VARS),
+        "timezone": "auto",
+        "start_date": start_day.isoformat(),
+        "end_date": end_day.isoformat(),
+    }
+
+    try:
+        r = http_backend.get(
+            OPEN_METEO_ARCHIVE_URL,
+            params=params,
+            headers=UA,
+            timeout=60,
+        )
+        r.raise_for_status()
+        js = r.json() or {}
+    except Exception:
+        return None
+
+    df = _hourly_to_dataframe(js.get("hourly"))
+    if df is None:
+        return None
+    return _compute_snow_indices(df)
+
+
+# ----------------------------------------------------------------------
+# Archivio colonnare
+# ----------------------------------------------------------------------
+class SnowArchive:
+    """
+    Archivio orario multi-sito in memoria (array NumPy) con indici.
+
+    Attributi principali:
+      - sites: lista di dict {name, lat, lon}
+      - time: int64 (secondi epoch, ora locale del sito)
+      - site_offsets: righe [site_offsets[i], site_offsets[i+1]) del sito i
+      - cols: campo → array float32
+      - snow_order: permutazione (int32) che ordina snow_temp dentro ogni sito
+    """
+
+    def __init__(self) -> None:
+        self.sites: List[Dict[str, Union[str, float]]] = []
+        self.time = np.empty(0, dtype=np.int64)
+        self.site_offsets = np.zeros(1, dtype=np.int64)
+        self.cols: Dict[str, np.ndarray] = {
+            f: np.empty(0, dtype=np.float32) for f in ARCHIVE_FIELDS
+        }
+        self.snow_order = np.empty(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return int(self.time.size)
+
+    # ---------------- costruzione ----------------
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Dict[str, Tuple[float, float, pd.DataFrame]],
+    ) -> "SnowArchive":
+        """
+        frames: nome sito → (lat, lon, DataFrame con time + ARCHIVE_FIELDS)
+        """
+        arch = cls()
+        times: List[np.ndarray] = []
+        cols: Dict[str, List[np.ndarray]] = {f: [] for f in ARCHIVE_FIELDS}
+        offsets = [0]
+
+        for name, (lat, lon, df) in frames.items():
+            if df is None or df.empty:
+                continue
+            df = df.sort_values("time")
+            arch.sites.append({"name": name, "lat": float(lat), "lon": float(lon)})
+            times.append(
+                df["time"].to_numpy(dtype="datetime64[s]").astype(np.int64)
+            )
+            for f in ARCHIVE_FIELDS:
+                cols[f].append(df[f].to_numpy(dtype=np.float32))
+            offsets.append(offsets[-1] + len(df))
+
+        if times:
+            arch.time = np.concatenate(times)
+            arch.cols = {f: np.concatenate(cols[f]) for f in ARCHIVE_FIELDS}
+        arch.site_offsets = np.asarray(offsets, dtype=np.int64)
+        arch._build_indexes()
+        return arch
+
+    def _build_indexes(self) -> None:
+        snow = self.cols["snow_temp"]
+        order = np.empty(snow.size, dtype=np.int32)
+        for i in range(len(self.sites)):
+            lo, hi = self.site_offsets[i], self.site_offsets[i + 1]
+            order[lo:hi] = lo + np.argsort(snow[lo:hi], kind="stable")
+        self.snow_order = order
+
+    # ---------------- persistenza ----------------
+    def save(self, path: Union[str, Path]) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        site_names = np.array([s["name"] for s in self.sites], dtype=str)
+        site_coords = np.array(
+            [[s["lat"], s["lon"]] for s in self.sites], dtype=np.float64
+        ).reshape(-1, 2)
+        np.savez_compressed(
+            path,
+            site_names=site_names,
+            site_coords=site_coords,
+            site_offsets=self.site_offsets,
+            time=self.time,
+            snow_order=self.snow_order,
+            **{f"col_{f}": self.cols[f] for f in ARCHIVE_FIELDS},
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "SnowArchive":
+        arch = cls()
+        with np.load(path, allow_pickle=False) as z:
+            names = [str(n) for n in z["site_names"]]
+            coords = z["site_coords"]
+            arch.sites = [
+                {"name": n, "lat": float(c[0]), "lon": float(c[1])}
+                for n, c in zip(names, coords)
+            ]
+            arch.site_offsets = z["site_offsets"].astype(np.int64)
+            arch.time = z["time"].astype(np.int64)
+            arch.snow_order = z["snow_order"].astype(np.int32)
+            arch.cols = {f: z[f"col_{f}"].astype(np.float32) for f in ARCHIVE_FIELDS}
+        return arch
+
+    # ---------------- query ----------------
+    def _site_index(self, site: str) -> int:
+        for i, s in enumerate(self.sites):
+            if s["name"] == site:
+                return i
+        raise KeyError(f"sito non in archivio: {site}")
+
+    def _candidates(
+        self,
+        lo: int,
+        hi: int,
+        snow_temp: Optional[Range],
+        time_range: Optional[Tuple[Optional[Date], Optional[Date]]],
+    ) -> np.ndarray:
+        """Righe candidate di un sito usando gli indici (snow_temp o tempo)."""
+        if snow_temp is not None:
+            order = self.snow_order[lo:hi]
+            vals = self.cols["snow_temp"][order]
+            t_lo, t_hi = snow_temp
+            a = 0 if t_lo is None else np.searchsorted(vals, t_lo, side="left")
+            b = len(vals) if t_hi is None else np.searchsorted(vals, t_hi, side="right")
+            return np.sort(order[a:b])
+
+        if time_range is not None:
+            d_lo, d_hi = time_range
+            t = self.time[lo:hi]
+            a = 0 if d_lo is None else np.searchsorted(
+                t, np.datetime64(d_lo, "s").astype(np.int64), side="left"
+            )
+            b = len(t) if d_hi is None else np.searchsorted(
+                t,
+                (np.datetime64(d_hi, "D") + np.timedelta64(1, "D"))
+                .astype("datetime64[s]")
+                .astype(np.int64),
+                side="left",
+            )
+            return np.arange(lo + a, lo + b)
+
+        return np.arange(lo, hi)
+
+    def query(
+        self,
+        site: Optional[Union[str, Sequence[str]]] = None,
+        time_range: Optional[Tuple[Optional[Date], Optional[Date]]] = None,
+        **ranges: Range,
+    ) -> pd.DataFrame:
+        """
+        Righe che soddisfano tutti i filtri:
+          - site: nome o lista di nomi (None = tutti)
+          - time_range: (giorno_da, giorno_a) inclusi, None = aperto
+          - ranges: campo=(min, max) inclusi, None = aperto
+            es. snow_temp=(-6, -2), rh=(85, None)
+        Ritorna DataFrame con colonne site, time e ARCHIVE_FIELDS.
+        """
+        for f in ranges:
+            if f not in self.cols:
+                raise KeyError(f"campo non archiviato: {f}")
+
+        if site is None:
+            site_ids = list(range(len(self.sites)))
+        elif isinstance(site, str):
+            site_ids = [self._site_index(site)]
+        else:
+            site_ids = [self._site_index(s) for s in site]
+
+        snow_temp = ranges.get("snow_temp")
+        parts: List[np.ndarray] = []
+        for i in site_ids:
+            lo, hi = int(self.site_offsets[i]), int(self.site_offsets[i + 1])
+            parts.append(self._candidates(lo, hi, snow_temp, time_range))
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+        mask = np.ones(rows.size, dtype=bool)
+        for f, (v_lo, v_hi) in ranges.items():
+            vals = self.cols[f][rows]
+            if v_lo is not None:
+                mask &= vals >= v_lo
+            if v_hi is not None:
+                mask &= vals <= v_hi
+
+        if time_range is not None and snow_temp is not None:
+            d_lo, d_hi = time_range
+            t = self.time[rows]
+            if d_lo is not None:
+                mask &= t >= np.datetime64(d_lo, "s").astype(np.int64)
+            if d_hi is not None:
+                end = (np.datetime64(d_hi, "D") + np.timedelta64(1, "D")).astype(
+                    "datetime64[s]"
+                )
+                mask &= t < end.astype(np.int64)
+
+        rows = rows[mask]
+
+        site_of_row = np.searchsorted(self.site_offsets, rows, side="right") - 1
+        names = np.array([s["name"] for s in self.sites], dtype=object)
+
+        out = {
+            "site": names[site_of_row] if len(names) else np.empty(0, dtype=object),
+            "time": self.time[rows].astype("datetime64[s]"),
+        }
+        for f in ARCHIVE_FIELDS:
+            out[f] = self.cols[f][rows]
+        return pd.DataFrame(out)
+
+
+# ----------------------------------------------------------------------
+# Costruzione archivio stagionale
+# ----------------------------------------------------------------------
+def build_season_archive(
+    sites: Dict[str, Tuple[float, float]],
+    season_start: Date,
+    season_end: Date,
+    path: Optional[Union[str, Path]] = None,
+) -> SnowArchive:
+    """
+    Scarica la stagione per ogni sito (una richiesta per sito), costruisce
+    l'archivio e, se path è dato, lo salva su disco.
+
+    sites: nome → (lat, lon), es. {"Pila": (45.73, 7.31)}
+    """
+    frames: Dict[str, Tuple[float, float, pd.DataFrame]] = {}
+    for name, (lat, lon) in sites.items():
+        df = fetch_archive_frame(lat, lon, season_start, season_end)
+        if df is not None:
+            frames[name] = (lat, lon, df)
+
+    arch = SnowArchive.from_frames(frames)
+    if path is not None:
+        arch.save(path)
+    return arch
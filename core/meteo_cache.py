@@ -0,0 +1,223 @@
+# core/meteo_cache.py
+# Cache persistente su disco (SQLite) per i fetch meteo di core.meteo
+#
+# - Chiave: coordinate arrotondate + giorno target + modello (es. gfs_seamless)
+# - Valore: blocco "hourly" grezzo della risposta Open-Meteo (JSON)
+# - Invalidazione legata al ciclo dei run del modello (GFS ogni 6 h)
+#   e non a un TTL fisso: un dato resta valido finché non è
+#   plausibilmente disponibile un run più recente.
+# - Directory configurabile con la variabile d'ambiente TELEMARK_CACHE_DIR
+#   (default ./.cache), condivisa fra sessioni e riavvii del processo.
+# - Schema creato una volta per processo, una connessione per thread
+#   (threading.local) riusata fra le chiamate.
+# - Le voci dei run superati si eliminano alla prima scrittura di ogni
+#   nuovo run (purge_stale), così il file non cresce senza limite.
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone, date as Date
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CACHE_DIR = Path(os.environ.get("TELEMARK_CACHE_DIR", ".cache"))
+DB_NAME = "meteo_cache.sqlite"
+
+# arrotondamento coordinate (2 decimali ≈ 1 km, sotto la risoluzione GFS)
+COORD_DECIMALS = 2
+
+# run GFS: 00/06/12/18 UTC, disponibili su Open-Meteo dopo ~4 h
+MODEL_RUN_INTERVAL_H = 6
+MODEL_RUN_DELAY_H = 4
+
+_LOCK = threading.Lock()  # creazione schema e scritture
+_LOCAL = threading.local()  # una connessione per thread (sqlite3 non si condivide fra thread)
+_SCHEMA_READY: set = set()  # percorsi DB con la tabella già creata
+_PURGED_RUN: Dict[str, int] = {}  # percorso DB → ultimo run già ripulito
+
+
+def _db_path() -> Path:
+    return CACHE_DIR / DB_NAME
+
+
+def _init_schema(path: str) -> None:
+    with _LOCK:
+        if path in _SCHEMA_READY:
+            return
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS forecast (
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    day TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    run_id INTEGER NOT NULL,
+                    fetched_at TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (lat, lon, day, model)
+                )
+                """
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        _SCHEMA_READY.add(path)
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    """
+    Connessione del thread corrente, aperta alla prima chiamata e poi
+    riusata; lo schema si crea una sola volta per processo.
+    """
+    path = str(_db_path())
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is not None and getattr(_LOCAL, "path", None) == path:
+        return conn
+    try:
+        _init_schema(path)
+        conn = sqlite3.connect(path, timeout=5)
+    except Exception:
+        return None
+    _LOCAL.conn, _LOCAL.path = conn, path
+    return conn
+
+
+def _drop_connection() -> None:
+    """Dopo un errore: chiude la connessione del thread, la prossima si riapre."""
+    conn = getattr(_LOCAL, "conn", None)
+    _LOCAL.conn = None
+    with _LOCK:
+        _SCHEMA_READY.discard(getattr(_LOCAL, "path", None))
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def current_model_run_id(now: Optional[datetime] = None) -> int:
+    """
+    Identificativo dell'ultimo run del modello che dovrebbe essere già
+    disponibile: numero di intervalli da 6 h trascorsi dall'epoch (UTC),
+    al netto del ritardo di pubblicazione.
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    elif now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+
+    hours = now.timestamp() / 3600.0 - MODEL_RUN_DELAY_H
+    return int(hours // MODEL_RUN_INTERVAL_H)
+
+
+def _key(lat: float, lon: float, day: Date, model: str):
+    return (
+        round(float(lat), COORD_DECIMALS),
+        round(float(lon), COORD_DECIMALS),
+        day.isoformat(),
+        str(model),
+    )
+
+
+def get_hourly(
+    lat: float,
+    lon: float,
+    day: Date,
+    model: str = "gfs_seamless",
+) -> Optional[Dict[str, Any]]:
+    """
+    Ritorna il blocco "hourly" in cache se appartiene al run corrente,
+    altrimenti None.
+    """
+    conn = _connect()
+    if conn is None:
+        return None
+    try:
+        row = conn.execute(
+            "SELECT run_id, payload FROM forecast "
+            "WHERE lat = ? AND lon = ? AND day = ? AND model = ?",
+            _key(lat, lon, day, model),
+        ).fetchone()
+    except Exception:
+        _drop_connection()
+        row = None
+
+    if row is None:
+        return None
+
+    run_id, payload = row
+    if int(run_id) != current_model_run_id():
+        return None
+
+    try:
+        return json.loads(payload)
+    except Exception:
+        return None
+
+
+def put_hourly(
+    lat: float,
+    lon: float,
+    day: Date,
+    hourly: Dict[str, Any],
+    model: str = "gfs_seamless",
+) -> None:
+    """
+    Salva il blocco "hourly" associandolo al run corrente del modello.
+    Alla prima scrittura di un nuovo run rimuove le voci dei run precedenti.
+    Errori di scrittura vengono ignorati (la cache è solo un'ottimizzazione).
+    """
+    try:
+        payload = json.dumps(hourly, separators=(",", ":"))
+    except Exception:
+        return
+
+    conn = _connect()
+    if conn is None:
+        return
+    run_id = current_model_run_id()
+    path = str(_db_path())
+    try:
+        with _LOCK, conn:
+            if _PURGED_RUN.get(path) != run_id:
+                conn.execute("DELETE FROM forecast WHERE run_id < ?", (run_id,))
+                _PURGED_RUN[path] = run_id
+            conn.execute(
+                "INSERT OR REPLACE INTO forecast "
+                "(lat, lon, day, model, run_id, fetched_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    *_key(lat, lon, day, model),
+                    run_id,
+                    datetime.now(timezone.utc).isoformat(),
+                    payload,
+                ),
+            )
+    except Exception:
+        _drop_connection()
+
+
+def purge_stale() -> int:
+    """
+    Elimina le voci di run precedenti a quello corrente.
+    Ritorna il numero di righe rimosse.
+    """
+    conn = _connect()
+    if conn is None:
+        return 0
+    try:
+        with _LOCK, conn:
+            cur = conn.execute(
+                "DELETE FROM forecast WHERE run_id < ?",
+                (current_model_run_id(),),
+            )
+        return int(cur.rowcount or 0)
+    except Exception:
+        _drop_connection()
+        return 0
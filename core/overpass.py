@@ -0,0 +1,275 @@
+# core/overpass.py
+# Client Overpass condiviso (tutte le sessioni dello stesso processo)
+#
+# - Single-flight: query identiche in volo contemporaneamente partono una
+#   sola volta, le altre sessioni aspettano lo stesso risultato
+# - Cache risultati in memoria (LRU + TTL) e cache negativa breve sugli
+#   errori, così sotto rate limit i rerun non martellano i server
+# - Centro "around" arrotondato a una griglia (snap_center): centri vicini
+#   producono la stessa query; il raggio viene allargato del mezzo
+#   passo di griglia per coprire comunque l'area richiesta
+# - Mirror configurabili (TELEMARK_OVERPASS_URLS, separati da virgola):
+#   su 429, qualsiasi 5xx o errore di rete si passa al successivo e il
+#   mirror resta in pausa per un po' (Retry-After se presente)
+# - Risposte 200 con "remark" di errore a runtime (timeout, memoria)
+#   sono parziali: vengono restituite ma non finiscono in cache
+# - Contatori hit / miss / coalesced / errori / failover e latenze per
+#   mirror in stats(), mostrati nel pannello debug dell'app
+# - Passa da core.http_backend (record / replay funzionano come prima)
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import http_backend
+
+UA = {"User-Agent": "telemark-wax-pro/3.0"}
+
+DEFAULT_MIRRORS = (
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter",
+)
+MIRRORS: Tuple[str, ...] = tuple(
+    u.strip()
+    for u in os.environ.get("TELEMARK_OVERPASS_URLS", ",".join(DEFAULT_MIRRORS)).split(",")
+    if u.strip()
+)
+
+RETRY_STATUS = frozenset({429, 502, 503, 504})
+COOLDOWN_S = 30.0  # pausa di un mirror dopo 429/5xx/errore di rete
+RESULT_TTL_S = 1800.0  # come le cache piste di core.maps
+RESULT_CACHE_SIZE = 32
+FAIL_TTL_S = 15.0  # cache negativa: tutti i mirror falliti
+
+GRID_DEG = 0.005  # ~550 m in latitudine
+GRID_PAD_M = int(math.ceil(0.5 * GRID_DEG * 111320.0 * math.sqrt(2.0)))
+
+
+class OverpassError(RuntimeError):
+    """Nessun mirror Overpass ha risposto correttamente."""
+
+
+# ----------------------------------------------------------------------
+# Stato condiviso
+# ----------------------------------------------------------------------
+_LOCK = threading.Lock()
+_INFLIGHT: Dict[str, Future] = {}
+_RESULTS: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key → (scadenza, js | errore)
+_COOLDOWN: Dict[str, float] = {}  # mirror → istante fino a cui è in pausa
+
+_COUNTERS: Dict[str, int] = {
+    "requests": 0,
+    "hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "failed_fast": 0,
+    "errors": 0,
+    "failovers": 0,
+}
+_MIRROR_STATS: Dict[str, Dict[str, float]] = {}
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _LOCK:
+        _COUNTERS[name] += n
+
+
+def _record_call(url: str, latency_s: Optional[float], ok: bool) -> None:
+    with _LOCK:
+        m = _MIRROR_STATS.setdefault(
+            url, {"calls": 0, "errors": 0, "latency_s_sum": 0.0, "latency_s_max": 0.0}
+        )
+        m["calls"] += 1
+        if not ok:
+            m["errors"] += 1
+        if latency_s is not None:
+            m["latency_s_sum"] += latency_s
+            m["latency_s_max"] = max(m["latency_s_max"], latency_s)
+
+
+def stats() -> Dict[str, Any]:
+    """Contatori globali e latenze per mirror (ms)."""
+    with _LOCK:
+        mirrors = {
+            url: {
+                "calls": int(m["calls"]),
+                "errors": int(m["errors"]),
+                "latency_ms_avg": round(1000.0 * m["latency_s_sum"] / m["calls"], 1)
+                if m["calls"]
+                else None,
+                "latency_ms_max": round(1000.0 * m["latency_s_max"], 1),
+            }
+            for url, m in _MIRROR_STATS.items()
+        }
+        return {**_COUNTERS, "inflight": len(_INFLIGHT), "cached": len(_RESULTS), "mirrors": mirrors}
+
+
+def reset() -> None:
+    """Svuota cache, pause mirror e contatori (benchmark / debug)."""
+    with _LOCK:
+        _RESULTS.clear()
+        _COOLDOWN.clear()
+        _MIRROR_STATS.clear()
+        for k in _COUNTERS:
+            _COUNTERS[k] = 0
+
+
+# ----------------------------------------------------------------------
+# Griglia dei centri
+# ----------------------------------------------------------------------
+def snap_center(lat: float, lon: float, radius_m: float) -> Tuple[float, float, int]:
+    """
+    (lat, lon, raggio) da usare in "around": centro sulla griglia GRID_DEG,
+    raggio allargato così che il cerchio copra quello originale.
+    """
+    lat_q = round(round(float(lat) / GRID_DEG) * GRID_DEG, 6)
+    lon_q = round(round(float(lon) / GRID_DEG) * GRID_DEG, 6)
+    return lat_q, lon_q, int(radius_m) + GRID_PAD_M
+
+
+# ----------------------------------------------------------------------
+# Rete con failover
+# ----------------------------------------------------------------------
+def _mirror_order() -> List[str]:
+    """Mirror nell'ordine configurato, quelli in pausa in coda."""
+    now = time.monotonic()
+    with _LOCK:
+        ready = [u for u in MIRRORS if _COOLDOWN.get(u, 0.0) <= now]
+        paused = sorted(
+            (u for u in MIRRORS if _COOLDOWN.get(u, 0.0) > now),
+            key=lambda u: _COOLDOWN[u],
+        )
+    return ready + paused
+
+
+def _pause(url: str, resp: Any = None) -> None:
+    delay = COOLDOWN_S
+    try:
+        retry_after = getattr(resp, "headers", {}).get("Retry-After")
+        if retry_after:
+            delay = max(1.0, min(float(retry_after), 300.0))
+    except Exception:
+        pass
+    with _LOCK:
+        _COOLDOWN[url] = time.monotonic() + delay
+
+
+def _is_retry_status(status: int) -> bool:
+    return status in RETRY_STATUS or status >= 500
+
+
+def is_partial(js: Any) -> bool:
+    """Risposta troncata dal server (timeout / memoria a runtime)."""
+    remark = js.get("remark") if isinstance(js, dict) else None
+    if not isinstance(remark, str):
+        return False
+    remark = remark.lower()
+    return "runtime error" in remark or "timed out" in remark
+
+
+def _post_with_failover(q: str, timeout: float) -> Any:
+    last_err = "nessun mirror configurato"
+    for attempt, url in enumerate(_mirror_order()):
+        if attempt:
+            _count("failovers")
+        t0 = time.perf_counter()
+        try:
+            r = http_backend.post(url, data=q.encode("utf8"), headers=UA, timeout=timeout)
+        except Exception as e:
+            _record_call(url, None, ok=False)
+            _pause(url)
+            last_err = f"{url}: {e}"
+            continue
+        dt = time.perf_counter() - t0
+
+        if _is_retry_status(r.status_code):
+            _record_call(url, dt, ok=False)
+            _pause(url, r)
+            last_err = f"{url}: HTTP {r.status_code}"
+            continue
+
+        try:
+            r.raise_for_status()
+            js = r.json()
+        except Exception as e:
+            # 4xx diverso da 429 o JSON rotto: la query è il problema,
+            # un altro mirror darebbe lo stesso risultato
+            _record_call(url, dt, ok=False)
+            raise OverpassError(f"{url}: {e}") from e
+        _record_call(url, dt, ok=True)
+        return js
+
+    raise OverpassError(last_err)
+
+
+# ----------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------
+def _query_key(q: str) -> str:
+    return hashlib.sha1(" ".join(q.split()).encode("utf8")).hexdigest()
+
+
+def query(q: str, timeout: float = 25.0) -> Dict[str, Any]:
+    """
+    Esegue una query Overpass QL e ritorna il JSON.
+    Solleva OverpassError se nessun mirror risponde (l'errore resta in
+    cache FAIL_TTL_S secondi: le richieste uguali falliscono subito).
+    Le risposte parziali (remark di timeout) non vengono messe in cache.
+    """
+    key = _query_key(q)
+    now = time.monotonic()
+    with _LOCK:
+        _COUNTERS["requests"] += 1
+        cached = _RESULTS.get(key)
+        if cached is not None and cached[0] > now:
+            _RESULTS.move_to_end(key)
+            if isinstance(cached[1], OverpassError):
+                _COUNTERS["failed_fast"] += 1
+                raise cached[1]
+            _COUNTERS["hits"] += 1
+            return cached[1]
+
+        fut = _INFLIGHT.get(key)
+        owner = fut is None
+        if owner:
+            fut = Future()
+            _INFLIGHT[key] = fut
+            _COUNTERS["misses"] += 1
+        else:
+            _COUNTERS["coalesced"] += 1
+
+    if not owner:
+        return fut.result()
+
+    try:
+        js = _post_with_failover(q, timeout)
+    except OverpassError as e:
+        _count("errors")
+        with _LOCK:
+            _RESULTS[key] = (time.monotonic() + FAIL_TTL_S, e)
+            _INFLIGHT.pop(key, None)
+        fut.set_exception(e)
+        raise
+    except BaseException as e:
+        with _LOCK:
+            _INFLIGHT.pop(key, None)
+        fut.set_exception(e)
+        raise
+
+    with _LOCK:
+        if not is_partial(js):
+            _RESULTS[key] = (time.monotonic() + RESULT_TTL_S, js)
+            _RESULTS.move_to_end(key)
+            while len(_RESULTS) > RESULT_CACHE_SIZE:
+                _RESULTS.popitem(last=False)
+        _INFLIGHT.pop(key, None)
+    fut.set_result(js)
+    return js
@@ -4,7 +4,6 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Dict, Any
 
-import pandas as pd
 import altair as alt
 import streamlit as st
 
@@ -28,21 +27,8 @@ def _build_profile_df(ctx: Dict[str, Any]):
     if profile is None:
         return None
 
-    df = pd.DataFrame(
-        {
-            "time": profile.times,
-            "temp_air": profile.temp_air,
-            "snow_temp": profile.snow_temp,
-            "rh": profile.rh,
-            "cloudcover": profile.cloudcover,
-            "windspeed": profile.windspeed,
-            "precipitation": profile.precip,
-            "snowfall": profile.snowfall,
-            "shade_index": profile.shade_index,
-            "snow_moisture_index": profile.snow_moisture_index,
-            "glide_index": profile.glide_index,
-        }
-    )
+    df = profile.to_frame().reset_index()
+    df = df.rename(columns={"precip": "precipitation"})
     return df
 
 
@@ -16,6 +16,7 @@ from typing import Dict, Any, Optional, List
 import pandas as pd
 
 from core import meteo as meteo_mod
+from core.time_index import nearest_index
 from core.wax_logic import classify_snow
 
 
@@ -42,21 +43,8 @@ def profile_to_dataframe(profile) -> pd.DataFrame:
     Converte il profilo giorno intero in DataFrame completo
     per grafici e analisi.
     """
-    return pd.DataFrame(
-        {
-            "time": profile.times,
-            "temp_air": profile.temp_air,
-            "snow_temp": profile.snow_temp,
-            "rh": profile.rh,
-            "cloudcover": profile.cloudcover,
-            "windspeed": profile.windspeed,
-            "precipitation": profile.precip,
-            "snowfall": profile.snowfall,
-            "shade_index": profile.shade_index,
-            "snow_moisture_index": profile.snow_moisture_index,
-            "glide_index": profile.glide_index,
-        }
-    )
+    df = profile.to_frame().reset_index()
+    return df.rename(columns={"precip": "precipitation"})
 
 
 # -----------------------------------------------------------
@@ -113,8 +101,8 @@ def get_reference_conditions(wax_df: pd.DataFrame, target_ts: datetime):
     Ritorna:
         (snow_label, row)
     """
-    idx = (wax_df["time_local"] - target_ts).abs().idxmin()
-    row = wax_df.loc[idx]
+    pos = nearest_index(wax_df["time_local"].to_numpy(), target_ts)
+    row = wax_df.iloc[pos]
     snow_label = classify_snow(row)
     return snow_label, row
 
@@ -6,7 +6,6 @@ from __future__ import annotations
 from typing import Any, Dict, Optional, List
 from pathlib import Path
 import os
-import math
 
 import streamlit as st
 
@@ -14,6 +13,7 @@ from core.i18n import L
 from core import pov as pov_mod
 from core import pov_3d as pov3d_mod
 from core import pov_video as pov_video_mod
+from core.piste_network import polyline_stats
 
 
 # -------------------------------------------------------------
@@ -59,57 +59,28 @@ ctx["pov_piste_name"] = pista_name  # mi assicuro sia presente
 # -------------------------------------------------------------
 # STATISTICHE RAPIDE (lunghezza, dislivello)
 # -------------------------------------------------------------
-def _dist_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Distanza in metri tra due punti lat/lon (haversine semplificata)."""
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = (
-        math.sin(dphi / 2.0) ** 2
-        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2.0) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
 def _compute_stats(pts: List[Dict[str, float]]) -> Dict[str, float]:
-    length = 0.0
-    elevs: List[float] = []
-    for i in range(1, len(pts)):
-        a = pts[i - 1]
-        b = pts[i]
-        length += _dist_m(
-            float(a.get("lat", 0.0)),
-            float(a.get("lon", 0.0)),
-            float(b.get("lat", 0.0)),
-            float(b.get("lon", 0.0)),
-        )
-    for p in pts:
-        elevs.append(float(p.get("elev", 0.0)))
-    if elevs:
-        min_e = min(elevs)
-        max_e = max(elevs)
-    else:
-        min_e = max_e = 0.0
-
-    return {
-        "length_m": length,
-        "vert_m": max_e - min_e,
-        "min_elev": min_e,
-        "max_elev": max_e,
-    }
+    return polyline_stats(
+        [float(p.get("lat", 0.0)) for p in pts],
+        [float(p.get("lon", 0.0)) for p in pts],
+        [float(p.get("elev", 0.0)) for p in pts],
+    )
 
 
+# dai punti (quote da /elevation); senza quote il tracciato è piatto e
+# lunghezza / dislivello vengono dalla rete piste
+has_elev = bool(ctx.get("pov_piste_has_elev"))
 stats = _compute_stats(points)
+if not has_elev and ctx.get("pov_piste_stats"):
+    stats = ctx["pov_piste_stats"]
 
 col_info, col_nums = st.columns([2, 1])
 with col_info:
     st.markdown(
         f"<div class='card small'>"
         f"<b>Pista selezionata:</b> {pista_name}<br>"
-        f"<span class='small'>POV basato sui dati estratti dalla mappa.</span>"
+        f"<span class='small'>POV basato sui dati estratti dalla mappa"
+        f"{'' if has_elev else ' (quote non disponibili: tracciato piatto)'}.</span>"
         f"</div>",
         unsafe_allow_html=True,
     )
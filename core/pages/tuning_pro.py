@@ -12,11 +12,11 @@ from datetime import datetime
 from typing import Any, Dict
 
 import altair as alt
-import pandas as pd
 import streamlit as st
 
 from core.i18n import L
 from core.meteo import (
+    EnsembleMeteoProfile,
     build_meteo_profile_for_race_day,
     build_dynamic_tuning_for_race,
 )
@@ -99,10 +99,12 @@ with col1:
 
 with col2:
     race_dt = st.datetime_input("Data/Ora riferimento (gara / sciata)", value=default_dt)
+    provider_opts = ["auto", "gfs", "icon", "ecmwf", "ensemble"]
     provider = st.selectbox(
         "Provider meteo",
-        ["auto", "meteoblue", "open-meteo"],
-        index=0 if default_provider not in ["meteoblue", "open-meteo"] else ["auto", "meteoblue", "open-meteo"].index(default_provider),
+        provider_opts,
+        index=provider_opts.index(default_provider) if default_provider in provider_opts else 0,
+        help="ensemble = GFS + ICON + ECMWF in parallelo, con bande di incertezza.",
     )
 
 with col3:
@@ -139,23 +141,50 @@ if profile is None:
     st.stop()
 
 # DataFrame base
-df = pd.DataFrame(
-    {
-        "time": profile.times,
-        "temp_air": profile.temp_air,
-        "snow_temp": profile.snow_temp,
-        "rh": profile.rh,
-        "cloudcover": profile.cloudcover,
-        "windspeed": profile.windspeed,
-        "precip": profile.precip,
-        "snowfall": profile.snowfall,
-        "shade": profile.shade_index,
-        "moisture": profile.snow_moisture_index,
-        "glide": profile.glide_index,
-    }
+df = (
+    profile.to_frame()
+    .reset_index()
+    .rename(
+        columns={
+            "shade_index": "shade",
+            "snow_moisture_index": "moisture",
+            "glide_index": "glide",
+        }
+    )
 )
 
 
+# Bande di incertezza (solo provider "ensemble")
+if isinstance(profile, EnsembleMeteoProfile):
+    st.caption(
+        "Ensemble: " + ", ".join(profile.members.keys())
+        + " — linea = mediana, fascia = 10°–90° percentile fra i modelli."
+    )
+    df_bands = profile.bands_frame().reset_index()
+
+    colB1, colB2 = st.columns(2)
+    for col_st, field, title in [
+        (colB1, "snow_temp", "T neve (°C)"),
+        (colB2, "glide_index", "Glide index (0–1)"),
+    ]:
+        band = (
+            alt.Chart(df_bands)
+            .mark_area(opacity=0.3)
+            .encode(
+                x=alt.X("time:T", title="Orario"),
+                y=alt.Y(f"{field}_p10:Q", title=title),
+                y2=f"{field}_p90:Q",
+            )
+        )
+        line = (
+            alt.Chart(df_bands)
+            .mark_line()
+            .encode(x="time:T", y=f"{field}_p50:Q")
+        )
+        with col_st:
+            st.altair_chart((band + line).properties(height=220), use_container_width=True)
+
+
 # -------------------------------------------------------------
 # CALCOLO TUNING DINAMICO
 # -------------------------------------------------------------
@@ -10,9 +10,11 @@
 from __future__ import annotations
 from typing import Optional, Dict, Any
 
-import requests
 import streamlit as st
 
+from core import http_backend
+from core.time_index import nearest_index
+
 MIN_ELEVATION_M = 1000.0
 UA = {"User-Agent": "telemark-wax-pro/4.0"}
 
@@ -72,7 +74,7 @@ def geocode_place(query: str) -> Optional[Dict[str, Any]]:
     }
 
     try:
-        r = requests.get(
+        r = http_backend.get(
             "https://geocoding-api.open-meteo.com/v1/search",
             params=params,
             headers=UA,
@@ -205,8 +207,8 @@ def nearest_row(df, target_ts):
     """
     if df is None or df.empty:
         return None
-    idx = (df["time_local"] - target_ts).abs().idxmin()
-    return df.loc[idx]
+    pos = nearest_index(df["time_local"].to_numpy(), target_ts)
+    return df.iloc[pos]
 
 
 def print_debug(msg: str):
@@ -0,0 +1,231 @@
+# core/piste_catalogue.py
+# Catalogo piste per comprensorio (calcolato una volta al caricamento)
+#
+# - Una voce per pista "logica": i tratti con lo stesso nome e la stessa
+#   difficoltà che si toccano (nodi OSM in comune) formano una sola voce
+# - Per voce: etichetta univoca, id dei tratti nel PisteSet, bbox,
+#   punto medio (a metà lunghezza del tratto principale), lunghezza,
+#   dislivello, difficoltà
+# - Le quote non servono a costruirlo: il dislivello si aggiunge dopo
+#   (with_elevation), così selettore e mappa non aspettano /elevation
+# - Omonimi disambiguati: "Nome (red)" se cambia la difficoltà,
+#   altrimenti "Nome #2", "Nome #3" in ordine di lunghezza
+# - Lookup O(1) per etichetta, id voce, indice pista, chiave pista e nome
+# - Usato da core.maps per selettore, etichette, snap e export POV
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.piste_network import segment_lengths_m
+from core.pistes import PisteSet
+
+
+@dataclass(frozen=True)
+class PisteEntry:
+    id: int
+    label: str
+    name: str
+    difficulty: Optional[str]
+    pistes: Tuple[int, ...]  # indici nel PisteSet, tratto principale per primo
+    bbox: Tuple[float, float, float, float]  # lat_min, lon_min, lat_max, lon_max
+    midpoint: Tuple[float, float]
+    length_m: float
+    vertical_m: float
+
+    @property
+    def main(self) -> int:
+        """Indice nel PisteSet del tratto più lungo."""
+        return self.pistes[0]
+
+
+def _midpoint(coords: np.ndarray) -> Tuple[float, float]:
+    """Vertice a metà della lunghezza del tracciato."""
+    cum = np.concatenate([[0.0], np.cumsum(segment_lengths_m(coords[:, 0], coords[:, 1]))])
+    k = int(np.searchsorted(cum, cum[-1] / 2.0))
+    k = min(k, coords.shape[0] - 1)
+    return float(coords[k, 0]), float(coords[k, 1])
+
+
+def _components(ids: List[int], pistes: PisteSet) -> List[List[int]]:
+    """Gruppi di tratti collegati da almeno un nodo OSM in comune."""
+    parent = {i: i for i in ids}
+
+    def _find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner: Dict[int, int] = {}
+    for i in ids:
+        a, b = int(pistes.offsets[i]), int(pistes.offsets[i + 1])
+        for nid in np.unique(pistes.node_ids[a:b]).tolist():
+            j = owner.setdefault(nid, i)
+            if j != i:
+                parent[_find(i)] = _find(j)
+
+    groups: Dict[int, List[int]] = {}
+    for i in ids:
+        groups.setdefault(_find(i), []).append(i)
+    return list(groups.values())
+
+
+def _vertical_m(ids: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> float:
+    """Dislivello di un gruppo di tratti dalle quote min/max per pista (0 se ignote)."""
+    z_lo, z_hi = lo[ids], hi[ids]
+    if np.isfinite(z_lo).any() and np.isfinite(z_hi).any():
+        return float(np.nanmax(z_hi) - np.nanmin(z_lo))
+    return 0.0
+
+
+class PisteCatalogue:
+    """
+    cat = PisteCatalogue.build(pistes)          # subito, senza quote
+    cat = cat.with_elevation(elev_min, elev_max)  # dislivelli, quando noti
+    cat.labels                    # per il selettore (ordinati)
+    e = cat.by_label("Bellevue")  # PisteEntry
+    e = cat.entry_of_piste(12)    # voce che contiene la pista 12
+    """
+
+    def __init__(self, entries: List[PisteEntry], n_pistes: int, keys: Sequence[str]) -> None:
+        self.entries = entries
+        self.labels: List[str] = sorted(e.label for e in entries)
+        self._by_label: Dict[str, int] = {e.label: e.id for e in entries}
+        self._by_name: Dict[str, List[int]] = {}
+        self._of_piste = np.full(n_pistes, -1, dtype=np.int64)
+        for e in entries:
+            self._by_name.setdefault(e.name, []).append(e.id)
+            self._of_piste[list(e.pistes)] = e.id
+        self._by_key: Dict[str, int] = {
+            k: int(self._of_piste[i]) for i, k in enumerate(keys) if self._of_piste[i] >= 0
+        }
+        self._keys = list(keys)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, entry_id: int) -> PisteEntry:
+        return self.entries[entry_id]
+
+    def __contains__(self, label: object) -> bool:
+        return label in self._by_label
+
+    def by_label(self, label: Optional[str]) -> Optional[PisteEntry]:
+        i = self._by_label.get(label) if label else None
+        return self.entries[i] if i is not None else None
+
+    def by_key(self, piste_key: str) -> Optional[PisteEntry]:
+        i = self._by_key.get(piste_key)
+        return self.entries[i] if i is not None else None
+
+    def by_name(self, name: str) -> List[PisteEntry]:
+        return [self.entries[i] for i in self._by_name.get(name, [])]
+
+    def entry_of_piste(self, piste: int) -> Optional[PisteEntry]:
+        if piste < 0 or piste >= self._of_piste.size:
+            return None
+        i = int(self._of_piste[piste])
+        return self.entries[i] if i >= 0 else None
+
+    def with_elevation(self, elev_min: np.ndarray, elev_max: np.ndarray) -> "PisteCatalogue":
+        """
+        Stesso catalogo (etichette, id, lookup) con i dislivelli calcolati
+        da quote min/max per pista (es. PisteNetwork.elevation_range_by_line).
+        """
+        lo = np.asarray(elev_min, dtype=float)
+        hi = np.asarray(elev_max, dtype=float)
+        entries = [
+            replace(e, vertical_m=_vertical_m(np.asarray(e.pistes, dtype=np.int64), lo, hi))
+            for e in self.entries
+        ]
+        return PisteCatalogue(entries, int(self._of_piste.size), self._keys)
+
+    # ---------------- costruzione ----------------
+    @classmethod
+    def build(
+        cls,
+        pistes: PisteSet,
+        elev_min: Optional[np.ndarray] = None,
+        elev_max: Optional[np.ndarray] = None,
+    ) -> "PisteCatalogue":
+        """
+        elev_min / elev_max: quote min/max per pista (es. dalla rete piste),
+        NaN o None se ignote → dislivello 0.
+        """
+        n = len(pistes)
+        if n == 0:
+            return cls([], 0, [])
+
+        seg = segment_lengths_m(pistes.coords[:, 0], pistes.coords[:, 1])
+        line_of = np.repeat(np.arange(n), np.diff(pistes.offsets))
+        if seg.size:
+            seg[line_of[:-1] != line_of[1:]] = 0.0
+        cum = np.concatenate([[0.0], np.cumsum(seg)])
+        lengths = cum[pistes.offsets[1:] - 1] - cum[pistes.offsets[:-1]]
+        bboxes = pistes.bboxes()
+        lo = elev_min if elev_min is not None else np.full(n, np.nan)
+        hi = elev_max if elev_max is not None else np.full(n, np.nan)
+
+        # raggruppo per (nome, difficoltà) e poi per contatto
+        by_name: Dict[str, Dict[Optional[str], List[int]]] = {}
+        for i, nm in enumerate(pistes.names):
+            if not nm:
+                continue
+            diff = pistes.tags[i].get("piste:difficulty")
+            by_name.setdefault(nm, {}).setdefault(diff, []).append(i)
+
+        raw: List[Tuple[str, Optional[str], List[int]]] = []
+        for nm, by_diff in by_name.items():
+            for diff, ids in by_diff.items():
+                for comp in _components(ids, pistes):
+                    comp.sort(key=lambda i: -lengths[i])
+                    raw.append((nm, diff, comp))
+
+        # etichette univoche
+        per_name: Dict[str, List[Tuple[Optional[str], List[int]]]] = {}
+        for nm, diff, comp in raw:
+            per_name.setdefault(nm, []).append((diff, comp))
+
+        entries: List[PisteEntry] = []
+        for nm in sorted(per_name):
+            groups = per_name[nm]
+            groups.sort(key=lambda g: -float(lengths[g[1]].sum()))
+            diffs = [d for d, _ in groups]
+            rank: Dict[Optional[str], int] = {}
+            for diff, comp in groups:
+                if len(groups) == 1:
+                    label = nm
+                elif diff and diffs.count(diff) == 1:
+                    label = f"{nm} ({diff})"
+                else:
+                    rank[diff] = rank.get(diff, 0) + 1
+                    base = f"{nm} ({diff})" if diff and len(set(diffs)) > 1 else nm
+                    label = f"{base} #{rank[diff]}"
+
+                ids = np.asarray(comp, dtype=np.int64)
+                bb = bboxes[ids]
+                vertical = _vertical_m(ids, lo, hi)
+                entries.append(
+                    PisteEntry(
+                        id=len(entries),
+                        label=label,
+                        name=nm,
+                        difficulty=diff,
+                        pistes=tuple(int(i) for i in comp),
+                        bbox=(
+                            float(bb[:, 0].min()),
+                            float(bb[:, 1].min()),
+                            float(bb[:, 2].max()),
+                            float(bb[:, 3].max()),
+                        ),
+                        midpoint=_midpoint(pistes.coords_of(comp[0])),
+                        length_m=float(lengths[ids].sum()),
+                        vertical_m=vertical,
+                    )
+                )
+
+        return cls(entries, n, [pistes.key_of(i) for i in range(n)])
@@ -0,0 +1,227 @@
+# core/piste_index.py
+# Indice spaziale delle piste per snap del click e pista più vicina
+#
+# - Coordinate proiettate in metri (equirettangolare locale attorno al
+#   centroide del comprensorio: errore trascurabile su pochi km)
+# - Segmenti consecutivi di ogni pista (mai a cavallo fra due piste)
+# - Griglia hash a celle fisse: ogni segmento registrato nelle celle
+#   coperte dal suo bounding box, tabella CSR ordinata per cella
+# - Query: sole celle entro il raggio → distanza punto-segmento
+#   vettoriale sui candidati (non distanza dai vertici)
+
+from __future__ import annotations
+
+import math
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+DEFAULT_CELL_M = 100.0
+
+
+class SnapHit(NamedTuple):
+    piste: int            # indice pista nel PisteSet
+    segment: int          # indice del vertice iniziale del segmento (in coords)
+    dist_m: float         # distanza punto-segmento
+    lat: float            # punto proiettato sulla pista
+    lon: float
+
+
+class PisteSpatialIndex:
+    """
+    Griglia hash su segmenti di pista.
+
+    idx = PisteSpatialIndex(pistes.coords, pistes.offsets)
+    hit = idx.nearest(lat, lon, max_dist_m=300)   # SnapHit o None
+    """
+
+    __slots__ = (
+        "lat0",
+        "lon0",
+        "_kx",
+        "_ky",
+        "cell_m",
+        "_ax",
+        "_ay",
+        "_bx",
+        "_by",
+        "_seg_start",
+        "_seg_piste",
+        "_cell_keys",
+        "_cell_starts",
+        "_cell_segs",
+    )
+
+    def __init__(
+        self,
+        coords: np.ndarray,
+        offsets: np.ndarray,
+        cell_m: float = DEFAULT_CELL_M,
+    ) -> None:
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        self.cell_m = float(cell_m)
+
+        if coords.shape[0]:
+            self.lat0 = float(np.mean(coords[:, 0]))
+            self.lon0 = float(np.mean(coords[:, 1]))
+        else:
+            self.lat0 = self.lon0 = 0.0
+        self._ky = math.radians(1.0) * EARTH_RADIUS_M
+        self._kx = self._ky * math.cos(math.radians(self.lat0))
+
+        x, y = self._project(coords[:, 0], coords[:, 1])
+
+        # segmenti: coppie (i, i+1) dentro la stessa pista
+        n = coords.shape[0]
+        valid = np.ones(max(n - 1, 0), dtype=bool)
+        ends = offsets[1:-1] - 1
+        valid[ends[(ends >= 0) & (ends < valid.size)]] = False
+        seg_start = np.nonzero(valid)[0]
+        piste_of_vertex = np.repeat(np.arange(offsets.size - 1), np.diff(offsets))
+
+        self._seg_start = seg_start
+        self._seg_piste = piste_of_vertex[seg_start]
+        self._ax = x[seg_start]
+        self._ay = y[seg_start]
+        self._bx = x[seg_start + 1]
+        self._by = y[seg_start + 1]
+
+        self._build_grid()
+
+    # ---------------- proiezione ----------------
+    def _project(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        return (lon - self.lon0) * self._kx, (lat - self.lat0) * self._ky
+
+    def _unproject(self, x: float, y: float) -> Tuple[float, float]:
+        return self.lat0 + y / self._ky, self.lon0 + x / self._kx
+
+    @staticmethod
+    def _cell_key(ix: np.ndarray, iy: np.ndarray) -> np.ndarray:
+        return (ix.astype(np.int64) << 32) + (iy.astype(np.int64) & 0xFFFFFFFF)
+
+    # ---------------- griglia ----------------
+    def _build_grid(self) -> None:
+        c = self.cell_m
+        ix0 = np.floor(np.minimum(self._ax, self._bx) / c).astype(np.int64)
+        ix1 = np.floor(np.maximum(self._ax, self._bx) / c).astype(np.int64)
+        iy0 = np.floor(np.minimum(self._ay, self._by) / c).astype(np.int64)
+        iy1 = np.floor(np.maximum(self._ay, self._by) / c).astype(np.int64)
+
+        nx = ix1 - ix0 + 1
+        ny = iy1 - iy0 + 1
+        per_seg = nx * ny
+        total = int(per_seg.sum())
+
+        seg = np.repeat(np.arange(self._ax.size), per_seg)
+        # posizione locale della cella dentro il bbox del segmento
+        local = np.arange(total) - np.repeat(np.cumsum(per_seg) - per_seg, per_seg)
+        ny_r = np.repeat(ny, per_seg)
+        cx = np.repeat(ix0, per_seg) + local // np.maximum(ny_r, 1)
+        cy = np.repeat(iy0, per_seg) + local % np.maximum(ny_r, 1)
+
+        keys = self._cell_key(cx, cy)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        self._cell_segs = seg[order]
+        self._cell_keys, self._cell_starts = np.unique(keys, return_index=True)
+        self._cell_starts = np.append(self._cell_starts, keys.size)
+
+    def _candidates(self, x: float, y: float, radius_m: float) -> np.ndarray:
+        """Segmenti registrati nelle celle entro radius_m dal punto."""
+        c = self.cell_m
+        r = int(math.ceil(radius_m / c))
+        cx, cy = int(math.floor(x / c)), int(math.floor(y / c))
+
+        if (2 * r + 1) ** 2 <= self._cell_keys.size:
+            gx, gy = np.meshgrid(
+                np.arange(cx - r, cx + r + 1),
+                np.arange(cy - r, cy + r + 1),
+                indexing="ij",
+            )
+            want = self._cell_key(gx.ravel(), gy.ravel())
+            pos = np.searchsorted(self._cell_keys, want)
+            ok = pos < self._cell_keys.size
+            pos, want = pos[ok], want[ok]
+            pos = pos[self._cell_keys[pos] == want]
+        else:
+            # raggio più ampio della griglia: filtro direttamente le celle occupate
+            ix = self._cell_keys >> 32
+            iy = (self._cell_keys & 0xFFFFFFFF).astype(np.int64)
+            iy = np.where(iy >= 1 << 31, iy - (1 << 32), iy)
+            pos = np.nonzero((np.abs(ix - cx) <= r) & (np.abs(iy - cy) <= r))[0]
+
+        if pos.size == 0:
+            return np.empty(0, dtype=np.int64)
+
+        starts = self._cell_starts[pos]
+        lens = self._cell_starts[pos + 1] - starts
+        flat = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(int(lens.sum()))
+        return np.unique(self._cell_segs[flat])
+
+    # ---------------- query ----------------
+    def _closest_on(self, segs: np.ndarray, x: float, y: float):
+        ax, ay = self._ax[segs], self._ay[segs]
+        dx, dy = self._bx[segs] - ax, self._by[segs] - ay
+        len2 = dx * dx + dy * dy
+        safe = np.where(len2 > 0, len2, 1.0)
+        t = np.clip(((x - ax) * dx + (y - ay) * dy) / safe, 0.0, 1.0)
+        t = np.where(len2 > 0, t, 0.0)
+        px, py = ax + t * dx, ay + t * dy
+        d = np.hypot(px - x, py - y)
+        k = int(np.argmin(d))
+        return k, float(d[k]), float(px[k]), float(py[k])
+
+    def __len__(self) -> int:
+        return int(self._ax.size)
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        max_dist_m: Optional[float] = None,
+    ) -> Optional[SnapHit]:
+        """
+        Segmento di pista più vicino al punto.
+        Con max_dist_m → None se nulla entro il raggio; senza → il più
+        vicino in assoluto (ricerca per anelli di celle crescenti).
+        """
+        if self._ax.size == 0:
+            return None
+        x, y = (float(v) for v in self._project(lat, lon))
+
+        if max_dist_m is not None:
+            segs = self._candidates(x, y, float(max_dist_m))
+        else:
+            radius = self.cell_m
+            segs = self._candidates(x, y, radius)
+            while segs.size == 0 and radius < 1e6:
+                radius *= 4.0
+                segs = self._candidates(x, y, radius)
+            if segs.size == 0:
+                segs = np.arange(self._ax.size)
+            else:
+                # il primo candidato trovato non è per forza il più vicino:
+                # ricontrollo tutte le celle entro la sua distanza
+                _, d, _, _ = self._closest_on(segs, x, y)
+                segs = self._candidates(x, y, d)
+
+        if segs.size == 0:
+            return None
+
+        k, d, px, py = self._closest_on(segs, x, y)
+        if max_dist_m is not None and d > max_dist_m:
+            return None
+
+        s = int(segs[k])
+        plat, plon = self._unproject(px, py)
+        return SnapHit(
+            piste=int(self._seg_piste[s]),
+            segment=int(self._seg_start[s]),
+            dist_m=d,
+            lat=plat,
+            lon=plon,
+        )
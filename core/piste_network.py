@@ -0,0 +1,387 @@
+# core/piste_network.py
+# Rete piste + impianti di un comprensorio (grafo orientato)
+#
+# - Nodi: nodi OSM condivisi fra più piste/impianti (incroci, partenze,
+#   arrivi) + estremi di ogni linea
+# - Archi: tratti di pista fra due nodi consecutivi (discesa) e tratti di
+#   impianto (salita), con lunghezza, dislivello, difficoltà
+# - Orientamento: piste dall'alto verso il basso, impianti dal basso verso
+#   l'alto se le quote dei nodi sono note, altrimenti verso di disegno OSM
+#   (convenzione: piste disegnate in discesa, impianti in salita)
+# - Query:
+#     · longest_descent_from_lift: discesa continua più lunga dall'arrivo
+#       di un impianto
+#     · reachable_from: piste raggiungibili da un punto (piste + impianti)
+#     · run_stats / stats_by_difficulty: lunghezze e dislivelli
+# - Helper vettoriali sui tracciati (resample_polyline, polyline_stats,
+#   longest_continuous_run) usati anche da mappa, POV 3D e pagina POV
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from core.pistes import PisteSet
+
+EARTH_RADIUS_M = 6371000.0
+
+EDGE_PISTE = 0
+EDGE_LIFT = 1
+
+ElevationFn = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+# ----------------------------------------------------------------------
+# Helper vettoriali su tracciati
+# ----------------------------------------------------------------------
+def segment_lengths_m(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distanze haversine fra punti consecutivi (n-1 valori)."""
+    la = np.radians(np.asarray(lat, dtype=float))
+    lo = np.radians(np.asarray(lon, dtype=float))
+    if la.size < 2:
+        return np.zeros(0)
+    dphi = np.diff(la)
+    dlmb = np.diff(lo)
+    a = np.sin(dphi / 2.0) ** 2 + np.cos(la[:-1]) * np.cos(la[1:]) * np.sin(dlmb / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def resample_polyline(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    spacing_m: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Punti a passo costante lungo il tracciato (estremi inclusi).
+    Ritorna (lat, lon, distanza progressiva in metri).
+    """
+    la = np.asarray(lat, dtype=float)
+    lo = np.asarray(lon, dtype=float)
+    if la.size < 2:
+        return la.copy(), lo.copy(), np.zeros(la.size)
+    cum = np.concatenate([[0.0], np.cumsum(segment_lengths_m(la, lo))])
+    total = float(cum[-1])
+    n = max(int(np.ceil(total / max(spacing_m, 1e-6))), 1) + 1
+    dist = np.linspace(0.0, total, n)
+    return np.interp(dist, cum, la), np.interp(dist, cum, lo), dist
+
+
+def polyline_stats(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    elev: Optional[Sequence[float]] = None,
+) -> Dict[str, float]:
+    """Lunghezza, dislivello e quote min/max di un tracciato."""
+    seg = segment_lengths_m(lat, lon)
+    e = np.asarray(elev if elev is not None else [], dtype=float)
+    e = e[np.isfinite(e)]
+    min_e = float(e.min()) if e.size else 0.0
+    max_e = float(e.max()) if e.size else 0.0
+    return {
+        "length_m": float(seg.sum()),
+        "vert_m": max_e - min_e,
+        "min_elev": min_e,
+        "max_elev": max_e,
+    }
+
+
+def longest_continuous_run(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    max_jump_m: float,
+) -> Tuple[int, int]:
+    """
+    (inizio, fine) esclusivo del tratto continuo più lungo (in metri) in cui
+    nessun passo supera max_jump_m. Se non c'è un tratto di almeno 2 punti
+    ritorna l'intero intervallo.
+    """
+    n = len(lat)
+    if n < 2:
+        return 0, n
+    seg = segment_lengths_m(lat, lon)
+    breaks = np.nonzero(seg > max_jump_m)[0]
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks + 1, [n]])
+    cum = np.concatenate([[0.0], np.cumsum(np.where(seg > max_jump_m, 0.0, seg))])
+    lengths = np.where(ends - starts >= 2, cum[ends - 1] - cum[starts], -1.0)
+    k = int(np.argmax(lengths))
+    if lengths[k] < 0:
+        return 0, n
+    return int(starts[k]), int(ends[k])
+
+
+# ----------------------------------------------------------------------
+# Rete
+# ----------------------------------------------------------------------
+@dataclass
+class Descent:
+    edges: List[int]
+    nodes: List[int]
+    length_m: float
+    drop_m: float
+    pistes: List[int]
+
+
+class PisteNetwork:
+    """
+    Grafo orientato di piste e impianti.
+
+    net = PisteNetwork.build(pistes, lifts, elevation_fn=fetch_elevations)
+    d = net.longest_descent_from_lift(3)
+    runs = net.reachable_from(lat, lon)
+    """
+
+    def __init__(self) -> None:
+        self.pistes = PisteSet.empty()
+        self.lifts = PisteSet.empty()
+        # nodi
+        self.node_osm = np.zeros(0, dtype=np.int64)
+        self.node_xy = np.zeros((0, 2))
+        self.node_elev = np.zeros(0)
+        # archi
+        self.edge_u = np.zeros(0, dtype=np.int64)
+        self.edge_v = np.zeros(0, dtype=np.int64)
+        self.edge_kind = np.zeros(0, dtype=np.int8)
+        self.edge_line = np.zeros(0, dtype=np.int64)  # indice in pistes / lifts
+        self.edge_length_m = np.zeros(0)
+        self.edge_drop_m = np.zeros(0)
+        self.edge_difficulty: List[Optional[str]] = []
+        # adiacenza (CSR sugli archi uscenti)
+        self._out_start = np.zeros(1, dtype=np.int64)
+        self._out_edges = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return int(self.edge_u.size)
+
+    # ---------------- costruzione ----------------
+    @classmethod
+    def build(
+        cls,
+        pistes: PisteSet,
+        lifts: Optional[PisteSet] = None,
+        elevation_fn: Optional[ElevationFn] = None,
+    ) -> "PisteNetwork":
+        net = cls()
+        lifts = lifts if lifts is not None else PisteSet.empty()
+        net.pistes, net.lifts = pistes, lifts
+
+        lines = PisteSet.concat([pistes, lifts])
+        n_p = len(pistes)
+        if len(lines) == 0:
+            return net
+
+        nid = lines.node_ids
+        n = nid.size
+        line_of = np.repeat(np.arange(len(lines)), np.diff(lines.offsets))
+
+        # nodo di rete: condiviso da più linee (o più volte dalla stessa) o estremo
+        _, inv, counts = np.unique(nid, return_inverse=True, return_counts=True)
+        is_break = counts[inv] > 1
+        is_break[lines.offsets[:-1]] = True
+        is_break[lines.offsets[1:] - 1] = True
+
+        bpos = np.nonzero(is_break)[0]
+        same_line = line_of[bpos[:-1]] == line_of[bpos[1:]]
+        ea = bpos[:-1][same_line]
+        eb = bpos[1:][same_line]
+
+        # lunghezze: cumulata dei segmenti interni alle linee
+        seg = segment_lengths_m(lines.coords[:, 0], lines.coords[:, 1])
+        if seg.size:
+            seg[line_of[:-1] != line_of[1:]] = 0.0
+        cum = np.concatenate([[0.0], np.cumsum(seg)])
+
+        node_of_vertex = np.full(n, -1, dtype=np.int64)
+        node_ids_b, node_idx = np.unique(nid[bpos], return_inverse=True)
+        node_of_vertex[bpos] = node_idx
+        first_vertex = np.zeros(node_ids_b.size, dtype=np.int64)
+        first_vertex[node_idx[::-1]] = bpos[::-1]
+
+        net.node_osm = node_ids_b
+        net.node_xy = lines.coords[first_vertex]
+        if elevation_fn is not None and node_ids_b.size:
+            try:
+                net.node_elev = np.asarray(
+                    elevation_fn(net.node_xy[:, 0], net.node_xy[:, 1]), dtype=float
+                )
+            except Exception:
+                net.node_elev = np.full(node_ids_b.size, np.nan)
+        else:
+            net.node_elev = np.full(node_ids_b.size, np.nan)
+
+        u = node_of_vertex[ea]
+        v = node_of_vertex[eb]
+        line = line_of[ea]
+        kind = np.where(line < n_p, EDGE_PISTE, EDGE_LIFT).astype(np.int8)
+
+        # orientamento con le quote: piste in discesa, impianti in salita
+        eu, ev = net.node_elev[u], net.node_elev[v]
+        known = np.isfinite(eu) & np.isfinite(ev)
+        flip = known & (((kind == EDGE_PISTE) & (eu < ev)) | ((kind == EDGE_LIFT) & (eu > ev)))
+        u, v = np.where(flip, v, u), np.where(flip, u, v)
+
+        net.edge_u = u
+        net.edge_v = v
+        net.edge_kind = kind
+        net.edge_line = np.where(line < n_p, line, line - n_p)
+        net.edge_length_m = cum[eb] - cum[ea]
+        net.edge_drop_m = net.node_elev[u] - net.node_elev[v]
+        net.edge_difficulty = [
+            lines.tags[int(ln)].get("piste:difficulty") if k == EDGE_PISTE else None
+            for ln, k in zip(line, kind)
+        ]
+
+        order = np.argsort(u, kind="stable")
+        net._out_edges = order
+        net._out_start = np.searchsorted(u[order], np.arange(node_ids_b.size + 1))
+        return net
+
+    # ---------------- accesso ----------------
+    def out_edges(self, node: int, kind: Optional[int] = None) -> np.ndarray:
+        e = self._out_edges[self._out_start[node] : self._out_start[node + 1]]
+        if kind is not None:
+            e = e[self.edge_kind[e] == kind]
+        return e
+
+    def nearest_node(self, lat: float, lon: float) -> Optional[int]:
+        if self.node_xy.shape[0] == 0:
+            return None
+        dlat = self.node_xy[:, 0] - lat
+        dlon = (self.node_xy[:, 1] - lon) * np.cos(np.radians(lat))
+        return int(np.argmin(dlat * dlat + dlon * dlon))
+
+    def line_edges(self, line: int, kind: int = EDGE_PISTE) -> np.ndarray:
+        return np.nonzero((self.edge_line == line) & (self.edge_kind == kind))[0]
+
+    # ---------------- query ----------------
+    def lift_top(self, lift: int) -> Optional[int]:
+        """Nodo di arrivo dell'impianto (il più alto, o l'ultimo disegnato)."""
+        edges = self.line_edges(lift, EDGE_LIFT)
+        if edges.size == 0:
+            return None
+        nodes = np.unique(np.concatenate([self.edge_u[edges], self.edge_v[edges]]))
+        elev = self.node_elev[nodes]
+        if np.isfinite(elev).any():
+            return int(nodes[np.nanargmax(elev)])
+        # senza quote: nodo che non è origine di nessun arco dell'impianto
+        tops = np.setdiff1d(self.edge_v[edges], self.edge_u[edges])
+        return int(tops[0]) if tops.size else int(self.edge_v[edges[-1]])
+
+    def longest_descent(self, start: int) -> Descent:
+        """Percorso in discesa (solo archi pista) più lungo in metri da start."""
+        best: Dict[int, Tuple[float, int]] = {}
+        on_stack: Set[int] = {start}
+        stack = [(start, iter(self.out_edges(start, EDGE_PISTE)))]
+
+        while stack:
+            node, it = stack[-1]
+            pushed = False
+            for e in it:
+                v = int(self.edge_v[e])
+                if v in best or v in on_stack:
+                    continue  # già risolto, o ciclo
+                stack.append((v, iter(self.out_edges(v, EDGE_PISTE))))
+                on_stack.add(v)
+                pushed = True
+                break
+            if pushed:
+                continue
+
+            b_len, b_edge = 0.0, -1
+            for e in self.out_edges(node, EDGE_PISTE):
+                sub = best.get(int(self.edge_v[e]))
+                if sub is None:
+                    continue
+                cand = float(self.edge_length_m[e]) + sub[0]
+                if cand > b_len:
+                    b_len, b_edge = cand, int(e)
+            best[node] = (b_len, b_edge)
+            stack.pop()
+            on_stack.discard(node)
+
+        edges: List[int] = []
+        nodes = [start]
+        node = start
+        while best.get(node, (0.0, -1))[1] >= 0 and len(edges) <= len(self):
+            e = best[node][1]
+            edges.append(e)
+            node = int(self.edge_v[e])
+            nodes.append(node)
+
+        drop = float(np.nansum(self.edge_drop_m[edges])) if edges else 0.0
+        pistes = list(dict.fromkeys(int(self.edge_line[e]) for e in edges))
+        return Descent(edges, nodes, best.get(start, (0.0, -1))[0], drop, pistes)
+
+    def longest_descent_from_lift(self, lift: int) -> Optional[Descent]:
+        top = self.lift_top(lift)
+        if top is None:
+            return None
+        return self.longest_descent(top)
+
+    def reachable_from(self, lat: float, lon: float) -> List[int]:
+        """Indici delle piste raggiungibili dal punto (scendendo e risalendo)."""
+        start = self.nearest_node(lat, lon)
+        if start is None:
+            return []
+        seen = np.zeros(self.node_xy.shape[0], dtype=bool)
+        seen[start] = True
+        frontier = [start]
+        pistes: Set[int] = set()
+        while frontier:
+            nxt: List[int] = []
+            for node in frontier:
+                for e in self.out_edges(node):
+                    if self.edge_kind[e] == EDGE_PISTE:
+                        pistes.add(int(self.edge_line[e]))
+                    v = int(self.edge_v[e])
+                    if not seen[v]:
+                        seen[v] = True
+                        nxt.append(v)
+            frontier = nxt
+        return sorted(pistes)
+
+    def run_stats(self, piste: int) -> Dict[str, float]:
+        """Lunghezza, dislivello e quote di una pista (dai suoi archi)."""
+        edges = self.line_edges(piste, EDGE_PISTE)
+        if edges.size == 0:
+            return {"length_m": 0.0, "vert_m": 0.0, "min_elev": 0.0, "max_elev": 0.0}
+        nodes = np.unique(np.concatenate([self.edge_u[edges], self.edge_v[edges]]))
+        elev = self.node_elev[nodes]
+        elev = elev[np.isfinite(elev)]
+        min_e = float(elev.min()) if elev.size else 0.0
+        max_e = float(elev.max()) if elev.size else 0.0
+        return {
+            "length_m": float(self.edge_length_m[edges].sum()),
+            "vert_m": max_e - min_e,
+            "min_elev": min_e,
+            "max_elev": max_e,
+        }
+
+    def elevation_range_by_line(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(quota min, quota max) dei nodi di ogni pista, NaN se ignote."""
+        n_p = len(self.pistes)
+        lo = np.full(n_p, np.inf)
+        hi = np.full(n_p, -np.inf)
+        e = np.nonzero(self.edge_kind == EDGE_PISTE)[0]
+        for ends in (self.edge_u[e], self.edge_v[e]):
+            z = self.node_elev[ends]
+            ok = np.isfinite(z)
+            np.minimum.at(lo, self.edge_line[e][ok], z[ok])
+            np.maximum.at(hi, self.edge_line[e][ok], z[ok])
+        lo[~np.isfinite(lo)] = np.nan
+        hi[~np.isfinite(hi)] = np.nan
+        return lo, hi
+
+    def stats_by_difficulty(self) -> Dict[str, Dict[str, float]]:
+        """km di piste e dislivello cumulato per difficoltà OSM."""
+        out: Dict[str, Dict[str, float]] = {}
+        for e in np.nonzero(self.edge_kind == EDGE_PISTE)[0]:
+            d = self.edge_difficulty[e] or "unknown"
+            row = out.setdefault(d, {"length_km": 0.0, "drop_m": 0.0})
+            row["length_km"] += float(self.edge_length_m[e]) / 1000.0
+            drop = float(self.edge_drop_m[e])
+            if np.isfinite(drop) and drop > 0:
+                row["drop_m"] += drop
+        return out
@@ -0,0 +1,311 @@
+# core/piste_store.py
+# Store locale delle piste a tile (slippy map) per Telemark · Pro Wax & Tune
+#
+# - Import una tantum di una regione (es. Valle d'Aosta + Vallese) da un
+#   dump Overpass JSON o da una query Overpass per bounding box
+#   (client condiviso core.overpass: mirror con failover)
+# - File SQLite compatto:
+#     · pistes: una riga per pista o impianto (kind), coordinate int32
+#       (1e-7 gradi, la precisione nativa OSM) e id nodo int64 come blob
+#     · tile_pistes: tile (z, x, y) → piste il cui bbox la tocca
+#     · coverage: tile interamente importate (anche vuote) → sappiamo se
+#       una zona è coperta dallo store o se serve ancora Overpass
+# - Lettura: solo le tile che coprono la vista, connessione read-only
+#   (nessun lock, adatta a molti utenti concorrenti)
+# - Percorso configurabile con TELEMARK_PISTE_STORE
+#   (default ./data/piste_tiles.sqlite)
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from core import overpass
+from core.pistes import PisteSet, parse_overpass_resort
+
+STORE_PATH = Path(os.environ.get("TELEMARK_PISTE_STORE", "data/piste_tiles.sqlite"))
+
+# z=12 → tile di ~6.9 km di lato alle nostre latitudini
+TILE_ZOOM = 12
+COORD_SCALE = 1e7
+
+BBox = Tuple[float, float, float, float]  # lat_min, lon_min, lat_max, lon_max
+
+# regioni predefinite per l'import
+REGIONS: Dict[str, BBox] = {
+    "valle_aosta": (45.46, 6.80, 45.99, 7.94),
+    "valais": (45.85, 6.77, 46.66, 8.48),
+}
+
+
+# ----------------------------------------------------------------------
+# Geometria tile
+# ----------------------------------------------------------------------
+def lonlat_to_tile(lat: float, lon: float, z: int = TILE_ZOOM) -> Tuple[int, int]:
+    n = 1 << z
+    lat = max(min(float(lat), 85.05112878), -85.05112878)
+    x = int((float(lon) + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_for_bbox(bbox: BBox, z: int = TILE_ZOOM) -> List[Tuple[int, int]]:
+    lat_min, lon_min, lat_max, lon_max = bbox
+    x0, y0 = lonlat_to_tile(lat_max, lon_min, z)  # y cresce verso sud
+    x1, y1 = lonlat_to_tile(lat_min, lon_max, z)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def tile_bbox(x: int, y: int, z: int = TILE_ZOOM) -> BBox:
+    n = 1 << z
+
+    def _lat(yy: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * yy / n))))
+
+    return (_lat(y + 1), x / n * 360.0 - 180.0, _lat(y), (x + 1) / n * 360.0 - 180.0)
+
+
+def tiles_inside_bbox(bbox: BBox, z: int = TILE_ZOOM) -> List[Tuple[int, int]]:
+    """Tile interamente contenute nel bbox (le sole che un import copre davvero)."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    out = []
+    for x, y in tiles_for_bbox(bbox, z):
+        t = tile_bbox(x, y, z)
+        if t[0] >= lat_min and t[1] >= lon_min and t[2] <= lat_max and t[3] <= lon_max:
+            out.append((x, y))
+    return out
+
+
+def bbox_around(lat: float, lon: float, radius_km: float) -> BBox:
+    dlat = radius_km / 111.32
+    dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 1e-6))
+    return (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+
+
+# ----------------------------------------------------------------------
+# SQLite
+# ----------------------------------------------------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pistes (
+    id INTEGER PRIMARY KEY,
+    piste_key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL DEFAULT 'piste',
+    name TEXT,
+    tags TEXT NOT NULL,
+    coords BLOB NOT NULL,
+    node_ids BLOB NOT NULL,
+    lat_min REAL, lon_min REAL, lat_max REAL, lon_max REAL
+);
+CREATE TABLE IF NOT EXISTS tile_pistes (
+    z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,
+    piste_id INTEGER NOT NULL,
+    PRIMARY KEY (z, x, y, piste_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,
+    PRIMARY KEY (z, x, y)
+) WITHOUT ROWID;
+"""
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(_SCHEMA)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(pistes)")}
+    if "kind" not in cols:
+        # store creati prima degli impianti: tutte piste
+        conn.execute("ALTER TABLE pistes ADD COLUMN kind TEXT NOT NULL DEFAULT 'piste'")
+
+
+def _connect_ro(path: Path) -> Optional[sqlite3.Connection]:
+    if not path.exists():
+        return None
+    try:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    except Exception:
+        return None
+
+
+# ----------------------------------------------------------------------
+# Import
+# ----------------------------------------------------------------------
+def fetch_region_dump(bbox: BBox, timeout: int = 180) -> Dict[str, Any]:
+    """
+    Scarica da Overpass piste downhill e impianti di un bounding box.
+    Solleva OverpassError se la risposta è parziale: le tile non vanno
+    marcate come coperte con dati incompleti.
+    """
+    s, w, n, e = bbox
+    q = f"""
+    [out:json][timeout:{timeout}];
+    (
+      way["piste:type"="downhill"]({s},{w},{n},{e});
+      relation["piste:type"="downhill"]({s},{w},{n},{e});
+      way["aerialway"]({s},{w},{n},{e});
+    );
+    (._;>;);
+    out body;
+    """
+    js = overpass.query(q, timeout=timeout + 10)
+    if overpass.is_partial(js):
+        raise overpass.OverpassError(f"risposta parziale: {js.get('remark')}")
+    return js
+
+
+def import_pistes(
+    pistes: PisteSet,
+    regions: Iterable[BBox],
+    path: Union[str, Path, None] = None,
+    z: int = TILE_ZOOM,
+    kind: str = "piste",
+) -> int:
+    """
+    Scrive le piste (o gli impianti, kind="lift") nello store e marca come
+    coperte le tile delle regioni.
+    Le piste già presenti (stesso osm_id e stessi nodi estremi) vengono
+    sostituite. Ritorna il numero di piste scritte.
+    """
+    path = Path(path) if path is not None else STORE_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    try:
+        _ensure_schema(conn)
+        bboxes = pistes.bboxes()
+        with conn:
+            for i in range(len(pistes)):
+                xy = pistes.coords_of(i)
+                nid = pistes.node_ids[pistes.offsets[i] : pistes.offsets[i + 1]]
+                key = pistes.key_of(i)
+                row = conn.execute("SELECT id FROM pistes WHERE piste_key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM tile_pistes WHERE piste_id = ?", row)
+                    conn.execute("DELETE FROM pistes WHERE id = ?", row)
+
+                cur = conn.execute(
+                    "INSERT INTO pistes (piste_key, kind, name, tags, coords, node_ids, "
+                    "lat_min, lon_min, lat_max, lon_max) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        kind,
+                        pistes.names[i],
+                        json.dumps(pistes.tags[i], ensure_ascii=False),
+                        np.round(xy * COORD_SCALE).astype("<i4").tobytes(),
+                        nid.astype("<i8").tobytes(),
+                        *(float(v) for v in bboxes[i]),
+                    ),
+                )
+                pid = cur.lastrowid
+                conn.executemany(
+                    "INSERT OR IGNORE INTO tile_pistes (z, x, y, piste_id) VALUES (?, ?, ?, ?)",
+                    [(z, x, y, pid) for x, y in tiles_for_bbox(tuple(bboxes[i]), z)],
+                )
+
+            for bbox in regions:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO coverage (z, x, y) VALUES (?, ?, ?)",
+                    [(z, x, y) for x, y in tiles_inside_bbox(bbox, z)],
+                )
+        return len(pistes)
+    finally:
+        conn.close()
+
+
+def import_overpass_dump(
+    js: Dict[str, Any],
+    bbox: BBox,
+    path: Union[str, Path, None] = None,
+) -> int:
+    """Importa piste e impianti di un dump Overpass JSON relativo a bbox."""
+    pistes, lifts = parse_overpass_resort(js)
+    import_pistes(lifts, [], path, kind="lift")
+    return import_pistes(pistes, [bbox], path)
+
+
+def import_region(bbox: BBox, path: Union[str, Path, None] = None) -> int:
+    """Scarica da Overpass e importa una regione."""
+    return import_overpass_dump(fetch_region_dump(bbox), bbox, path)
+
+
+# ----------------------------------------------------------------------
+# Lettura
+# ----------------------------------------------------------------------
+def _rows_to_set(rows: List[Tuple[Any, ...]]) -> PisteSet:
+    if not rows:
+        return PisteSet.empty()
+    coords = [np.frombuffer(r[3], dtype="<i4").reshape(-1, 2) for r in rows]
+    node_ids = [np.frombuffer(r[4], dtype="<i8") for r in rows]
+    lens = np.array([c.shape[0] for c in coords], dtype=np.int64)
+    return PisteSet(
+        coords=np.concatenate(coords).astype(np.float64) / COORD_SCALE,
+        node_ids=np.concatenate(node_ids).astype(np.int64),
+        offsets=np.concatenate([[0], np.cumsum(lens)]).astype(np.int64),
+        names=[r[1] for r in rows],
+        tags=[json.loads(r[2]) for r in rows],
+        osm_ids=[str(r[0]).split(":", 1)[0] for r in rows],
+    )
+
+
+def load_pistes(
+    lat: float,
+    lon: float,
+    radius_km: float = 5.0,
+    path: Union[str, Path, None] = None,
+    z: int = TILE_ZOOM,
+    kind: str = "piste",
+) -> Optional[PisteSet]:
+    """
+    Piste (o impianti, kind="lift") il cui bbox interseca la vista
+    (centro + raggio), lette dalle sole tile che la coprono. None se lo
+    store manca o non copre tutta la vista (il chiamante ripiega su Overpass).
+    """
+    path = Path(path) if path is not None else STORE_PATH
+    conn = _connect_ro(path)
+    if conn is None:
+        return None
+
+    bbox = bbox_around(lat, lon, radius_km)
+    tiles = tiles_for_bbox(bbox, z)
+    try:
+        xs = [t[0] for t in tiles]
+        ys = [t[1] for t in tiles]
+        covered = conn.execute(
+            "SELECT x, y FROM coverage WHERE z = ? AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?",
+            (z, min(xs), max(xs), min(ys), max(ys)),
+        ).fetchall()
+        if len(set(covered)) < len(tiles):
+            return None
+
+        rows = conn.execute(
+            "SELECT DISTINCT p.piste_key, p.name, p.tags, p.coords, p.node_ids, p.id "
+            "FROM tile_pistes t JOIN pistes p ON p.id = t.piste_id "
+            "WHERE t.z = ? AND t.x BETWEEN ? AND ? AND t.y BETWEEN ? AND ? "
+            "AND p.kind = ? "
+            "AND p.lat_max >= ? AND p.lat_min <= ? AND p.lon_max >= ? AND p.lon_min <= ? "
+            "ORDER BY p.id",
+            (z, min(xs), max(xs), min(ys), max(ys), kind, bbox[0], bbox[2], bbox[1], bbox[3]),
+        ).fetchall()
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+    return _rows_to_set(rows)
+
+
+def load_resort(
+    lat: float,
+    lon: float,
+    radius_km: float = 5.0,
+    path: Union[str, Path, None] = None,
+) -> Optional[Tuple[PisteSet, PisteSet]]:
+    """(piste, impianti) della vista dallo store, None se non coperta."""
+    pistes = load_pistes(lat, lon, radius_km, path)
+    if pistes is None:
+        return None
+    lifts = load_pistes(lat, lon, radius_km, path, kind="lift")
+    return pistes, lifts if lifts is not None else PisteSet.empty()
@@ -0,0 +1,479 @@
+# core/pistes.py
+# Piste da sci (e impianti) in forma colonnare + parser risposte Overpass
+#
+# - PisteSet: coordinate di tutte le piste in array NumPy piatti con
+#   offset per pista (niente liste di tuple per vertice)
+# - Parser lineare: tabelle nodi/way indicizzate per id, ricerca binaria
+#   vettoriale sugli id nodo, relation ricucite in catene continue
+# - Semplificazione Douglas–Peucker per il rendering (livello di dettaglio
+#   legato allo zoom), con cache per pista e tolleranza
+# - Nessuna dipendenza da Streamlit: usato da core.maps, dallo store a
+#   tile locale e dagli script di import/benchmark
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+
+# ----------------------------------------------------------------------
+# Insieme piste in forma colonnare
+# ----------------------------------------------------------------------
+@dataclass
+class PisteSet:
+    """
+    Piste di un comprensorio con coordinate in array piatti:
+      - coords: (N, 2) lat, lon di tutti i vertici, pista dopo pista
+      - node_ids: (N,) id OSM del nodo di ogni vertice
+      - offsets: (M+1,) → pista i = coords[offsets[i]:offsets[i+1]]
+      - names / tags / osm_ids: uno per pista ("way/123", "relation/45")
+    """
+    coords: np.ndarray
+    node_ids: np.ndarray
+    offsets: np.ndarray
+    names: List[Optional[str]]
+    tags: List[Dict[str, str]]
+    osm_ids: List[str]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def coords_of(self, i: int) -> np.ndarray:
+        """Vista (n, 2) lat/lon della pista i (nessuna copia)."""
+        return self.coords[self.offsets[i] : self.offsets[i + 1]]
+
+    def key_of(self, i: int) -> str:
+        """
+        Chiave stabile della pista i: osm_id:nodo_iniziale:nodo_finale
+        (una relation può produrre più catene con lo stesso osm_id).
+        """
+        a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+        return f"{self.osm_ids[i]}:{int(self.node_ids[a])}:{int(self.node_ids[b - 1])}"
+
+    def simplified(self, tol_m: float) -> "PisteSet":
+        """
+        Copia con ogni pista semplificata (Douglas–Peucker, tolleranza in
+        metri). Le maschere dei vertici tenuti sono in cache per
+        (pista, tolleranza), quindi i rerun non ricalcolano nulla.
+        """
+        if len(self) == 0 or tol_m <= 0:
+            return self
+        lat0 = float(np.mean(self.coords[:, 0]))
+        ky = math.radians(1.0) * EARTH_RADIUS_M
+        kx = ky * math.cos(math.radians(lat0))
+
+        masks = []
+        for i in range(len(self)):
+            key = (self.key_of(i), int(self.offsets[i + 1] - self.offsets[i]), float(tol_m))
+            mask = _simplify_cache_get(key)
+            if mask is None:
+                xy = self.coords_of(i) * (ky, kx)
+                mask = douglas_peucker_mask(xy, tol_m)
+                _simplify_cache_put(key, mask)
+            masks.append(mask)
+
+        keep = np.concatenate(masks)
+        lens = np.array([int(m.sum()) for m in masks], dtype=np.int64)
+        return PisteSet(
+            coords=self.coords[keep],
+            node_ids=self.node_ids[keep],
+            offsets=np.concatenate([[0], np.cumsum(lens)]).astype(np.int64),
+            names=self.names,
+            tags=self.tags,
+            osm_ids=self.osm_ids,
+        )
+
+    def polylines(self) -> List[List[Tuple[float, float]]]:
+        """Piste come liste di tuple (lat, lon), formato folium."""
+        return [
+            [(float(la), float(lo)) for la, lo in self.coords_of(i)]
+            for i in range(len(self))
+        ]
+
+    def bboxes(self) -> np.ndarray:
+        """(M, 4) lat_min, lon_min, lat_max, lon_max per pista."""
+        if len(self) == 0:
+            return np.zeros((0, 4), dtype=np.float64)
+        starts = self.offsets[:-1]
+        lo = np.minimum.reduceat(self.coords, starts, axis=0)
+        hi = np.maximum.reduceat(self.coords, starts, axis=0)
+        return np.hstack([lo, hi])
+
+    def subset(self, indices: Sequence[int]) -> "PisteSet":
+        """Nuovo PisteSet con le sole piste indicate (nell'ordine dato)."""
+        idx = np.asarray(indices, dtype=np.int64)
+        if idx.size == 0:
+            return PisteSet.empty()
+        lens = self.offsets[idx + 1] - self.offsets[idx]
+        flat = np.repeat(self.offsets[idx] - np.cumsum(lens) + lens, lens) + np.arange(
+            int(lens.sum())
+        )
+        return PisteSet(
+            coords=self.coords[flat],
+            node_ids=self.node_ids[flat],
+            offsets=np.concatenate([[0], np.cumsum(lens)]).astype(np.int64),
+            names=[self.names[i] for i in idx],
+            tags=[self.tags[i] for i in idx],
+            osm_ids=[self.osm_ids[i] for i in idx],
+        )
+
+    @classmethod
+    def concat(cls, sets: Sequence["PisteSet"]) -> "PisteSet":
+        sets = [p for p in sets if len(p)]
+        if not sets:
+            return cls.empty()
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for p in sets:
+            offsets.append(p.offsets[1:] + base)
+            base += int(p.offsets[-1])
+        return cls(
+            coords=np.concatenate([p.coords for p in sets]),
+            node_ids=np.concatenate([p.node_ids for p in sets]),
+            offsets=np.concatenate(offsets),
+            names=[n for p in sets for n in p.names],
+            tags=[t for p in sets for t in p.tags],
+            osm_ids=[o for p in sets for o in p.osm_ids],
+        )
+
+    @classmethod
+    def empty(cls) -> "PisteSet":
+        return cls(
+            coords=np.zeros((0, 2), dtype=np.float64),
+            node_ids=np.zeros(0, dtype=np.int64),
+            offsets=np.zeros(1, dtype=np.int64),
+            names=[],
+            tags=[],
+            osm_ids=[],
+        )
+
+
+# ----------------------------------------------------------------------
+# Semplificazione (Douglas–Peucker)
+# ----------------------------------------------------------------------
+SIMPLIFY_CACHE_SIZE = 20000
+
+_SIMPLIFY_CACHE: "OrderedDict[Tuple[str, int, float], np.ndarray]" = OrderedDict()
+_SIMPLIFY_LOCK = threading.Lock()
+
+
+def _simplify_cache_get(key: Tuple[str, int, float]) -> Optional[np.ndarray]:
+    with _SIMPLIFY_LOCK:
+        mask = _SIMPLIFY_CACHE.get(key)
+        if mask is not None:
+            _SIMPLIFY_CACHE.move_to_end(key)
+        return mask
+
+
+def _simplify_cache_put(key: Tuple[str, int, float], mask: np.ndarray) -> None:
+    with _SIMPLIFY_LOCK:
+        _SIMPLIFY_CACHE[key] = mask
+        while len(_SIMPLIFY_CACHE) > SIMPLIFY_CACHE_SIZE:
+            _SIMPLIFY_CACHE.popitem(last=False)
+
+
+def douglas_peucker_mask(xy: np.ndarray, tol: float) -> np.ndarray:
+    """
+    Maschera dei vertici da tenere (Douglas–Peucker iterativo).
+    xy: (n, 2) coordinate metriche; tol: distanza massima ammessa.
+    Gli estremi restano sempre.
+    """
+    n = xy.shape[0]
+    keep = np.zeros(n, dtype=bool)
+    if n <= 2:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        p = xy[a + 1 : b] - xy[a]
+        d = xy[b] - xy[a]
+        seg = math.hypot(d[0], d[1])
+        if seg > 0:
+            dist = np.abs(p[:, 0] * d[1] - p[:, 1] * d[0]) / seg
+        else:
+            dist = np.hypot(p[:, 0], p[:, 1])
+        k = int(np.argmax(dist))
+        if dist[k] > tol:
+            m = a + 1 + k
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return keep
+
+
+def lod_zoom(zoom: float) -> int:
+    """Zoom Leaflet arrotondato all'intero: livelli di dettaglio discreti."""
+    return int(round(float(zoom)))
+
+
+def lod_tolerance_m(zoom: float, lat: float, px: float = 0.75) -> float:
+    """
+    Tolleranza di semplificazione per uno zoom Leaflet: px pixel a schermo
+    (metri per pixel Web Mercator). Zoom arrotondato all'intero, così la
+    cache per tolleranza resta piccola.
+    """
+    z = lod_zoom(zoom)
+    m_per_px = 156543.03392 * math.cos(math.radians(lat)) / (1 << max(z, 0))
+    return round(max(m_per_px * px, 0.5), 2)
+
+
+def _piste_name(tags: Optional[Dict[str, str]]) -> Optional[str]:
+    if not tags:
+        return None
+    for k in ("name", "piste:name", "ref"):
+        v = tags.get(k)
+        if v:
+            return str(v).strip()
+    return None
+
+
+# ----------------------------------------------------------------------
+# Parser Overpass (tempo lineare)
+# ----------------------------------------------------------------------
+def _stitch_ways(
+    members: List[int],
+    first_node: np.ndarray,
+    last_node: np.ndarray,
+) -> List[List[Tuple[int, bool]]]:
+    """
+    Ordina e orienta le way di una relation in catene continue.
+    Ritorna una lista di catene, ciascuna lista di (indice way, invertita).
+    Le way che non si collegano producono catene separate (niente "salti").
+    """
+    ends: Dict[int, List[int]] = {}
+    for w in members:
+        ends.setdefault(int(first_node[w]), []).append(w)
+        ends.setdefault(int(last_node[w]), []).append(w)
+
+    remaining = dict.fromkeys(members)  # ordinato come nella relation
+    chains: List[List[Tuple[int, bool]]] = []
+
+    def _take(node: int) -> Optional[int]:
+        for w in ends.get(node, ()):
+            if w in remaining:
+                del remaining[w]
+                return w
+        return None
+
+    while remaining:
+        start = next(iter(remaining))
+        del remaining[start]
+        chain = deque([(start, False)])
+        head = int(first_node[start])
+        tail = int(last_node[start])
+
+        # estendo in coda
+        while True:
+            w = _take(tail)
+            if w is None:
+                break
+            if int(first_node[w]) == tail:
+                chain.append((w, False))
+                tail = int(last_node[w])
+            else:
+                chain.append((w, True))
+                tail = int(first_node[w])
+
+        # estendo in testa
+        while True:
+            w = _take(head)
+            if w is None:
+                break
+            if int(last_node[w]) == head:
+                chain.appendleft((w, False))
+                head = int(first_node[w])
+            else:
+                chain.appendleft((w, True))
+                head = int(last_node[w])
+
+        chains.append(list(chain))
+
+    return chains
+
+
+# impianti di risalita (aerialway=*) trattati come archi di salita
+LIFT_TYPES = frozenset(
+    {
+        "cable_car",
+        "gondola",
+        "mixed_lift",
+        "chair_lift",
+        "drag_lift",
+        "t-bar",
+        "j-bar",
+        "platter",
+        "rope_tow",
+        "magic_carpet",
+    }
+)
+
+
+def _is_downhill(tags: Dict[str, str]) -> bool:
+    return tags.get("piste:type") == "downhill"
+
+
+def _is_lift(tags: Dict[str, str]) -> bool:
+    return tags.get("aerialway") in LIFT_TYPES
+
+
+def parse_overpass_resort(js: Dict[str, Any]) -> Tuple[PisteSet, PisteSet]:
+    """
+    Converte la risposta Overpass (out body con nodi ricorsivi) in
+    (piste, impianti), entrambi PisteSet.
+
+    - tabella nodi: id ordinati + ricerca binaria vettoriale
+    - tabella way: coordinate piatte con offset, indice id → way in dict
+    - relation: membri risolti in O(1) e ricuciti in ordine (_stitch_ways)
+    Complessità lineare (a meno del sort dei nodi) nel numero di elementi.
+    """
+    elements = js.get("elements", []) or []
+
+    n_ids: List[int] = []
+    n_lat: List[float] = []
+    n_lon: List[float] = []
+    way_ids: List[int] = []
+    way_refs: List[List[int]] = []
+    way_tags: List[Dict[str, str]] = []
+    relations: List[Dict[str, Any]] = []
+
+    for el in elements:
+        t = el.get("type")
+        if t == "node":
+            n_ids.append(el["id"])
+            n_lat.append(el.get("lat", np.nan))
+            n_lon.append(el.get("lon", np.nan))
+        elif t == "way":
+            way_ids.append(el["id"])
+            way_refs.append(el.get("nodes") or [])
+            way_tags.append(el.get("tags") or {})
+        elif t == "relation":
+            relations.append(el)
+
+    if not way_ids:
+        return PisteSet.empty(), PisteSet.empty()
+
+    # ---- nodi ----
+    node_ids = np.asarray(n_ids, dtype=np.int64)
+    order = np.argsort(node_ids, kind="stable")
+    sorted_ids = node_ids[order]
+    node_xy = np.column_stack(
+        [np.asarray(n_lat, dtype=np.float64), np.asarray(n_lon, dtype=np.float64)]
+    ).reshape(-1, 2)
+
+    # ---- way: riferimenti piatti → righe nodo ----
+    lengths = np.fromiter((len(r) for r in way_refs), dtype=np.int64, count=len(way_refs))
+    flat_refs = np.fromiter(
+        (nid for r in way_refs for nid in r), dtype=np.int64, count=int(lengths.sum())
+    )
+    way_of_ref = np.repeat(np.arange(len(way_ids)), lengths)
+
+    if sorted_ids.size:
+        pos = np.clip(np.searchsorted(sorted_ids, flat_refs), 0, sorted_ids.size - 1)
+        found = sorted_ids[pos] == flat_refs
+    else:
+        pos = np.zeros(flat_refs.size, dtype=np.int64)
+        found = np.zeros(flat_refs.size, dtype=bool)
+
+    way_xy = node_xy[order[pos[found]]]
+    way_nid = flat_refs[found]
+    counts = np.bincount(way_of_ref[found], minlength=len(way_ids))
+    way_off = np.concatenate([[0], np.cumsum(counts)])
+
+    has_nodes = counts > 0
+    first_node = np.full(len(way_ids), -1, dtype=np.int64)
+    last_node = np.full(len(way_ids), -1, dtype=np.int64)
+    first_node[has_nodes] = way_nid[way_off[:-1][has_nodes]]
+    last_node[has_nodes] = way_nid[way_off[1:][has_nodes] - 1]
+
+    way_index = {wid: w for w, wid in enumerate(way_ids)}
+
+    # ---- assemblaggio ----
+    def _assemble(way_ok, rel_ok) -> PisteSet:
+        pieces_xy: List[np.ndarray] = []
+        pieces_nid: List[np.ndarray] = []
+        offsets = [0]
+        names: List[Optional[str]] = []
+        tags_out: List[Dict[str, str]] = []
+        osm_ids: List[str] = []
+
+        def _emit(segments: List[Tuple[int, bool]], tags: Dict[str, str], osm_id: str) -> None:
+            xy_parts: List[np.ndarray] = []
+            nid_parts: List[np.ndarray] = []
+            prev_last: Optional[int] = None
+            for w, rev in segments:
+                sl = slice(way_off[w], way_off[w + 1])
+                xy = way_xy[sl]
+                nid = way_nid[sl]
+                if rev:
+                    xy = xy[::-1]
+                    nid = nid[::-1]
+                # nodo di giunzione condiviso: non lo ripeto
+                if prev_last is not None and nid.size and int(nid[0]) == prev_last:
+                    xy = xy[1:]
+                    nid = nid[1:]
+                if nid.size:
+                    prev_last = int(nid[-1])
+                xy_parts.append(xy)
+                nid_parts.append(nid)
+
+            n = int(sum(p.shape[0] for p in xy_parts))
+            if n < 2:
+                return
+            pieces_xy.extend(xy_parts)
+            pieces_nid.extend(nid_parts)
+            offsets.append(offsets[-1] + n)
+            names.append(_piste_name(tags))
+            tags_out.append(dict(tags))
+            osm_ids.append(osm_id)
+
+        for w, wid in enumerate(way_ids):
+            if has_nodes[w] and way_ok(way_tags[w]):
+                _emit([(w, False)], way_tags[w], f"way/{wid}")
+
+        for rel in relations:
+            tags = rel.get("tags") or {}
+            if not rel_ok(tags):
+                continue
+            members = [
+                way_index[m.get("ref")]
+                for m in rel.get("members", [])
+                if m.get("type") == "way" and m.get("ref") in way_index
+            ]
+            members = [w for w in dict.fromkeys(members) if has_nodes[w]]
+            if not members:
+                continue
+            for chain in _stitch_ways(members, first_node, last_node):
+                _emit(chain, tags, f"relation/{rel.get('id')}")
+
+        if not names:
+            return PisteSet.empty()
+
+        return PisteSet(
+            coords=np.concatenate(pieces_xy).reshape(-1, 2),
+            node_ids=np.concatenate(pieces_nid).astype(np.int64),
+            offsets=np.asarray(offsets, dtype=np.int64),
+            names=names,
+            tags=tags_out,
+            osm_ids=osm_ids,
+        )
+
+    pistes = _assemble(_is_downhill, _is_downhill)
+    lifts = _assemble(_is_lift, lambda tags: False)
+    return pistes, lifts
+
+
+def parse_overpass_pistes(js: Dict[str, Any]) -> PisteSet:
+    """Solo le piste downhill della risposta Overpass."""
+    return parse_overpass_resort(js)[0]
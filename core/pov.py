@@ -41,7 +41,7 @@ def _normalize_points(raw_points: Any) -> List[Dict[str, float]]:
         if isinstance(p, dict):
             lat = p.get("lat") or p.get("latitude")
             lon = p.get("lon") or p.get("longitude")
-            elev = p.get("elev_m") or p.get("elevation") or 0.0
+            elev = p.get("elev") or p.get("elev_m") or p.get("elevation") or 0.0
 
         # lista/tuple
         elif isinstance(p, (list, tuple)) and len(p) >= 2:
@@ -10,12 +10,13 @@ from __future__ import annotations
 
 from typing import Dict, Any, List, Optional
 
-import math
 import os
 
 import streamlit as st
 import pydeck as pdk
 
+from core.piste_network import longest_continuous_run
+
 
 # ---------------------------------------------------------------------
 # CONFIG TOKEN MAPBOX
@@ -40,24 +41,8 @@ def _get_mapbox_token() -> Optional[str]:
 
 
 # ---------------------------------------------------------------------
-# UTILS GEO
+# PULIZIA TRACCIA
 # ---------------------------------------------------------------------
-def _dist_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Distanza in metri tra due punti lat/lon (formula haversine semplificata)."""
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-
-    a = (
-        math.sin(dphi / 2.0) ** 2
-        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2.0) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
 def _pick_main_segment(points: List[Dict[str, float]], max_jump_m: float = 2000.0) -> List[Dict[str, float]]:
     """
     Dato un elenco di punti [{lat, lon, elev}, ...] prende il segmento continuo
@@ -68,48 +53,10 @@ def _pick_main_segment(points: List[Dict[str, float]], max_jump_m: float = 2000.
     if len(points) < 2:
         return points
 
-    segments: List[List[Dict[str, float]]] = []
-    current: List[Dict[str, float]] = [points[0]]
-
-    for i in range(1, len(points)):
-        p_prev = points[i - 1]
-        p = points[i]
-        d = _dist_m(
-            float(p_prev.get("lat", 0.0)),
-            float(p_prev.get("lon", 0.0)),
-            float(p.get("lat", 0.0)),
-            float(p.get("lon", 0.0)),
-        )
-        if d <= max_jump_m:
-            current.append(p)
-        else:
-            # chiudo segmento e ne apro uno nuovo
-            if len(current) >= 2:
-                segments.append(current)
-            current = [p]
-
-    if len(current) >= 2:
-        segments.append(current)
-
-    if not segments:
-        return points
-
-    # prendo il segmento con lunghezza totale maggiore
-    def seg_length(seg: List[Dict[str, float]]) -> float:
-        tot = 0.0
-        for i in range(1, len(seg)):
-            a = seg[i - 1]
-            b = seg[i]
-            tot += _dist_m(
-                float(a.get("lat", 0.0)),
-                float(a.get("lon", 0.0)),
-                float(b.get("lat", 0.0)),
-                float(b.get("lon", 0.0)),
-            )
-        return tot
-
-    best = max(segments, key=seg_length)
-    return best
+    lat = [float(p.get("lat", 0.0)) for p in points]
+    lon = [float(p.get("lon", 0.0)) for p in points]
+    a, b = longest_continuous_run(lat, lon, max_jump_m)
+    return points[a:b]
 
 
 def _build_pov_path(points: List[Dict[str, float]]):
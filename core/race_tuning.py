@@ -5,6 +5,8 @@
 # - TuningParamsInput: input “grezzo” dal modulo meteo
 # - get_tuning_recommendation: converte l’input in parametri pratici
 #   (angoli lamine, struttura, gruppo sciolina, note)
+# - Terreno opzionale (core.terrain): tratti ripidi in ombra → lamine
+#   un filo più aggressive
 
 from __future__ import annotations
 
@@ -66,6 +68,10 @@ class TuningParamsInput:
     precip_mm: float = 0.0
     snowfall_mm: float = 0.0
 
+    # TERRENO (lungo la pista, se noto)
+    steepest_slope_deg: Optional[float] = None  # media sul tratto di 50 m più ripido
+    steep_shaded_pct: Optional[float] = None  # % dei tratti ripidi in ombra
+
 
 # ---------------------------------------------------------------------
 # Output raccomandazione tuning
@@ -83,6 +89,18 @@ class TuningRecommendation:
 # ---------------------------------------------------------------------
 # Logica di tuning – versione compatta ma robusta
 # ---------------------------------------------------------------------
+STEEP_SLOPE_DEG = 25.0
+STEEP_SHADED_PCT = 50.0
+
+
+def _steep_and_shaded(params: TuningParamsInput) -> bool:
+    return (
+        params.steepest_slope_deg is not None
+        and params.steepest_slope_deg >= STEEP_SLOPE_DEG
+        and (params.steep_shaded_pct or 0.0) >= STEEP_SHADED_PCT
+    )
+
+
 def _base_side_angle(params: TuningParamsInput) -> float:
     """
     Ritorna il side bevel (es. 2.0 = 88°) in funzione di livello + disciplina.
@@ -124,6 +142,10 @@ def _base_side_angle(params: TuningParamsInput) -> float:
     if params.injected and side < 3.0:
         side += 0.2
 
+    # tratti ripidi in ombra (neve dura) -> ancora un filo di grip
+    if _steep_and_shaded(params) and level != SkierLevel.TOURIST and side < 3.5:
+        side += 0.3
+
     return max(0.5, min(side, 4.0))
 
 
@@ -231,6 +253,13 @@ def get_tuning_recommendation(params: TuningParamsInput) -> TuningRecommendation
     if params.shade_index > 0.7 or params.cloudcover_pct > 80:
         notes_parts.append("Luce piatta: valutare lente chiara (VLT alta) e sci con set-up stabile.")
 
+    # terreno
+    if _steep_and_shaded(params):
+        notes_parts.append(
+            f"Tratti ripidi in ombra (fino a {params.steepest_slope_deg:.0f}° su 50 m): "
+            "neve più dura, curare l'affilatura delle lamine."
+        )
+
     # vento forte
     if params.wind_speed_kmh > 40:
         notes_parts.append("Vento forte: considerare protezioni termiche extra per la sciolina.")
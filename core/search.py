@@ -6,10 +6,11 @@
 # - niente lat/lon nelle label
 
 import time
-import requests
 import streamlit as st
 from streamlit_searchbox import st_searchbox
 
+from core import http_backend
+
 VERSION = "telemark-search-v3"
 
 # ---------- Paesi (prefiltro) ----------
@@ -81,7 +82,7 @@ def openmeteo_geocode_api(q: str, iso2: str | None):
         params["filter"] = "country"
 
     r = _retry(
-        lambda: requests.get(
+        lambda: http_backend.get(
             "https://geocoding-api.open-meteo.com/v1/search",
             params=params,
             headers=UA,
@@ -92,9 +93,30 @@ def openmeteo_geocode_api(q: str, iso2: str | None):
     return r.json()
 
 
+def _fill_missing_elevations(items):
+    """Quote mancanti dal DEM, una sola richiesta batch per tutti i risultati."""
+    todo = [it for it in items if it.get("elevation") is None]
+    if not todo:
+        return items
+    try:
+        from core import dem_tools  # import lazy: dem_tools dipende da moduli UI
+
+        z = dem_tools.fetch_elevations(
+            [float(it.get("latitude", 0.0)) for it in todo],
+            [float(it.get("longitude", 0.0)) for it in todo],
+        )
+        for it, v in zip(todo, z):
+            if v == v:  # non NaN
+                it["elevation"] = float(v)
+    except Exception:
+        pass
+    return items
+
+
 def _options_from_openmeteo(js):
     out = []
-    for it in (js or {}).get("results", []) or []:
+    results = _fill_missing_elevations(list((js or {}).get("results", []) or []))
+    for it in results:
         elev = it.get("elevation")
 
         # scarta risultati senza quota o sotto soglia
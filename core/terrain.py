@@ -0,0 +1,237 @@
+# core/terrain.py
+# Analisi del terreno lungo un'intera pista (vettoriale)
+#
+# - Per ogni punto del tracciato ricampionato una finestra DEM 3×3
+#   (passo cell_m) chiesta in un'unica chiamata all'elevation_fn
+# - Kernel di Horn → pendenza ed esposizione
+# - Kernel di Zevenbergen–Thorne → curvatura di profilo e planare (1/m;
+#   profilo > 0 = convesso, cambio di pendenza "a dosso")
+# - Esposizione al sole nella giornata: irraggiamento diretto a cielo
+#   sereno sul pendio rispetto al piano orizzontale (sun_ratio, 1 = come
+#   in piano, < 1 più in ombra, > 1 pendio rivolto al sole), con l'ombra
+#   portata dalle montagne se si passa l'orizzonte (core.horizon)
+# - Tutto su array (punti × finestra, punti × ore), nessun ciclo per punto
+# - Statistiche di sintesi (tratto più ripido su 50 m, % esposta a nord,
+#   % in ombra) per il tuning in core.race_tuning
+# - Nessuna dipendenza da Streamlit: l'elevation_fn arriva dal chiamante
+#   (es. core.dem_tools.fetch_elevations)
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date as Date
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.horizon import HorizonModel
+from core.piste_network import segment_lengths_m
+from core.utils import solar_azimuth_array, solar_cos_zenith_array
+
+ElevationFn = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+M_PER_DEG_LAT = 111320.0
+STEEP_WINDOW_M = 50.0
+NORTH_SECTOR_DEG = 45.0  # esposizione entro ±45° da Nord
+SHADED_SUN_RATIO = 0.5
+SUN_STEP_H = 0.25
+
+
+# ----------------------------------------------------------------------
+# Kernel su finestre 3×3 (..., 3, 3), riga 0 = nord, colonna 0 = ovest
+# ----------------------------------------------------------------------
+def horn_slope_aspect(z: np.ndarray, cell_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pendenza (gradi) ed esposizione (gradi da Nord, direzione verso cui
+    scende il pendio) col kernel di Horn. Esposizione NaN dove è piano.
+    """
+    dz_dx = (
+        (z[..., 0, 2] + 2.0 * z[..., 1, 2] + z[..., 2, 2])
+        - (z[..., 0, 0] + 2.0 * z[..., 1, 0] + z[..., 2, 0])
+    ) / (8.0 * cell_m)
+    dz_dy = (
+        (z[..., 0, 0] + 2.0 * z[..., 0, 1] + z[..., 0, 2])
+        - (z[..., 2, 0] + 2.0 * z[..., 2, 1] + z[..., 2, 2])
+    ) / (8.0 * cell_m)  # verso nord
+
+    slope = np.degrees(np.arctan(np.hypot(dz_dx, dz_dy)))
+    aspect = np.degrees(np.arctan2(-dz_dx, -dz_dy)) % 360.0
+    aspect = np.where((dz_dx == 0.0) & (dz_dy == 0.0), np.nan, aspect)
+    return slope, aspect
+
+
+def zevenbergen_curvature(z: np.ndarray, cell_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Curvatura di profilo e planare (1/m) col kernel di Zevenbergen–Thorne."""
+    h2 = cell_m * cell_m
+    z5 = z[..., 1, 1]
+    d = ((z[..., 1, 0] + z[..., 1, 2]) / 2.0 - z5) / h2
+    e = ((z[..., 0, 1] + z[..., 2, 1]) / 2.0 - z5) / h2
+    f = (-z[..., 0, 0] + z[..., 0, 2] + z[..., 2, 0] - z[..., 2, 2]) / (4.0 * h2)
+    g = (z[..., 1, 2] - z[..., 1, 0]) / (2.0 * cell_m)
+    h = (z[..., 0, 1] - z[..., 2, 1]) / (2.0 * cell_m)
+
+    gh2 = g * g + h * h
+    with np.errstate(invalid="ignore", divide="ignore"):
+        profile = np.where(gh2 > 0, -2.0 * (d * g * g + e * h * h + f * g * h) / gh2, 0.0)
+        plan = np.where(gh2 > 0, 2.0 * (d * h * h + e * g * g - f * g * h) / gh2, 0.0)
+    return profile, plan
+
+
+def window_points(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    cell_m: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordinate (P, 3, 3) delle finestre centrate sui punti."""
+    dlat = cell_m / M_PER_DEG_LAT
+    dlon = cell_m / (M_PER_DEG_LAT * np.maximum(0.1, np.cos(np.radians(lat))))
+    k = np.array([-1.0, 0.0, 1.0])
+    wlat = lat[:, None, None] - k[None, :, None] * dlat  # riga 0 = nord
+    wlon = lon[:, None, None] + k[None, None, :] * dlon[:, None, None]
+    shape = (lat.size, 3, 3)
+    return np.broadcast_to(wlat, shape), np.broadcast_to(wlon, shape)
+
+
+# ----------------------------------------------------------------------
+# Sole
+# ----------------------------------------------------------------------
+def sun_incidence(
+    lat: np.ndarray,
+    slope_deg: np.ndarray,
+    aspect_deg: np.ndarray,
+    day_of_year: int,
+    solar_hours: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (cos incidenza sul pendio (P, H), cos zenit sul piano (P, H)), entrambi
+    a 0 quando il sole è sotto l'orizzonte o dietro il pendio.
+    """
+    cosz = solar_cos_zenith_array(lat[:, None], day_of_year, solar_hours[None, :])
+    az = solar_azimuth_array(lat[:, None], day_of_year, solar_hours[None, :])
+    sinz = np.sqrt(np.clip(1.0 - cosz * cosz, 0.0, 1.0))
+    s = np.radians(slope_deg)[:, None]
+    a = np.radians(np.nan_to_num(aspect_deg, nan=0.0))[:, None]
+    cos_i = np.cos(s) * cosz + np.sin(s) * sinz * np.cos(np.radians(az) - a)
+    cos_i = np.where(cosz > 0.0, np.clip(cos_i, 0.0, None), 0.0)
+    return cos_i, cosz
+
+
+# ----------------------------------------------------------------------
+# Finestra mobile sulla distanza
+# ----------------------------------------------------------------------
+def steepest_window(
+    distance_m: np.ndarray,
+    values: np.ndarray,
+    window_m: float = STEEP_WINDOW_M,
+) -> Tuple[float, float]:
+    """
+    Massimo della media mobile di values su window_m metri di tracciato.
+    Ritorna (valore, distanza di inizio del tratto).
+    """
+    v = np.nan_to_num(np.asarray(values, dtype=float), nan=0.0)
+    d = np.asarray(distance_m, dtype=float)
+    if d.size < 2 or d[-1] <= 0.0:
+        return (float(v.max()) if v.size else 0.0), 0.0
+    integ = np.concatenate([[0.0], np.cumsum(0.5 * (v[1:] + v[:-1]) * np.diff(d))])
+    w = min(float(window_m), float(d[-1]))
+    starts = d[d <= d[-1] - w]
+    mean = (np.interp(starts + w, d, integ) - np.interp(starts, d, integ)) / w
+    k = int(np.argmax(mean))
+    return float(mean[k]), float(starts[k])
+
+
+# ----------------------------------------------------------------------
+# Profilo pista
+# ----------------------------------------------------------------------
+@dataclass
+class TerrainProfile:
+    distance_m: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    elev_m: np.ndarray
+    slope_deg: np.ndarray
+    aspect_deg: np.ndarray  # NaN dove piano
+    profile_curv: np.ndarray  # 1/m
+    plan_curv: np.ndarray  # 1/m
+    sun_ratio: np.ndarray  # irraggiamento giornaliero pendio / piano
+
+    def __len__(self) -> int:
+        return int(self.distance_m.size)
+
+    def stats(self, window_m: float = STEEP_WINDOW_M) -> Dict[str, float]:
+        """Sintesi per UI e tuning."""
+        n = len(self)
+        if n == 0:
+            return {}
+        steep, steep_at = steepest_window(self.distance_m, self.slope_deg, window_m)
+        asp = self.aspect_deg[np.isfinite(self.aspect_deg)]
+        north = np.minimum(asp, 360.0 - asp) <= NORTH_SECTOR_DEG
+        steep_mask = self.slope_deg >= np.nanpercentile(self.slope_deg, 75)
+        shaded = self.sun_ratio < SHADED_SUN_RATIO
+        return {
+            "length_m": float(self.distance_m[-1]),
+            "mean_slope_deg": float(np.nanmean(self.slope_deg)),
+            "max_slope_deg": float(np.nanmax(self.slope_deg)),
+            "steepest_50m_deg": steep,
+            "steepest_50m_at_m": steep_at,
+            "north_facing_pct": float(100.0 * north.mean()) if asp.size else 0.0,
+            "shaded_pct": float(100.0 * shaded.mean()),
+            "steep_shaded_pct": float(100.0 * (shaded & steep_mask).sum() / max(steep_mask.sum(), 1)),
+            "mean_sun_ratio": float(np.nanmean(self.sun_ratio)),
+            "max_convexity": float(np.nanmax(self.profile_curv)),
+        }
+
+
+def terrain_profile(
+    lat: Sequence[float],
+    lon: Sequence[float],
+    distance_m: Optional[Sequence[float]] = None,
+    elevation_fn: Optional[ElevationFn] = None,
+    day: Optional[Date] = None,
+    cell_m: float = 30.0,
+    horizon: Optional[HorizonModel] = None,
+) -> Optional[TerrainProfile]:
+    """
+    Profilo di terreno per i punti del tracciato (già ricampionato, es.
+    resample_polyline). Una sola chiamata a elevation_fn per 9×P quote.
+    horizon: orizzonte (anche su meno punti, si usa il campione più
+    vicino) per togliere le ore in cui il sole è dietro le montagne.
+    None se mancano punti o quote.
+    """
+    la = np.asarray(lat, dtype=float)
+    lo = np.asarray(lon, dtype=float)
+    if la.size == 0 or elevation_fn is None:
+        return None
+    if distance_m is None:
+        distance_m = np.concatenate([[0.0], np.cumsum(segment_lengths_m(la, lo))])
+    dist = np.asarray(distance_m, dtype=float)
+
+    wlat, wlon = window_points(la, lo, cell_m)
+    z = np.asarray(elevation_fn(wlat.ravel(), wlon.ravel()), dtype=float).reshape(la.size, 3, 3)
+    if not np.isfinite(z).any():
+        return None
+    # buchi isolati nella finestra → quota del centro
+    z = np.where(np.isfinite(z), z, z[:, 1:2, 1:2])
+
+    slope, aspect = horn_slope_aspect(z, cell_m)
+    prof, plan = zevenbergen_curvature(z, cell_m)
+
+    doy = (day or Date.today()).timetuple().tm_yday
+    hours = np.arange(0.0, 24.0 + 1e-9, SUN_STEP_H)
+    cos_i, cosz = sun_incidence(la, slope, aspect, doy, hours)
+    if horizon is not None and len(horizon):
+        cos_i = cos_i * horizon.resample_to(la, lo).sun_visible(doy, hours)
+    flat = cosz.sum(axis=1)
+    sun_ratio = np.where(flat > 0, cos_i.sum(axis=1) / np.where(flat > 0, flat, 1.0), 0.0)
+
+    return TerrainProfile(
+        distance_m=dist,
+        lat=la,
+        lon=lo,
+        elev_m=z[:, 1, 1],
+        slope_deg=slope,
+        aspect_deg=aspect,
+        profile_curv=prof,
+        plan_curv=plan,
+        sun_ratio=sun_ratio,
+    )
@@ -0,0 +1,104 @@
+# core/time_index.py
+# Indice temporale condiviso per profili meteo orari
+#
+# - Ricerca dell'ora più vicina con ricerca binaria (O(log n))
+#   su un array datetime64 ordinato
+# - Variante bulk: molti orari (es. partenze per pettorale) in una chiamata
+# - Interpolazione lineare fra le ore per qualsiasi colonna numerica
+# - Accetta anche serie non ordinate (l'ordinamento viene fatto una volta
+#   e gli indici tornano riferiti all'ordine originale)
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+
+def _as_ns(values: Any) -> np.ndarray:
+    """Converte datetime / Timestamp / array datetime64 in int64 (ns)."""
+    arr = np.atleast_1d(np.asarray(values, dtype="datetime64[ns]"))
+    return arr.astype(np.int64)
+
+
+class TimeIndex:
+    """
+    Indice su una sequenza di orari.
+
+    idx = TimeIndex(profile.times)
+    i = idx.nearest(race_dt)                 # posizione nell'array originale
+    ii = idx.nearest_many(start_times)       # array di posizioni
+    v = idx.interpolate(profile.snow_temp, race_dt)
+    """
+
+    __slots__ = ("_ns", "_order")
+
+    def __init__(self, times: Any) -> None:
+        ns = _as_ns(times)
+        if ns.size > 1 and np.any(ns[1:] < ns[:-1]):
+            order = np.argsort(ns, kind="stable")
+            self._ns = ns[order]
+            self._order = order
+        else:
+            self._ns = ns
+            self._order = None
+
+    def __len__(self) -> int:
+        return int(self._ns.size)
+
+    def _sorted_nearest(self, targets_ns: np.ndarray) -> np.ndarray:
+        ns = self._ns
+        n = ns.size
+        if n == 1:
+            return np.zeros(targets_ns.shape, dtype=np.intp)
+
+        pos = np.clip(np.searchsorted(ns, targets_ns), 1, n - 1)
+        left = pos - 1
+        # a parità di distanza vince l'ora precedente (come idxmin)
+        take_left = (targets_ns - ns[left]) <= (ns[pos] - targets_ns)
+        return np.where(take_left, left, pos)
+
+    def nearest_many(self, targets: Any) -> np.ndarray:
+        """
+        Posizioni (nell'ordine originale) delle ore più vicine a ciascun target.
+        """
+        if self._ns.size == 0:
+            raise ValueError("TimeIndex vuoto")
+        idx = self._sorted_nearest(_as_ns(targets))
+        if self._order is not None:
+            idx = self._order[idx]
+        return idx
+
+    def nearest(self, target: Any) -> int:
+        """Posizione (nell'ordine originale) dell'ora più vicina a target."""
+        return int(self.nearest_many(target)[0])
+
+    def interpolate(self, values: Any, targets: Any) -> Any:
+        """
+        Interpolazione lineare di values (allineato agli orari originali)
+        sugli orari target. Fuori intervallo restituisce il valore estremo.
+        Ritorna un float se targets è scalare, altrimenti un array.
+        """
+        vals = np.asarray(values, dtype=float)
+        if self._order is not None:
+            vals = vals[self._order]
+
+        t_ns = _as_ns(targets)
+        out = np.interp(
+            t_ns.astype(np.float64),
+            self._ns.astype(np.float64),
+            vals,
+        )
+        if np.ndim(targets) == 0:
+            return float(out[0])
+        return out
+
+
+def nearest_index(times: Any, target: Any) -> int:
+    """Scorciatoia: posizione dell'ora più vicina a target."""
+    return TimeIndex(times).nearest(target)
+
+
+def nearest_indices(times: Any, targets: Any) -> np.ndarray:
+    """Scorciatoia bulk: posizioni delle ore più vicine a ciascun target."""
+    return TimeIndex(times).nearest_many(targets)
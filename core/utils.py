@@ -69,6 +69,41 @@ def clear_sky_ghi(lat, lon, ts_utc):
     cosz = _solar_cos_zenith(lat, lon, ts_utc)
     return max(0.0, S0 * cosz * 0.75)
 
+# --- Versioni vettoriali (array di istanti) ---
+def solar_cos_zenith_array(lat_deg, day_of_year, solar_hour):
+    """
+    cos(zenit) solare su array.
+    day_of_year: giorno dell'anno (1..366)
+    solar_hour: ora solare locale (12 = mezzogiorno solare)
+    return: cos(zenit) clippato a 0 (notte)
+    """
+    latr = np.radians(np.asarray(lat_deg, dtype=float))
+    doy = np.asarray(day_of_year, dtype=float)
+    H = np.radians(15.0 * (np.asarray(solar_hour, dtype=float) - 12.0))
+    delta = 23.45 * np.pi / 180 * np.sin(2 * np.pi * (284 + doy) / 365)
+    cosz = np.sin(latr) * np.sin(delta) + np.cos(latr) * np.cos(delta) * np.cos(H)
+    return np.maximum(0.0, cosz)
+
+def solar_azimuth_array(lat_deg, day_of_year, solar_hour):
+    """
+    Azimut solare su array, in gradi da Nord in senso orario (90 = Est).
+    Stesse approssimazioni di solar_cos_zenith_array.
+    """
+    latr = np.radians(np.asarray(lat_deg, dtype=float))
+    doy = np.asarray(day_of_year, dtype=float)
+    H = np.radians(15.0 * (np.asarray(solar_hour, dtype=float) - 12.0))
+    delta = 23.45 * np.pi / 180 * np.sin(2 * np.pi * (284 + doy) / 365)
+    az = np.arctan2(
+        -np.sin(H) * np.cos(delta),
+        np.sin(delta) * np.cos(latr) - np.cos(delta) * np.sin(latr) * np.cos(H),
+    )
+    return np.degrees(az) % 360.0
+
+def clear_sky_ghi_array(lat_deg, day_of_year, solar_hour):
+    """GHI cielo sereno [W/m²] su array (stessa formula di clear_sky_ghi)."""
+    S0 = 1361.0
+    return S0 * solar_cos_zenith_array(lat_deg, day_of_year, solar_hour) * 0.75
+
 # --- Vento "effettivo" per scambio ---
 def effective_wind(w):
     w = np.clip(w, 0, 8.0)  # limita per evitare outlier
@@ -82,5 +117,6 @@ __all__ = [
     "UA", "_retry",
     "rh_from_t_td", "wetbulb_stull",
     "clear_sky_ghi", "effective_wind",
+    "solar_cos_zenith_array", "clear_sky_ghi_array", "solar_azimuth_array",
     "c_to_f", "ms_to_kmh",
 ]
@@ -0,0 +1,182 @@
+# scripts/bench_overpass_parse.py
+# Benchmark parser Overpass piste: vecchio assemblaggio quadratico
+# (next(...) su tutta la lista elements per ogni membro di relation)
+# contro core.pistes.parse_overpass_pistes (tabelle indicizzate per id).
+#
+# Uso:
+#   # 1) registrare una risposta grande (es. Cervinia/Zermatt, 5 km):
+#   TELEMARK_HTTP_MODE=record streamlit run streamlit_app.py
+#   # 2) lanciare il benchmark sulla fixture (o su un dump Overpass JSON):
+#   python scripts/bench_overpass_parse.py fixtures/http/<sha1>.json
+#   # senza file: risposta sintetica con N relation
+#   python scripts/bench_overpass_parse.py --synthetic 3000
+#
+# Misure (--synthetic, --repeat 1, Python 3.11, NumPy 2.4, offline):
+#   relation   elementi   vecchio     nuovo    speed-up
+#      500       51 000    2.2 s     37 ms       60x
+#     1000      102 000   10.2 s     80 ms      128x
+#     2000      204 000   37.4 s    162 ms      231x
+# Il vecchio parser cresce in modo quadratico, il nuovo linearmente.
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.pistes import parse_overpass_pistes  # noqa: E402
+
+
+# ----------------------------------------------------------------------
+# Parser originale (riferimento)
+# ----------------------------------------------------------------------
+def _legacy_parse(js: Dict[str, Any]) -> Tuple[int, List[List[Tuple[float, float]]], List[Optional[str]]]:
+    elements = js.get("elements", [])
+    nodes = {e["id"]: e for e in elements if e.get("type") == "node"}
+
+    polylines: List[List[Tuple[float, float]]] = []
+    names: List[Optional[str]] = []
+    count = 0
+
+    def _nm(tags):
+        if not tags:
+            return None
+        for k in ("name", "piste:name", "ref"):
+            v = tags.get(k)
+            if v:
+                return str(v).strip()
+        return None
+
+    for el in elements:
+        if el.get("type") not in ("way", "relation"):
+            continue
+        tags = el.get("tags") or {}
+        if tags.get("piste:type") != "downhill":
+            continue
+
+        coords: List[Tuple[float, float]] = []
+
+        if el["type"] == "way":
+            for nid in el.get("nodes", []):
+                nd = nodes.get(nid)
+                if nd:
+                    coords.append((nd["lat"], nd["lon"]))
+        else:
+            for mem in el.get("members", []):
+                if mem.get("type") != "way":
+                    continue
+                wid = mem.get("ref")
+                way = next(
+                    (
+                        w
+                        for w in elements
+                        if w.get("type") == "way" and w.get("id") == wid
+                    ),
+                    None,
+                )
+                if way:
+                    for nid in way.get("nodes", []):
+                        nd = nodes.get(nid)
+                        if nd:
+                            coords.append((nd["lat"], nd["lon"]))
+
+        if len(coords) >= 2:
+            polylines.append(coords)
+            names.append(_nm(tags))
+            count += 1
+
+    return count, polylines, names
+
+
+# ----------------------------------------------------------------------
+# Input
+# ----------------------------------------------------------------------
+def _load(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf8") as f:
+        js = json.load(f)
+    # fixture core.http_backend: risposta nel campo "text"
+    if "elements" not in js and "text" in js:
+        js = json.loads(js["text"])
+    return js
+
+
+def _synthetic(n_rel: int, ways_per_rel: int = 4, nodes_per_way: int = 25) -> Dict[str, Any]:
+    """Comprensorio fittizio: relation di way contigue (ordine dei membri mescolato)."""
+    elements: List[Dict[str, Any]] = []
+    nid = 1
+    wid = 1
+    for r in range(n_rel):
+        lat0 = 45.9 + (r % 100) * 1e-3
+        lon0 = 7.6 + (r // 100) * 1e-3
+        members = []
+        prev_last = None
+        for k in range(ways_per_rel):
+            refs = [] if prev_last is None else [prev_last]
+            for j in range(nodes_per_way - len(refs)):
+                elements.append(
+                    {
+                        "type": "node",
+                        "id": nid,
+                        "lat": lat0 - (k * nodes_per_way + j) * 1e-5,
+                        "lon": lon0,
+                    }
+                )
+                refs.append(nid)
+                nid += 1
+            prev_last = refs[-1]
+            elements.append({"type": "way", "id": wid, "nodes": refs, "tags": {}})
+            members.append({"type": "way", "ref": wid, "role": ""})
+            wid += 1
+        members = members[1::2] + members[0::2]
+        elements.append(
+            {
+                "type": "relation",
+                "id": r + 1,
+                "members": members,
+                "tags": {"piste:type": "downhill", "name": f"Pista {r + 1}"},
+            }
+        )
+    return {"elements": elements}
+
+
+def _timeit(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("path", nargs="?", help="fixture http_backend o dump Overpass JSON")
+    ap.add_argument("--synthetic", type=int, default=0, help="numero di relation sintetiche")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.path:
+        js = _load(Path(args.path))
+    else:
+        js = _synthetic(args.synthetic or 2000)
+
+    n_el = len(js.get("elements", []))
+    t_old = _timeit(_legacy_parse, js, args.repeat)
+    t_new = _timeit(parse_overpass_pistes, js, args.repeat)
+    pistes = parse_overpass_pistes(js)
+
+    print(f"elementi        : {n_el}")
+    print(f"piste (nuovo)   : {len(pistes)}  vertici: {pistes.coords.shape[0]}")
+    print(f"parser vecchio  : {t_old * 1000:9.1f} ms")
+    print(f"parser nuovo    : {t_new * 1000:9.1f} ms")
+    if t_new > 0:
+        print(f"speed-up        : {t_old / t_new:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# scripts/check_snow_type.py
+# Verifica: classificazione SnowType vettoriale (core.meteo) identica a
+# quella scalare, riga per riga, su una griglia T neve × umidità × injected;
+# build_dynamic_tuning_for_starts deve restituire membri SnowType.
+#
+# Uso:
+#   python scripts/check_snow_type.py
+#
+# Esce con codice 1 (e stampa le righe diverse) se le due versioni divergono.
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.meteo import (  # noqa: E402
+    PROFILE_FIELDS,
+    MeteoProfile,
+    _classify_snow_type,
+    _classify_snow_type_array,
+    build_dynamic_tuning_for_starts,
+)
+from core.race_tuning import Discipline, SkierLevel, SnowType  # noqa: E402
+
+
+def main() -> int:
+    # passo 0.25 °C / 0.05: cade esattamente sulle soglie (-10, -6, -2, -0.5, 0.3, 0.7)
+    t, m, inj = np.meshgrid(
+        np.arange(-20.0, 5.0 + 1e-9, 0.25),
+        np.arange(0.0, 1.0 + 1e-9, 0.05),
+        [False, True],
+        indexing="ij",
+    )
+    t, m, inj = t.ravel(), np.round(m.ravel(), 2), inj.ravel()
+
+    vec = _classify_snow_type_array(t, m, inj)
+    bad = []
+    for k in range(t.size):
+        ref = _classify_snow_type(float(t[k]), float(m[k]), bool(inj[k]))
+        if not isinstance(vec[k], SnowType) or vec[k] is not ref:
+            bad.append((t[k], m[k], inj[k], vec[k], ref))
+
+    for row in bad[:20]:
+        print("T=%.2f moist=%.2f injected=%s → vettoriale %r, scalare %r" % row)
+    print(f"{t.size} righe, {len(bad)} diverse")
+
+    # stesso confronto passando dal tuning bulk (un orario per riga)
+    sel = ~inj
+    times = np.datetime64("2026-01-10T00:00") + np.arange(sel.sum()) * np.timedelta64(1, "h")
+    cols = {name: np.zeros(times.size) for name in PROFILE_FIELDS}
+    cols.update(snow_temp=t[sel], snow_moisture_index=m[sel])
+    profile = MeteoProfile(times, **cols)
+    starts = [x.astype("datetime64[s]").item() for x in times]
+    res = build_dynamic_tuning_for_starts(profile, starts, Discipline.GS, SkierLevel.FIS, injected=False)
+    bad_tuning = [
+        r for r, tk, mk in zip(res, t[sel], m[sel])
+        if not isinstance(r.snow_type, SnowType) or r.snow_type is not _classify_snow_type(tk, mk, False)
+    ]
+    print(f"{len(res)} risultati di tuning, {len(bad_tuning)} diversi")
+    return 1 if bad or bad_tuning else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# scripts/import_dem_tiles.py
+# Prepara le tile DEM locali per core.dem_raster (una tantum)
+#
+# Uso:
+#   # SRTM .hgt: copiati così come sono
+#   python scripts/import_dem_tiles.py N45E007.hgt N45E006.hgt
+#   # GeoTIFF (SRTM / Copernicus GLO-30): convertiti in griglia .npy + .json
+#   python scripts/import_dem_tiles.py Copernicus_DSM_COG_10_N45_00_E007_00_DEM.tif
+#
+# I GeoTIFF richiedono rasterio (pip install rasterio), solo qui: l'app
+# legge poi i file convertiti con numpy in memory map.
+# Le tile finiscono in TELEMARK_DEM_DIR (default data/dem) oppure in --out.
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core import dem_raster  # noqa: E402
+
+
+def _import_geotiff(src: Path, out_dir: Path) -> Path:
+    try:
+        import rasterio  # type: ignore
+    except Exception:
+        raise SystemExit("per i GeoTIFF serve rasterio: pip install rasterio")
+
+    with rasterio.open(src) as ds:
+        if ds.crs is not None and ds.crs.to_epsg() != 4326:
+            raise SystemExit(f"{src.name}: CRS {ds.crs} non supportato (atteso EPSG:4326)")
+        data = ds.read(1)
+        t = ds.transform  # origine = angolo del pixel in alto a sinistra
+        dlon, dlat = float(t.a), float(-t.e)
+        return dem_raster.write_grid(
+            out_dir / src.stem,
+            data,
+            lat0=float(t.f) - dlat / 2.0,
+            lon0=float(t.c) + dlon / 2.0,
+            dlat=dlat,
+            dlon=dlon,
+            nodata=ds.nodata,
+        )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Import tile DEM locali")
+    ap.add_argument("files", nargs="+", help="file .hgt o GeoTIFF")
+    ap.add_argument("--out", help="cartella di destinazione")
+    args = ap.parse_args()
+
+    out_dir = Path(args.out) if args.out else dem_raster.DEM_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for name in args.files:
+        src = Path(name)
+        suffix = src.suffix.lower()
+        if suffix == ".hgt":
+            dst = out_dir / src.name
+            shutil.copyfile(src, dst)
+        elif suffix in (".tif", ".tiff"):
+            dst = _import_geotiff(src, out_dir)
+        else:
+            ap.error(f"formato non supportato: {src.name}")
+        print(f"{src.name} → {dst}")
+
+    r = dem_raster.DemRaster.open(out_dir)
+    print(f"{len(r)} tile in {out_dir}, copertura {r.bounds}")
+
+
+if __name__ == "__main__":
+    main()
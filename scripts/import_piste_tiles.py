@@ -0,0 +1,51 @@
+# scripts/import_piste_tiles.py
+# Import una tantum delle piste nello store locale a tile (core.piste_store)
+#
+# Uso:
+#   # regioni predefinite (query Overpass per bounding box)
+#   python scripts/import_piste_tiles.py valle_aosta valais
+#   # dump Overpass già scaricato (JSON) + suo bounding box
+#   python scripts/import_piste_tiles.py --dump dump.json --bbox 45.46,6.80,45.99,7.94
+#
+# Lo store finisce in TELEMARK_PISTE_STORE (default data/piste_tiles.sqlite)
+# oppure nel percorso dato con --out.
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core import piste_store  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Import piste nello store a tile")
+    ap.add_argument("regions", nargs="*", help=f"regioni: {', '.join(piste_store.REGIONS)}")
+    ap.add_argument("--dump", help="dump Overpass JSON da importare")
+    ap.add_argument("--bbox", help="lat_min,lon_min,lat_max,lon_max del dump")
+    ap.add_argument("--out", help="file store di destinazione")
+    args = ap.parse_args()
+
+    if args.dump:
+        if not args.bbox:
+            ap.error("--dump richiede --bbox")
+        bbox = tuple(float(v) for v in args.bbox.split(","))
+        with open(args.dump, "r", encoding="utf8") as f:
+            js = json.load(f)
+        n = piste_store.import_overpass_dump(js, bbox, args.out)
+        print(f"{args.dump}: {n} piste importate")
+
+    for name in args.regions:
+        bbox = piste_store.REGIONS.get(name)
+        if bbox is None:
+            ap.error(f"regione sconosciuta: {name}")
+        n = piste_store.import_region(bbox, args.out)
+        print(f"{name}: {n} piste importate")
+
+
+if __name__ == "__main__":
+    main()
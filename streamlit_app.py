@@ -10,8 +10,6 @@ from datetime import datetime, date as Date, time as dtime, timedelta
 from typing import Optional, Dict, Any
 from pathlib import Path
 
-import requests
-import pandas as pd
 import streamlit as st
 import altair as alt
 
@@ -48,7 +46,12 @@ from core.race_integration import (
     get_wc_tuning_for_event,
     SkierLevel as WCSkierLevel,
 )
+from core import http_backend
+from core import location_loader
+from core import overpass as overpass_mod
+from core import dem_tools as dem_tools_mod
 from core import meteo as meteo_mod
+from core.time_index import nearest_index
 from core import wax_logic as wax_mod
 from core.pages.ski_selector import recommend_skis_for_day
 from core import pov as pov_mod
@@ -148,7 +151,7 @@ def geocode_race_place(query: str) -> Optional[Dict[str, Any]]:
         "format": "json",
     }
     try:
-        r = requests.get(
+        r = http_backend.get(
             "https://geocoding-api.open-meteo.com/v1/search",
             params=params,
             headers=UA,
@@ -402,6 +405,10 @@ if debug_mode:
             "meteo_pro_ctx": st.session_state.get("meteo_pro_ctx"),
         }
     )
+    st.sidebar.markdown("**Overpass**")
+    st.sidebar.json(overpass_mod.stats())
+    st.sidebar.markdown("**Quote DEM**")
+    st.sidebar.json(dem_tools_mod.elevation_service.stats())
 
 # ---------------------- MAIN -------------------------
 st.title("Telemark · Pro Wax & Tune")
@@ -482,6 +489,17 @@ elif page == "Località & Mappa":
         unsafe_allow_html=True,
     )
 
+    # piste, DEM e meteo in parallelo appena le coordinate sono note
+    # profilo della pagina Località con l'ombra del terreno (orizzonte DEM)
+    ctx["terrain_shading"] = True
+    location_loader.prefetch_location(
+        lat,
+        lon,
+        st.session_state.get("free_ref_date", today_utc),
+        str(ctx.get("provider") or "auto"),
+        terrain_shading=True,
+    )
+
     # ---------------- Mappa & DEM ----------------
     st.markdown("## 2) Mappa & piste")
     ctx["map_context"] = "local"
@@ -528,26 +546,23 @@ elif page == "Località & Mappa":
     ctx["race_event"] = dummy_event
     race_dt_free = datetime.combine(ref_date_free, ref_time_free)
     ctx["race_datetime"] = race_dt_free
+    # profilo orario di default; a 15 min solo su richiesta (precipitazione
+    # e neve restano quantità orarie ripetute su ogni quarto d'ora)
+    subhourly = st.toggle(
+        "Profilo a 15 minuti (interpolato)",
+        value=False,
+        key="free_subhourly",
+        help="Precipitazione e neve restano valori orari: non sommarli sulle righe.",
+    )
+    ctx["step_minutes"] = 15 if subhourly else 60
 
+    location_loader.wait("forecast", ctx["lat"], ctx["lon"])
+    location_loader.wait("horizon", ctx["lat"], ctx["lon"])
     profile_local = meteo_mod.build_meteo_profile_for_race_day(ctx)
     if profile_local is None:
         st.warning("Impossibile costruire il profilo meteo per questa località.")
     else:
-        df = pd.DataFrame(
-            {
-                "time": profile_local.times,
-                "temp_air": profile_local.temp_air,
-                "snow_temp": profile_local.snow_temp,
-                "rh": profile_local.rh,
-                "cloudcover": profile_local.cloudcover,
-                "windspeed": profile_local.windspeed,
-                "precipitation": profile_local.precip,
-                "snowfall": profile_local.snowfall,
-                "shade_index": profile_local.shade_index,
-                "snow_moisture_index": profile_local.snow_moisture_index,
-                "glide_index": profile_local.glide_index,
-            }
-        ).set_index("time")
+        df = profile_local.to_frame().rename(columns={"precip": "precipitation"})
 
         st.caption("Grafici riferiti all'intera giornata (00–24) per la località selezionata.")
         df_reset = df.reset_index()
@@ -710,8 +725,7 @@ elif page == "Località & Mappa":
 
         # ----- condizione neve al momento di riferimento -----
         ts_ref = datetime.combine(ref_date_free, ref_time_free)
-        idx = (wax_df["time_local"] - ts_ref).abs().idxmin()
-        row_ref = wax_df.loc[idx]
+        row_ref = wax_df.iloc[nearest_index(wax_df["time_local"].to_numpy(), ts_ref)]
         snow_label = wax_mod.classify_snow(row_ref)
 
         st.markdown(
@@ -1058,6 +1072,12 @@ else:  # "Racing / Calendari"
         ctx["map_context"] = (
             f"race_{selected_event.start_date.isoformat()}_{selected_event.place}"
         )
+        location_loader.prefetch_location(
+            ctx["lat"],
+            ctx["lon"],
+            selected_event.start_date,
+            str(ctx.get("provider") or "auto"),
+        )
 
         st.markdown(
             f'<div class="card">'
@@ -1125,25 +1145,12 @@ else:  # "Racing / Calendari"
         # ---------- METEO & PROFILO GARA ----------
         st.markdown("### 📈 Meteo & profilo giornata gara")
 
+        location_loader.wait("forecast", ctx["lat"], ctx["lon"])
         profile = meteo_mod.build_meteo_profile_for_race_day(ctx)
         if profile is None:
             st.warning("Impossibile costruire il profilo meteo per questa gara.")
         else:
-            df = pd.DataFrame(
-                {
-                    "time": profile.times,
-                    "temp_air": profile.temp_air,
-                    "snow_temp": profile.snow_temp,
-                    "rh": profile.rh,
-                    "cloudcover": profile.cloudcover,
-                    "windspeed": profile.windspeed,
-                    "precipitation": profile.precip,
-                    "snowfall": profile.snowfall,
-                    "shade_index": profile.shade_index,
-                    "snow_moisture_index": profile.snow_moisture_index,
-                    "glide_index": profile.glide_index,
-                }
-            ).set_index("time")
+            df = profile.to_frame().rename(columns={"precip": "precipitation"})
 
             st.caption("Grafici riferiti all'intera giornata di gara (00–24).")
 